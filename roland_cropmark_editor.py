@@ -112,7 +112,7 @@ class PrintingMarks(inkex.EffectExtension):
         # Update the viewBox using the converted user units (px)
         root.set("viewBox", f"0 0 {width_px} {height_px}")
 
-    def draw_reg_circile(self, x, y, name, parent):
+    def draw_reg_circile(self, x, y, name, parent, id_suffix=""):
         """Draw a circle with 10mm diameter and black fill, no stroke, at specified position."""
         style = {
             "fill": "#000000",  # Black fill
@@ -121,14 +121,14 @@ class PrintingMarks(inkex.EffectExtension):
         circle_attribs = {
             "style": str(inkex.Style(style)),
             inkex.addNS("label", "inkscape"): name,
-            "id": re.sub(r'\W+', '_', name),  # Replace non-alphanumeric characters with underscores
+            "id": re.sub(r'\W+', '_', name) + id_suffix,  # Replace non-alphanumeric characters with underscores
             "cx": str(x),       # X position
             "cy": str(y),       # Y position
             "r": "5"            # Radius is half of the 10mm diameter
         }
         parent.add(inkex.elements.Circle(**circle_attribs))
 
-    def draw_hairline_rectangle(self, parent, x, y, width, height):
+    def draw_hairline_rectangle(self, parent, x, y, width, height, id_suffix=""):
         """
         Draws a rectangle with a hairline border in gray, with a fixed ID and name.
         Also adds a text label below the rectangle.
@@ -139,6 +139,7 @@ class PrintingMarks(inkex.EffectExtension):
             y (float): The y-coordinate of the rectangle's top-left corner.
             width (float): The width of the rectangle.
             height (float): The height of the rectangle.
+            id_suffix (str): Appended to the IDs, to make them unique for each page.
         """
         # Define the style for the rectangle
         style = {
@@ -154,7 +155,7 @@ class PrintingMarks(inkex.EffectExtension):
             "width": str(width),
             "height": str(height),
             "style": str(inkex.Style(style)),
-            "id": "cutting_area",  # Fixed ID
+            "id": "cutting_area" + id_suffix,  # Fixed ID
             inkex.addNS("label", "inkscape"): "Cutting Area",  # Fixed name for the rectangle
         }
 
@@ -177,7 +178,7 @@ class PrintingMarks(inkex.EffectExtension):
             "x": str(text_x),
             "y": str(text_y),
             "style": str(inkex.Style(text_style)),
-            "id": "cutting_area_label",
+            "id": "cutting_area_label" + id_suffix,
             inkex.addNS("label", "inkscape"): "Cutting Area Label",
         }
 
@@ -208,7 +209,7 @@ class PrintingMarks(inkex.EffectExtension):
 
         return path_element
 
-    def add_helper_layer(self, x, y, width, height):
+    def add_helper_layer(self, x, y, width, height, name=""):
         """
         Adds a helper layer and draws a hairline rectangle on it.
 
@@ -217,11 +218,17 @@ class PrintingMarks(inkex.EffectExtension):
             y (float): The y-coordinate of the rectangle's top-left corner.
             width (float): The width of the rectangle.
             height (float): The height of the rectangle.
+            name (str): Page name for documents with multiple pages, appended to the layer ID and name.
         """
         svg = self.document.getroot()
         
         layer_id = "helper"
         layer_name = "Helper Layer - do not print or cut"
+        id_suffix = ""
+        if name != "":
+            id_suffix = "-" + name
+            layer_id += id_suffix
+            layer_name += " " + name
         
         # Create a new layer
         layer = svg.add(inkex.Layer.new(layer_name))
@@ -229,9 +236,9 @@ class PrintingMarks(inkex.EffectExtension):
         layer.set("sodipodi:insensitive", "true")
 
         # Call the draw_hairline_rectangle function to add the rectangle to the layer
-        self.draw_hairline_rectangle(layer, x, y, width, height)
+        self.draw_hairline_rectangle(layer, x, y, width, height, id_suffix)
 
-    def add_cropmark_settings_text(self, parent, pageW, pageH, dx, dy, W, H, x, y):
+    def add_cropmark_settings_text(self, parent, pageW, pageH, dx, dy, W, H, x, y, id_suffix="", pages=1):
             """
             Adds a text object to the given parent with crop mark settings.
 
@@ -245,6 +252,9 @@ class PrintingMarks(inkex.EffectExtension):
                 H (float): Height in user units.
                 x (float): X-coordinate for the text.
                 y (float): Y-coordinate for the text.
+                id_suffix (str): Appended to the ID, to make it unique for each page.
+                pages (int): Number of pages of the document. Stored if there is more than one page,
+                    as the export only supports cropmarks on documents with one page.
             """
             # Convert numeric values to integers to remove decimal points
             pageW = float(pageW)
@@ -264,7 +274,7 @@ class PrintingMarks(inkex.EffectExtension):
                 "x": str(x),
                 "y": str(y),
                 "style": str(inkex.Style(text_style)),
-                "id": "cropmark_settings",
+                "id": "cropmark_settings" + id_suffix,
                 inkex.addNS("label", "inkscape"): "Cropmark Settings",
             }
             txt = parent.add(inkex.TextElement(**txt_attribs))
@@ -273,19 +283,30 @@ class PrintingMarks(inkex.EffectExtension):
                 f'INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS={{"version":1, '
                 f'"pageW":{pageW}, "pageH":{pageH}, '
                 f'"dx":{dx}, "dy":{dy}, '
-                f'"W":{W}, "H":{H}}}'
+                f'"W":{W}, "H":{H}'
+                + (f', "pages":{pages}' if pages > 1 else '')
+                + '}'
             )
 
-    def draw_effect(self, bbox, name=""):
-        # Get SVG document dimensions
-        # self.width must be replaced by bbox.right. same to others.
+    def draw_effect(self, bbox, name="", margins=None, pages=1):
+        """
+        Draws the cropmark layer and the helper layer for one page.
+
+        Args:
+            bbox (inkex.BoundingBox): Page area in user units.
+            name (str): Page name for documents with multiple pages, appended to the layer and element IDs.
+            margins (tuple): (top, bottom, left, right) in user units, see margins_in_user_units().
+            pages (int): Number of pages of the document, see add_cropmark_settings_text().
+        """
         svg = self.document.getroot()
         
         # Construct layer id and layer name
         layer_id = "cropmarks"
         layer_name = "Cropmarks - do not edit"
+        id_suffix = ""
         if name != "":
-            layer_id += "-" + name
+            id_suffix = "-" + name
+            layer_id += id_suffix
             layer_name += " " + name
 
         # Create a new layer
@@ -293,11 +314,7 @@ class PrintingMarks(inkex.EffectExtension):
         layer.set("id", layer_id)
         layer.set("sodipodi:insensitive", "true")
         
-        # Convert parameters to user unit
-        margin_top = self.svg.viewport_to_unit(str(self.options.margin_top) + self.options.new_margins_unit)
-        margin_bottom = self.svg.viewport_to_unit(str(self.options.margin_bottom) + self.options.new_margins_unit)
-        margin_left = self.svg.viewport_to_unit(str(self.options.margin_left) + self.options.new_margins_unit) 
-        margin_right = self.svg.viewport_to_unit(str(self.options.margin_right) + self.options.new_margins_unit)
+        (margin_top, margin_bottom, margin_left, margin_right) = margins or self.margins_in_user_units()
 
         # External edges of the cropmarks
         border_left = bbox.left + margin_left
@@ -312,8 +329,8 @@ class PrintingMarks(inkex.EffectExtension):
             offset_top = bbox.top + margin_top + 5
             offset_bottom = bbox.bottom - margin_bottom - 5
             
-            # CutStudio uses uses bottom left origin 
-            dx = offset_left
+            # CutStudio uses uses bottom left origin, relative to the page
+            dx = offset_left - bbox.left
             dy = bbox.bottom - offset_bottom 
             # Spacing between the cropmarks
             width = offset_right - offset_left
@@ -334,10 +351,10 @@ class PrintingMarks(inkex.EffectExtension):
 
 
             # Cropmark Information
-            self.add_cropmark_settings_text(layer, bbox.right, bbox.bottom, dx, dy, width, height, str(middle_horizontal), str(bbox.bottom + 20))
-            self.draw_reg_circile(offset_left, offset_top, "Top Left Cropmark", layer)
-            self.draw_reg_circile(offset_left, offset_bottom, "Bottom Left Cropmark", layer)
-            self.draw_reg_circile(offset_right, offset_bottom, "Bottom Right Cropmark", layer)
+            self.add_cropmark_settings_text(layer, bbox.width, bbox.height, dx, dy, width, height, str(middle_horizontal), str(bbox.bottom + 20), id_suffix, pages)
+            self.draw_reg_circile(offset_left, offset_top, "Top Left Cropmark", layer, id_suffix)
+            self.draw_reg_circile(offset_left, offset_bottom, "Bottom Left Cropmark", layer, id_suffix)
+            self.draw_reg_circile(offset_right, offset_bottom, "Bottom Right Cropmark", layer, id_suffix)
 
         if self.options.mark_type == "four":
 
@@ -348,8 +365,8 @@ class PrintingMarks(inkex.EffectExtension):
             offset_top = bbox.top + margin_top + (5 + mark_size)
             offset_bottom = bbox.bottom - margin_bottom - (5 + mark_size)
             
-            # CutStudio uses uses bottom left origin 
-            dx = offset_left
+            # CutStudio uses uses bottom left origin, relative to the page
+            dx = offset_left - bbox.left
             dy = bbox.bottom - offset_bottom #CutStudio uses bottom left origin 
             # Spacing between the cropmarks
             width = offset_right - offset_left
@@ -369,11 +386,11 @@ class PrintingMarks(inkex.EffectExtension):
             middle_horizontal = bbox.left + (bbox.width / 2)
 
             # Cropmark Information
-            self.add_cropmark_settings_text(layer, bbox.right, bbox.bottom, dx, dy, width, height, str(middle_horizontal), str(bbox.bottom + 20))
-            self.draw_reg_circile(offset_left, offset_top, "Top Left Cropmark", layer)
-            self.draw_reg_circile(offset_left, offset_bottom, "Bottom Left Cropmark", layer)
-            self.draw_reg_circile(offset_right, offset_bottom, "Bottom Right Cropmark", layer)
-            self.draw_reg_circile(offset_right, offset_top, "Top Right Cropmark", layer)
+            self.add_cropmark_settings_text(layer, bbox.width, bbox.height, dx, dy, width, height, str(middle_horizontal), str(bbox.bottom + 20), id_suffix, pages)
+            self.draw_reg_circile(offset_left, offset_top, "Top Left Cropmark", layer, id_suffix)
+            self.draw_reg_circile(offset_left, offset_bottom, "Bottom Left Cropmark", layer, id_suffix)
+            self.draw_reg_circile(offset_right, offset_bottom, "Bottom Right Cropmark", layer, id_suffix)
+            self.draw_reg_circile(offset_right, offset_top, "Top Right Cropmark", layer, id_suffix)
 
             # Drawing manual alignment marks
             
@@ -414,29 +431,91 @@ class PrintingMarks(inkex.EffectExtension):
 
         # Draw helper layer
         if True:
-            self.add_helper_layer(cutting_area_x, cutting_area_y, cutting_area_width, cutting_area_heignt)
+            self.add_helper_layer(cutting_area_x, cutting_area_y, cutting_area_width, cutting_area_heignt, name)
 
-    def remove_layers(self, *layer_ids):
+    def margins_in_user_units(self):
+        """
+        Returns the cropmark margins (top, bottom, left, right) converted to user units.
+        """
+        unit = self.options.new_margins_unit
+        return tuple(self.svg.viewport_to_unit(str(margin) + unit) for margin in
+                     (self.options.margin_top, self.options.margin_bottom, self.options.margin_left, self.options.margin_right))
+
+    def remove_layers(self, id_index, *layer_ids):
         """
         Removes layers with specified IDs from the SVG document.
+        Layers of single pages (e.g., "cropmarks-2" for "cropmarks") are removed as well.
 
         Args:
-            *layer_ids: Arbitrary number of layer IDs to be removed. A maximum of 10 layers is allowed.
-
-        Raises:
-            ValueError: If more than 10 layer IDs are provided.
+            id_index (dict): Elements of the document by ID, built once by the caller, so that the
+                document does not need to be searched for every ID.
+            *layer_ids: IDs of the layers to be removed.
         """
-        # Check if the number of layer IDs exceeds the limit
-        if len(layer_ids) > 10:
-            raise ValueError("Cannot remove more than 10 layers at once.")
-
-        # Iterate over the provided layer IDs
-        for layer_id in layer_ids:
-            # Find the layer by its ID
-            layer = self.svg.find(f".//*[@id='{layer_id}']")
-            if layer is not None:
+        root = self.document.getroot()
+        pattern = re.compile("^(" + "|".join(re.escape(layer_id) for layer_id in layer_ids) + r")(-[0-9]+)?$")
+        for (element_id, layer) in list(id_index.items()):
+            if pattern.match(element_id) and layer.getparent() is root:
                 # Remove the layer from the SVG document
-                self.document.getroot().remove(layer)
+                root.remove(layer)
+                del id_index[element_id]
+
+    def page_content(self, pages):
+        """
+        Assigns the objects of the document to the pages, like Inkscape does when a page is moved.
+        An object belongs to the page that contains the center of its bounding box. Layers usually
+        span all pages, so the objects in a layer are assigned instead of the layer.
+
+        Args:
+            pages (list): Pages of the document (inkex.Page).
+
+        Returns:
+            list: For each page, the list of objects on it. Objects outside of all pages are left out.
+        """
+        boxes = [page.bounding_box for page in pages]
+        content = [[] for page in pages]
+
+        def add_children(parent, transform):
+            for element in parent:
+                if not isinstance(element, inkex.ShapeElement):
+                    continue
+                if isinstance(element, inkex.Layer):
+                    add_children(element, transform @ element.transform)
+                    continue
+                bbox = element.bounding_box(transform)
+                if bbox is None:
+                    continue
+                for (index, box) in enumerate(boxes):
+                    if box.left <= bbox.center_x <= box.right and box.top <= bbox.center_y <= box.bottom:
+                        content[index].append(element)
+                        break
+
+        add_children(self.svg, inkex.Transform())
+        return content
+
+    def resize_pages(self, pages, width, height, unit="mm"):
+        """
+        Resize all pages of a multi-page document and arrange them in one row, in their current order.
+        The objects on each page are moved with the page (see page_content()), so that they keep their
+        position relative to the top left corner of the page.
+        The first page determines the document size (see apply_resize_page()).
+        """
+        content = self.page_content(pages)
+        self.apply_resize_page(width, height, unit)
+        width_px = self.svg.viewport_to_unit(f"{width}{unit}")
+        height_px = self.svg.viewport_to_unit(f"{height}{unit}")
+        gap = self.svg.viewport_to_unit("10mm")
+        for (index, page) in enumerate(pages):
+            (old_x, old_y) = (page.bounding_box.left, page.bounding_box.top)
+            page.set("width", f"{width_px:g}")
+            page.set("height", f"{height_px:g}")
+            page.move_to(index * (width_px + gap), 0)
+            move = inkex.Transform(translate=(page.bounding_box.left - old_x, page.bounding_box.top - old_y))
+            if move == inkex.Transform():
+                continue
+            for element in content[index]:
+                # the translation in document coordinates, expressed in the coordinates of the element's parent
+                parent_transform = element.getparent().composed_transform()
+                element.transform = -parent_transform @ move @ parent_transform @ element.transform
 
     def effect(self):
         # chooses if to take values from presests or user provided
@@ -444,7 +523,9 @@ class PrintingMarks(inkex.EffectExtension):
 
         pages = self.svg.namedview.get_pages()
 
-        self.remove_layers("cropmarks", "helper")
+        # one traversal of the document for all layers that are to be replaced
+        id_index = {element.get("id"): element for element in self.svg.iter() if element.get("id") is not None}
+        self.remove_layers(id_index, "cropmarks", "helper")
 
         # Handle single-page document
         if len(pages) < 2:
@@ -457,7 +538,12 @@ class PrintingMarks(inkex.EffectExtension):
                 )
             self.draw_effect(self.svg.get_page_bbox(), "")
         else:
-            raise ValueError("Multiple pages are not supported")
+            if self.options.page_size != "keep":
+                self.resize_pages(pages, self.options.new_width, self.options.new_height, self.options.new_page_unit)
+            # Cropmarks, helper layer and settings for every page, named by page number
+            margins = self.margins_in_user_units()
+            for (index, page) in enumerate(pages):
+                self.draw_effect(page.bounding_box, str(index + 1), margins, len(pages))
 
 
 
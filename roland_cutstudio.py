@@ -24,23 +24,24 @@ Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 # The source code is a horrible mess. I apologize for your inconvenience, but hope that it still helps. Feel free to improve :-)
 
+# Modules that take long to import (numpy, subprocess, tempfile, json, ...) are imported in the functions that use them,
+# so that the script starts quickly for modes that do not need them (e.g. a result from the cache, the cropmark template).
+# To check: python3 roland_cutstudio_profile.py startup
 import sys
 import os
-from subprocess import Popen
-import subprocess
-import shutil
-import numpy
 from functools import reduce
 import atexit
-import filecmp
-from pathlib import Path
-import tempfile
-import random
-import string
-import json
-import re
-from typing import Optional, List, Union
-import webbrowser
+import contextlib
+import time
+import math
+from typing import TYPE_CHECKING, Optional, List, Tuple, Union
+
+if TYPE_CHECKING:
+    # only for the type annotations (in quotes), not imported at runtime
+    import tempfile
+    import numpy
+    import roland_cutstudio_cache
+    import roland_cutstudio_geometry
 
 def message(s: str):
 	sys.stderr.write(s+"\n")
@@ -81,10 +82,16 @@ def which(program, raiseError, extraPaths=[], subdir=None):
 #
 # Inkscape is called with certain "actions" to do the required cleanup
 # The idea is similar to http://bazaar.launchpad.net/~nikitakit/inkscape/svg2sif/view/head:/share/extensions/synfig_prepare.py#L181 , but more primitive - there is no need for more complicated preprocessing here
-def stripSVG_inkscape(src, dest, elements):    
+def stripSVG_inkscape(src, dest, elements, tmpdir=None):    
     # create temporary file for opening with inkscape.
     # delete this file later so that it will disappear from the "recently opened" list.
-    tmpfile = tempfile.NamedTemporaryFile(delete=False, prefix='temp-visicut-', suffix='.svg')
+    # (tmpdir: directory for this file, default: system temp directory. Must be on the same filesystem as dest.)
+    import subprocess
+    import shutil
+    import tempfile
+    import random
+    import string
+    tmpfile = tempfile.NamedTemporaryFile(delete=False, prefix='temp-visicut-', suffix='.svg', dir=tmpdir)
     tmpfile.close()
     tmpfile = tmpfile.name
     shutil.copyfile(src, tmpfile)
@@ -123,11 +130,6 @@ def stripSVG_inkscape(src, dest, elements):
     actions += ["export-do"]
 
 
-    command = [inkscape_command(), tmpfile, "--export-overwrite", "--actions=" + ";".join(actions)]
-    # to print the resulting commandline:
-    # print(" ".join(["'" + c + "'" for c in command]), file=sys.stderr)
-    
-    
     DEBUG = False
     if DEBUG:
         # Inkscape sometimes silently ignores wrong verbs, so we need to double-check that everything's right
@@ -136,12 +138,34 @@ def stripSVG_inkscape(src, dest, elements):
             if action not in action_list:
                 sys.stderr.write("Inkscape does not have the action '{}'. Please report this as a VisiCut bug.".format(action))
         
+    # The result is written to a new file, so that a failed export cannot leave the unchanged input in its place.
+    outfile = tmpfile[:-len(".svg")] + "-out.svg"
+    if inkscape_shell_pool is not None and ";" not in tmpfile + outfile:
+        # persistent Inkscape process: the file must be opened, written and closed explicitly.
+        # (";" separates the actions, so filenames containing it can only be passed on the commandline)
+        start = time.perf_counter()
+        try:
+            inkscape_output = inkscape_shell_pool.run(["file-open:" + tmpfile] + actions[:-1] + ["export-filename:" + outfile, "export-overwrite:true", "export-do", "file-close"])
+        finally:
+            record_subprocess_time(start)
+            os.remove(tmpfile)
+        if not os.path.exists(outfile):
+            raise Exception("Cleaning the document with inkscape failed: no output file was written.\nInkscape's output was:\n" + str(inkscape_output))
+        os.rename(outfile, dest)
+        return
+
+    command = [inkscape_command(), tmpfile, "--export-overwrite", "--actions=" + ";".join(actions)]
+    # to print the resulting commandline:
+    # print(" ".join(["'" + c + "'" for c in command]), file=sys.stderr)
+
     inkscape_output = "(not yet run)"
     try:
         #sys.stderr.write(" ".join(command))
         # run inkscape, buffer output
+        start = time.perf_counter()
         inkscape = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
         inkscape_output = inkscape.communicate()[0]
+        record_subprocess_time(start)
         if inkscape.returncode != 0:
             sys.stderr.write("Error: cleaning the document with inkscape failed. Something might still be shown in visicut, but it could be incorrect.\nInkscape's output was:\n" + str(inkscape_output))
     except:
@@ -288,77 +312,410 @@ end
 
 """
 
-def EPS2CutstudioEPS(src: str, dest: str, mirror: bool = False, cropmark_settings : Optional[dict] = None):
+def split_cutstudio_eps_template(cropmark_settings: Optional[dict]) -> List[str]:
     """
-    Convert original EPS (from Inkscape) to something that CutStudio understands.
+    Return [header, footer] of CUTSTUDIO_EPS_TEMPLATE, incl. the magic comment for cropmark locations.
+    The cutting lines are to be written between header and footer.
+    """
+    epsContent = CUTSTUDIO_EPS_TEMPLATE.replace("%<CROPMARK_INSERTED_HERE>\n", make_cropmark_header(cropmark_settings))
+    return epsContent.split("%<CUTTING_LINES_INSERTED_HERE>\n")
 
-    Mainly, we ungroup all groups and apply all transformations.
-    To implement this we build a crude EPS parser.
+# Output format of the drawing commands, used by EPS2CutstudioEPS
+OUTPUT_TEMPLATES = {
+    "m": "{} {} m\n",
+    "l": "{} {} l\n",
+    "c": "{} {} {} {} {} {} c\n",
+}
+# Number of points (coordinate pairs) of each drawing command
+OP_POINTS = {"m": 1, "l": 1, "c": 3}
 
-    :param mirror: Mirror horizontally
+# First characters of numeric tokens in EPS files. All other tokens are treated as operators by EPS2CutstudioEPS.
+NUMBER_START = frozenset("0123456789.+-")
+# Maximum number of operands used by any of the operators that EPS2CutstudioEPS handles (c, cm)
+MAX_OPERANDS = 6
 
-    :param cropmark_settings:
-        'None' for normal cutting.
-        To enable cropmark scanning, set it to a dict specifying the page size (pageW, pageH)
-        and the cropmark location settings (dx, dy, W, H) as defined in make_cropmark_header()
+# Maximum number of drawing commands that EPS2CutstudioEPS queues before writing them.
+# This keeps memory usage constant for huge files without transformation changes.
+MAX_RUN_LENGTH = 10000
+
+# Minimum size in bytes of the chunks that convert_eps_parallel() converts in parallel. Smaller files are converted in one process.
+PARALLEL_CHUNK_SIZE = 4 * 1024 * 1024
+
+def output_transformations(mirror: bool, cropmark_settings: Optional[dict]) -> List["numpy.ndarray"]:
     """
-    def outputFromStack(stack, n, transformCoordinates=True):
-        arr=stack[-(n+1):-1]
-        if transformCoordinates:
-            arrTransformed=[]
-            for i in range(n//2):
-                arrTransformed+=transform(arr[2*i], arr[2*i+1])
-            return output(arrTransformed+[stack[-1]])
-        else:
-            return output(arr+[stack[-1]])
-    def transform(x, y):
-        #debug("trafo from: {} {}".format(x, y))
-        p=numpy.array([[float(x),float(y),1]]).transpose()
-        multiply = lambda a, b: numpy.matmul(a, b)
-        # concatenate transformations by multiplying: new = transformation x previousTransformtaion
-        m=reduce(multiply, scalingStack[::-1])
-        m=m.transpose()
-        #debug("with {}".format(m))
-        pnew = numpy.matmul(m, p)
-        x=float(pnew.item(0))
-        y=float(pnew.item(1))
-        #debug("to: {} {}".format(x, y))
-        return [x, y]
-    def outputMoveto(x, y):
-        [xx, yy]=transform(x, y)
-        return output([str(xx), str(yy), "m"])
-    def outputLineto(x, y):
-        [xx, yy]=transform(x, y)
-        return output([str(xx), str(yy), "l"])
-    def output(array):
-        array=list(map(str, array))
-        output=" ".join(array)
-        #debug("OUTPUT: "+output)
-        return output + "\n"
-    stack=[]
-    scalingStack=[numpy.identity(3)]     
-    lastMoveCoordinates=None
-    
-    # Set up initial transformation
+    Transformations from Inkscape EPS coordinates to CutStudio coordinates,
+    as 3x3 matrices for row vectors [x, y, 1] in the order of the transformation stack.
+
+    :param mirror: Mirror horizontally
+    :param cropmark_settings: see EPS2CutstudioEPS()
+    """
+    import numpy
+    transformations = []
     if mirror and cropmark_settings:
         raise Exception("Mirror horizontal is not supported when cropmarks are used")
     if mirror:
         # Horizontal mirroring is enabled by user
-        scalingStack.append(numpy.diag([-1, 1, 1]))
+        transformations.append(numpy.diag([-1, 1, 1]))
     if cropmark_settings:
         # Translation for cropmarks (cropmark is always at fixed position, cut lines must be moved appropriately)
         # 5 is the currently hardcoded value of BaseX and BaseY
         translate_x = mm_to_pt(5 - cropmark_settings["dx"])
         translate_y = mm_to_pt(5 - cropmark_settings["dy"])
         # FIXME: why is .transpose() needed here?
-        scalingStack.append(numpy.array([[1, 0, translate_x], [0, 1, translate_y], [0, 0, 1]]).transpose())
+        transformations.append(numpy.array([[1, 0, translate_x], [0, 1, translate_y], [0, 0, 1]]).transpose())
+    return transformations
+
+def cropmark_cutting_area(cropmark_settings: Optional[dict]) -> Optional[Tuple[float, float, float, float]]:
+    """
+    Area between the cropmarks in CutStudio coordinates (pt) as (x_min, y_min, x_max, y_max), or None without cropmarks.
+
+    The center of the bottom left cropmark is at (5 mm, 5 mm) after output_transformations(),
+    the cropmarks have a radius of 5 mm (see roland_cropmark_editor.py).
+    """
+    if not cropmark_settings:
+        return None
+    return (mm_to_pt(10), mm_to_pt(10), mm_to_pt(cropmark_settings["W"]), mm_to_pt(cropmark_settings["H"]))
+
+def transform_coordinates(coordinates, matrix: "numpy.ndarray") -> "numpy.ndarray":
+    """
+    Transform coordinates (x1, y1, x2, y2, ...), given as list of numbers or numeric strings.
+    
+    :param matrix: 3x3 matrix m that transforms a row vector [x, y, 1] to [x', y', 1] = [x, y, 1] * m
+    :return: numpy array of shape (n, 2)
+    """
+    import numpy
+    # Each point is transformed by the same matrix x column vector product as by a single transformation
+    # (transposed matrix x [x, y, 1]^T), so that the output does not change in the last bit.
+    # A single (n, 3) x (3, 3) product would be computed by a different BLAS routine, whose rounding may differ.
+    points = numpy.ones((len(coordinates) // 2, 1, 3))
+    points[:, 0, 0:2] = numpy.array(coordinates, dtype=numpy.float64).reshape(-1, 2)
+    return numpy.matmul(matrix.transpose(), points.transpose(0, 2, 1))[:, 0:2, 0]
+
+class NumberEncoder:
+    """
+    Compact output format of the drawing commands: coordinates are rounded to a fixed number of decimals (in pt),
+    and trailing zeros are removed. Counts the bytes saved compared to full precision.
+    """
+    # more decimals would be formatted in exponential notation by repr() for small numbers
+    MAX_DECIMALS = 4
+
+    def __init__(self, decimals: int):
+        """
+        :param decimals: number of decimals of coordinates in pt, 0 ... MAX_DECIMALS
+        """
+        if not 0 <= decimals <= self.MAX_DECIMALS:
+            raise ValueError("number of decimals must be between 0 and {}".format(self.MAX_DECIMALS))
+        self.decimals = decimals
+        self.bytes_saved = 0
+
+    @classmethod
+    def from_resolution(cls, resolution: float, unit: str = "mm") -> "NumberEncoder":
+        """
+        Encoder with the fewest decimals that keep the coordinates exact to the given resolution.
+        
+        :param unit: unit of resolution, "mm" or "pt"
+        """
+        resolution_pt = mm_to_pt(resolution) if unit == "mm" else resolution
+        decimals = math.ceil(-math.log10(resolution_pt) - 1e-9)
+        return cls(min(max(decimals, 0), cls.MAX_DECIMALS))
+
+    def format_points(self, ops: List[str], points: "numpy.ndarray") -> str:
+        """
+        See format_points()
+        """
+        import numpy
+        template = "".join(map(OUTPUT_TEMPLATES.__getitem__, ops))
+        full = template.format(*points.ravel().tolist())
+        # numpy.round() returns the double closest to the rounded decimal, which "{}" formats without extra digits.
+        # Adding 0.0 changes -0.0 to 0.0.
+        rounded = numpy.round(points, self.decimals) + 0.0
+        # Every number is followed by a space, so ".0 " can only be the end of a whole number.
+        compact = template.format(*rounded.ravel().tolist()).replace(".0 ", " ")
+        self.bytes_saved += len(full) - len(compact)
+        return compact
+
+def format_points(ops: List[str], points: "numpy.ndarray", encoder: Optional[NumberEncoder] = None) -> str:
+    """
+    Format drawing commands for CutStudio.
+    
+    :param ops: commands "m", "l" or "c"
+    :param points: numpy array of shape (n, 2) with the points of all commands
+    :param encoder: compact number format, or None for full precision
+    """
+    if not ops:
+        return ""
+    if encoder is not None:
+        return encoder.format_points(ops, points)
+    # format everything with one call: "{}" formats floats the same way as str()
+    template = "".join(map(OUTPUT_TEMPLATES.__getitem__, ops))
+    return template.format(*points.ravel().tolist())
+
+def format_drawing_commands(ops: List[str], coordinates, matrix: "numpy.ndarray", encoder: Optional[NumberEncoder] = None) -> str:
+    """
+    Transform and format drawing commands for CutStudio.
+
+    :param ops: commands "m", "l" or "c"
+    :param coordinates, matrix: see transform_coordinates()
+    :param encoder: see format_points()
+    """
+    if not ops:
+        return ""
+    return format_points(ops, transform_coordinates(coordinates, matrix), encoder)
+
+def write_path_arrays(outputFile, paths: "roland_cutstudio_geometry.PathArrays", encoder: Optional[NumberEncoder] = None):
+    """
+    Write cut lines as drawing commands, in chunks of MAX_RUN_LENGTH commands.
+    """
+    pointOffsets = paths.command_point_offsets()
+    for start in range(0, paths.command_count(), MAX_RUN_LENGTH):
+        end = min(start + MAX_RUN_LENGTH, paths.command_count())
+        outputFile.write(format_points(paths.ops(start, end), paths.points[pointOffsets[start]:pointOffsets[end]], encoder))
+
+def write_geometry(outputFile, geometry: "roland_cutstudio_geometry.CutGeometry", encoder: Optional[NumberEncoder] = None):
+    """
+    Write all subpaths of the geometry as drawing commands, see write_path_arrays()
+    """
+    import roland_cutstudio_geometry
+    write_path_arrays(outputFile, roland_cutstudio_geometry.PathArrays.from_geometry(geometry), encoder)
+
+def panel_filename(dest: str, number: int) -> str:
+    """
+    Output file of panel number (1, 2, ...) of a tiled job, e.g. x.cutstudio.eps -> x.panel1.cutstudio.eps
+    """
+    if dest.endswith(".cutstudio.eps"):
+        return dest[:-len(".cutstudio.eps")] + ".panel{}.cutstudio.eps".format(number)
+    return dest + ".panel{}.eps".format(number)
+
+def write_panels(dest: str, geometry: "roland_cutstudio_geometry.CutGeometry", geometry_options: dict, cropmark_settings: Optional[dict] = None, encoder: Optional[NumberEncoder] = None) -> dict:
+    """
+    Split the cut lines into panels (geometry_options tile_width and tile_overlap, see EPS2CutstudioEPS())
+    and write each panel to panel_filename(dest, number).
+
+    :return: statistics: number of panels
+    """
+    import roland_cutstudio_geometry
+    if cropmark_settings:
+        raise Exception("Tiling is not supported when cropmarks are used")
+    panels = roland_cutstudio_geometry.tile(geometry, mm_to_pt(geometry_options["tile_width"]), mm_to_pt(geometry_options.get("tile_overlap", 0)))
+    [epsHeader, epsFooter] = split_cutstudio_eps_template(None)
+    for (number, panel) in enumerate(panels, 1):
+        with open(panel_filename(dest, number), "w") as outputFile:
+            outputFile.write(epsHeader)
+            write_geometry(outputFile, panel, encoder)
+            outputFile.write(epsFooter)
+    return {"panels": len(panels)}
+
+def process_geometry(geometry_options: Optional[dict]) -> bool:
+    """
+    Return True if any option in geometry_options changes the cut lines.
+    Then, the cut lines are collected in memory (see roland_cutstudio_geometry.PathArrays) and processed before they are written.
+    Options that are set to their neutral value (e.g. one column and row, no tile width) keep the output streamed.
+    """
+    if not geometry_options:
+        return False
+    return bool(geometry_options.get("remove_duplicates") or geometry_options.get("optimize_order")
+                or geometry_options.get("simplify_tolerance", 0) > 0 or geometry_options.get("tile_width", 0) > 0
+                or geometry_options.get("repeat_columns", 0) > 1 or geometry_options.get("repeat_rows", 0) > 1)
+
+def write_cutstudio_eps(dest: str, ops: List[str], coordinates, mirror: bool = False, cropmark_settings: Optional[dict] = None, geometry_options: Optional[dict] = None, precision: Optional[float] = None) -> dict:
+    """
+    Write drawing commands that are already in Inkscape EPS coordinates (pt, origin bottom left) to a CutStudio EPS file.
+
+    :param ops, coordinates: see format_drawing_commands()
+    :param mirror, cropmark_settings, geometry_options, precision: see EPS2CutstudioEPS()
+    :return: statistics of the optimizations, see EPS2CutstudioEPS()
+    """
+    import numpy
+    encoder = NumberEncoder.from_resolution(precision) if precision else None
+    transformations = [numpy.identity(3)] + output_transformations(mirror, cropmark_settings)
+    matrix = reduce(numpy.matmul, transformations[::-1])
+    if profiler is not None:
+        profiler.count(commands=len(ops), points=len(coordinates) // 2)
+    [epsHeader, epsFooter] = split_cutstudio_eps_template(cropmark_settings)
+    if process_geometry(geometry_options):
+        import roland_cutstudio_geometry
+        geometry = roland_cutstudio_geometry.PathArrays.from_commands(ops, transform_coordinates(coordinates, matrix)).to_geometry()
+        stats = roland_cutstudio_geometry.process(geometry, geometry_options, cropmark_cutting_area(cropmark_settings))
+        if profiler is not None:
+            profiler.count(output_commands=geometry.command_count())
+        with open(dest, "w") as outputFile:
+            outputFile.write(epsHeader)
+            write_geometry(outputFile, geometry, encoder)
+            outputFile.write(epsFooter)
+        if encoder is not None:
+            stats["bytes_saved"] = encoder.bytes_saved
+        if geometry_options.get("tile_width"):
+            stats.update(write_panels(dest, geometry, geometry_options, cropmark_settings, encoder))
+        return stats
+    with open(dest, "w") as outputFile:
+        outputFile.write(epsHeader)
+        # write in chunks to limit the memory needed for formatting
+        startCoordinate = 0
+        for start in range(0, len(ops), MAX_RUN_LENGTH):
+            chunkOps = ops[start:start + MAX_RUN_LENGTH]
+            endCoordinate = startCoordinate + 2 * sum(map(OP_POINTS.__getitem__, chunkOps))
+            outputFile.write(format_drawing_commands(chunkOps, coordinates[startCoordinate:endCoordinate], matrix, encoder))
+            startCoordinate = endCoordinate
+        outputFile.write(epsFooter)
+    if encoder is not None:
+        return {"bytes_saved": encoder.bytes_saved}
+    return {}
+
+def EPS2CutstudioEPS(src, dest: str, mirror: bool = False, cropmark_settings : Optional[dict] = None, geometry_options: Optional[dict] = None, precision: Optional[float] = None, jobs: Optional[int] = 1) -> dict:
+    """
+    Convert original EPS (from Inkscape) to something that CutStudio understands.
+
+    Mainly, we ungroup all groups and apply all transformations.
+    To implement this we build a crude EPS parser.
+
+    The input is read line by line and the result is streamed to dest,
+    so that memory usage does not depend on the file size.
+
+    :param src: File path of the Inkscape EPS file, or a text stream (e.g. Inkscape's stdout, see inkscape_eps_pipe())
+
+    :param mirror: Mirror horizontally
+
+    :param cropmark_settings:
+        'None' for normal cutting.
+        To enable cropmark scanning, set it to a dict specifying the page size (pageW, pageH)
+        and the cropmark location settings (dx, dy, W, H) as defined in make_cropmark_header()
+
+    :param geometry_options:
+        Optimizations of the cut lines, see roland_cutstudio_geometry.process().
+        'None' or {} for none. Then, the output is streamed. Else, all cut lines are kept in memory.
+        - remove_duplicates (bool): remove segments that are cut more than once, e.g. shared edges of adjacent shapes
+        - simplify_tolerance (float): simplify runs of lines with this tolerance in mm, 0 for no simplification
+        - optimize_order (bool): reorder paths to minimize travel with the blade up
+        - repeat_columns, repeat_rows (int): step and repeat, i.e. cut columns x rows copies of the design, 0 or 1 for no copies
+        - repeat_spacing (float): distance between the copies in mm. With cropmarks, copies outside of the cutting area are left out.
+        - tile_width (float): additionally split the cut lines into panels of this width in mm, 0 for no tiling.
+          Each panel is written to a separate file, see write_panels().
+        - tile_overlap (float): overlap of the panels in mm
+
+    :param precision:
+        Resolution of the output coordinates in mm, see NumberEncoder.
+        'None' or 0 for full precision (unchanged output of str()).
+
+    :param jobs:
+        Number of processes for converting large files in parallel, see convert_eps_parallel().
+        1 (default) to convert in this process, None or 0 for the number of CPU cores.
+        Only used if src is a file path and no geometry_options are enabled. The output is the same.
+
+    :return: statistics of the optimizations (e.g. travel distance before and after) and of the compact number format (bytes_saved)
+    """
+    import numpy
+    # Set up initial transformation
+    scalingStack = [numpy.identity(3)] + output_transformations(mirror, cropmark_settings)
+    
+    # Postscript Header and footer, incl. magic comment for cropmark locations
+    [epsHeader, epsFooter] = split_cutstudio_eps_template(cropmark_settings)
     
-    outputStr = ""
+    # collected cut lines (roland_cutstudio_geometry.PathArrays of each run), if optimizations are enabled
+    collected = [] if process_geometry(geometry_options) else None
+    geometry = None
+    stats = {}
+    encoder = NumberEncoder.from_resolution(precision) if precision else None
     
     # Actual EPS content
-    inputFile=open(src)
+    jobs = jobs or os.cpu_count() or 1
+    parallel = (jobs > 1 and collected is None and isinstance(src, (str, os.PathLike))
+                and os.path.getsize(src) >= 2 * PARALLEL_CHUNK_SIZE)
+    inputFile=None if parallel else (open(src) if isinstance(src, (str, os.PathLike)) else src)
     outputFile=open(dest, "w")
-    for line in inputFile.readlines():
+    outputFile.write(epsHeader)
+    if parallel:
+        counts = convert_eps_parallel(src, outputFile.write, scalingStack, encoder, jobs)
+    else:
+        counts = convert_eps_lines(inputFile, outputFile.write, scalingStack, encoder=encoder, collected=collected)
+    if collected is not None:
+        import roland_cutstudio_geometry
+        paths = roland_cutstudio_geometry.PathArrays.concatenate(collected)
+        collected = None
+        if profiler is not None:
+            profiler.count(geometry_bytes=paths.nbytes)
+        geometry = paths.to_geometry()
+        del paths
+        stats = roland_cutstudio_geometry.process(geometry, geometry_options, cropmark_cutting_area(cropmark_settings))
+        if profiler is not None:
+            profiler.count(output_commands=geometry.command_count())
+        write_geometry(outputFile, geometry, encoder)
+    outputFile.write(epsFooter)
+    outputFile.close()
+    if inputFile is not None and inputFile is not src:
+        inputFile.close()
+    if encoder is not None:
+        stats["bytes_saved"] = encoder.bytes_saved
+    if geometry is not None and geometry_options.get("tile_width"):
+        stats.update(write_panels(dest, geometry, geometry_options, cropmark_settings, encoder))
+    if profiler is not None:
+        profiler.count(commands=counts["commands"], points=counts["points"])
+    return stats
+
+def convert_eps_lines(lines, write, scalingStack: list, lastMoveCoordinates: Optional[list] = None, encoder: Optional[NumberEncoder] = None, collected: Optional[list] = None) -> dict:
+    """
+    The parser of EPS2CutstudioEPS(): convert lines of an Inkscape EPS file to drawing commands for CutStudio.
+
+    :param lines: iterable of lines, e.g. a file
+    :param write: function that is called with the converted commands (string) as they are converted
+    :param scalingStack: transformation stack at the start (3x3 matrices, see composeTransform()). It is changed to the state at the end.
+    :param lastMoveCoordinates: coordinates of the last moveto before the lines, for a closepath at the beginning
+    :param encoder: see format_points()
+    :param collected: list to which roland_cutstudio_geometry.PathArrays are appended instead of writing the commands, or None
+    :return: number of drawing commands and points: {"commands": ..., "points": ...}
+    """
+    import numpy
+    if collected is not None:
+        import roland_cutstudio_geometry
+    def composeTransform():
+        """
+        Concatenate the transformations on scalingStack by multiplying: new = transformation x previousTransformation.
+        
+        Returns a 3x3 matrix m that transforms a row vector [x, y, 1] to [x', y', 1] = [x, y, 1] * m
+        """
+        multiply = lambda a, b: numpy.matmul(a, b)
+        return reduce(multiply, scalingStack[::-1])
+    def addToRun(op, coordinates):
+        """
+        Queue a drawing command (m, l, c) with untransformed coordinates.
+        It is output by flushRun() as soon as the transformation changes.
+        """
+        runOps.append(op)
+        runCoordinates.extend(coordinates)
+        if len(runOps) >= MAX_RUN_LENGTH:
+            write(flushRun())
+    def flushRun():
+        """
+        Transform all queued coordinates at once (they all share the current transformation)
+        and return the resulting commands as string.
+        """
+        nonlocal currentTransform, runOps, runCoordinates, commandCount, pointCount
+        if not runOps:
+            return ""
+        commandCount += len(runOps)
+        pointCount += len(runCoordinates) // 2
+        # The composed matrix is only recalculated after q, Q or cm changed scalingStack.
+        if currentTransform is None:
+            currentTransform = composeTransform()
+        if collected is not None:
+            # keep cut lines for optimization
+            collected.append(roland_cutstudio_geometry.PathArrays.from_commands(runOps, transform_coordinates(runCoordinates, currentTransform)))
+            output = ""
+        else:
+            output = format_drawing_commands(runOps, runCoordinates, currentTransform, encoder)
+        runOps = []
+        runCoordinates = []
+        return output
+    stack=[]
+    # cache of the composed transformation of scalingStack, None if it needs to be recalculated
+    currentTransform=None
+    # queued drawing commands and their untransformed coordinates (x1, y1, x2, y2, ...), see addToRun()
+    runOps=[]
+    runCoordinates=[]
+    # number of drawing commands and points, for profiling
+    commandCount=0
+    pointCount=0
+    
+    for line in lines:
         line=line.strip()
         if line.startswith("%"):
             # comment line
@@ -366,53 +723,243 @@ def EPS2CutstudioEPS(src: str, dest: str, mirror: bool = False, cropmark_setting
         if line.endswith("re W n"): 
             continue # ignore clipping rectangle
         #debug(line)
-        for item in line.split(" "):
-            item=item.strip()
-            if item=="":
+        tokens = line.split()
+        if not tokens:
+            continue
+        item = tokens[-1]
+        if item in OP_POINTS and len(tokens) == 2 * OP_POINTS[item] + 1 and not stack:
+            # fast path: one moveto, lineto or curveto per line (as written by Inkscape)
+            if item == "m":
+                lastMoveCoordinates = tokens[:-1]
+            addToRun(item, tokens[:-1])
+            continue
+        # The operand stack only holds the numbers since the last operator.
+        for item in tokens:
+            if item[0] in NUMBER_START:
+                stack.append(item)
+                if len(stack) > MAX_OPERANDS:
+                    del stack[0]
                 continue
             #debug("INPUT: " + item.__repr__())
-            stack.append(item)
             if item=="h": # close path
                 assert lastMoveCoordinates,  "closed path before first moveto"
-                outputStr += outputLineto(float(lastMoveCoordinates[0]), float(lastMoveCoordinates[1]))
+                addToRun("l", lastMoveCoordinates)
             elif item == "c": # bezier curveto
-                outputStr += outputFromStack(stack, 6)
-                stack=[]
+                addToRun("c", stack[-6:])
             elif item=="re": # rectangle
-                    x=float(stack[-5])
-                    y=float(stack[-4])
-                    dx=float(stack[-3])
-                    dy=float(stack[-2])
-                    outputStr += outputMoveto(x, y)
-                    outputStr += outputLineto(x+dx, y)
-                    outputStr += outputLineto(x+dx, y+dy)
-                    outputStr += outputLineto(x, y+dy)
-                    outputStr += outputLineto(x, y)
+                    x=float(stack[-4])
+                    y=float(stack[-3])
+                    dx=float(stack[-2])
+                    dy=float(stack[-1])
+                    addToRun("m", [x, y])
+                    addToRun("l", [x+dx, y])
+                    addToRun("l", [x+dx, y+dy])
+                    addToRun("l", [x, y+dy])
+                    addToRun("l", [x, y])
             elif item=="cm": # matrix transformation
-                newTrafo=numpy.array([[float(stack[-7]), float(stack[-6]), 0], [float(stack[-5]), float(stack[-4]), 0], [float(stack[-3]), float(stack[-2]), 1]])
+                write(flushRun())
+                newTrafo=numpy.array([[float(stack[-6]), float(stack[-5]), 0], [float(stack[-4]), float(stack[-3]), 0], [float(stack[-2]), float(stack[-1]), 1]])
                 #debug("applying trafo "+str(newTrafo))
                 scalingStack[-1] = numpy.matmul(scalingStack[-1], newTrafo)
+                currentTransform = None
             elif item=="q": # save graphics state to stack
+                write(flushRun())
                 scalingStack.append(numpy.identity(3))
+                currentTransform = None
             elif item=="Q": # pop graphics state from stack
+                write(flushRun())
                 scalingStack.pop()
+                currentTransform = None
             elif item in ["m", "l"]:
                 if item=="m": # moveto
-                    lastMoveCoordinates=stack[-3:-1]
+                    lastMoveCoordinates=stack[-2:]
                 elif item=="l": # lineto
                     pass
-                outputStr += outputFromStack(stack, 2)
-                stack=[]
+                addToRun(item, stack[-2:])
             else:
                 pass # do nothing
-        
-    # Postscript Header and footer, incl. magic comment for cropmark locations
-    epsContent = CUTSTUDIO_EPS_TEMPLATE
-    epsContent = epsContent.replace("%<CROPMARK_INSERTED_HERE>\n", make_cropmark_header(cropmark_settings))
-    epsContent = epsContent.replace("%<CUTTING_LINES_INSERTED_HERE>\n", outputStr)
-    outputFile.write(epsContent)
-    outputFile.close()
-    inputFile.close()
+            # every operator consumes its operands
+            stack.clear()
+    write(flushRun())
+    return {"commands": commandCount, "points": pointCount}
+
+def scan_graphics_state(lines) -> dict:
+    """
+    Pre-scan for convert_eps_parallel(): determine the effect of lines of an Inkscape EPS file on the state of convert_eps_lines()
+    (transformation stack and last moveto), without knowing the state at their start.
+    The lines are tokenized exactly like convert_eps_lines() does, so that the resulting state is identical.
+
+    :return: dict with
+        outer: operations on the levels of the transformation stack that already existed at the start, in order:
+            ("Q", None) removes the innermost level, ("cm", matrix) multiplies it by matrix
+        pushed: matrices of the levels that were added by q and are still there at the end
+        lastMoveCoordinates: coordinates of the last moveto, None if there is none
+    """
+    import numpy
+    stack = []
+    outer = []
+    pushed = []
+    lastMoveCoordinates = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith("%") or line.endswith("re W n"):
+            continue
+        tokens = line.split()
+        if not tokens:
+            continue
+        item = tokens[-1]
+        if item in OP_POINTS and len(tokens) == 2 * OP_POINTS[item] + 1 and not stack:
+            if item == "m":
+                lastMoveCoordinates = tokens[:-1]
+            continue
+        for item in tokens:
+            if item[0] in NUMBER_START:
+                stack.append(item)
+                if len(stack) > MAX_OPERANDS:
+                    del stack[0]
+                continue
+            if item == "cm":
+                newTrafo = numpy.array([[float(stack[-6]), float(stack[-5]), 0], [float(stack[-4]), float(stack[-3]), 0], [float(stack[-2]), float(stack[-1]), 1]])
+                if pushed:
+                    pushed[-1] = numpy.matmul(pushed[-1], newTrafo)
+                else:
+                    outer.append(("cm", newTrafo))
+            elif item == "q":
+                pushed.append(numpy.identity(3))
+            elif item == "Q":
+                if pushed:
+                    pushed.pop()
+                else:
+                    outer.append(("Q", None))
+            elif item == "m":
+                lastMoveCoordinates = stack[-2:]
+            stack.clear()
+    return {"outer": outer, "pushed": pushed, "lastMoveCoordinates": lastMoveCoordinates}
+
+def apply_graphics_state(scalingStack: list, lastMoveCoordinates: Optional[list], scan: dict) -> Optional[list]:
+    """
+    Change the state of convert_eps_lines() like the lines that were scanned by scan_graphics_state().
+    The matrices are multiplied in the same order as convert_eps_lines() does, so the result is exactly the same.
+
+    :param scalingStack: transformation stack, changed in place
+    :return: new lastMoveCoordinates
+    """
+    import numpy
+    for (op, matrix) in scan["outer"]:
+        if op == "Q":
+            scalingStack.pop()
+        else:
+            scalingStack[-1] = numpy.matmul(scalingStack[-1], matrix)
+    scalingStack += scan["pushed"]
+    if scan["lastMoveCoordinates"] is not None:
+        return scan["lastMoveCoordinates"]
+    return lastMoveCoordinates
+
+def is_chunk_boundary(line: bytes) -> bool:
+    """
+    True if convert_eps_lines() has no queued commands and no operands after this line:
+    the line is not skipped and its last token is q, Q or cm (which write all queued commands, see flushRun()).
+    """
+    line = line.strip()
+    if b"\r" in line or line.startswith(b"%") or line.endswith(b"re W n"):
+        # (a single CR is a line break for convert_eps_lines())
+        return False
+    return line.endswith((b" q", b" Q", b" cm")) or line in (b"q", b"Q")
+
+def find_eps_chunks(src: str, count: int) -> List[Tuple[int, int]]:
+    """
+    Split an EPS file into up to count chunks (byte ranges [start, end)) that end after a line for which is_chunk_boundary() is True.
+
+    Lines end with LF or CRLF. A file with CR alone as line break (which convert_eps_lines() also accepts)
+    is read as one long line without boundaries, so it is not split and converted in one process.
+    """
+    size = os.path.getsize(src)
+    boundaries = [0]
+    with open(src, "rb") as f:
+        for i in range(1, count):
+            target = size * i // count
+            if target <= boundaries[-1]:
+                continue
+            # skip to the start of the next line, then to the next boundary
+            f.seek(target - 1)
+            f.readline()
+            for line in iter(f.readline, b""):
+                if is_chunk_boundary(line):
+                    boundaries.append(f.tell())
+                    break
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def read_eps_chunk(src: str, start: int, end: int):
+    """
+    Lines of the byte range [start, end) of a file, decoded like open(src) does
+    """
+    import io
+    with open(src, "rb") as f:
+        f.seek(start)
+        return io.TextIOWrapper(io.BytesIO(f.read(end - start)))
+
+def scan_eps_chunk(src: str, start: int, end: int) -> dict:
+    """
+    scan_graphics_state() of a chunk, runs in a worker process of convert_eps_parallel()
+    """
+    return scan_graphics_state(read_eps_chunk(src, start, end))
+
+def convert_eps_chunk(src: str, start: int, end: int, scalingStack: list, lastMoveCoordinates: Optional[list], decimals: Optional[int]) -> Tuple[str, dict, int]:
+    """
+    convert_eps_lines() of a chunk, runs in a worker process of convert_eps_parallel()
+
+    :param decimals: see NumberEncoder, None for full precision
+    :return: converted commands, number of commands and points, bytes saved by the NumberEncoder
+    """
+    encoder = NumberEncoder(decimals) if decimals is not None else None
+    output = []
+    counts = convert_eps_lines(read_eps_chunk(src, start, end), output.append, scalingStack, lastMoveCoordinates, encoder)
+    return ("".join(output), counts, encoder.bytes_saved if encoder is not None else 0)
+
+def convert_eps_parallel(src: str, write, scalingStack: list, encoder: Optional[NumberEncoder] = None, jobs: Optional[int] = None) -> dict:
+    """
+    Like convert_eps_lines() for a whole file, but the file is split into chunks that are converted in parallel processes.
+    The output is identical.
+
+    The chunks end at q, Q or cm (see find_eps_chunks()). The state at the start of each chunk is determined by
+    pre-scanning the previous chunks in parallel (scan_graphics_state()) and applying the results in order (apply_graphics_state()).
+    Then, the chunks are converted and the results are written in order.
+
+    :param jobs: number of processes, None or 0 for the number of CPU cores
+    """
+    import collections
+    import concurrent.futures
+    jobs = jobs or os.cpu_count() or 1
+    chunks = find_eps_chunks(src, max(1, min(4 * jobs, os.path.getsize(src) // PARALLEL_CHUNK_SIZE)))
+    if len(chunks) == 1:
+        # no q, Q or cm (e.g. a single huge path): nothing to split
+        with open(src) as inputFile:
+            return convert_eps_lines(inputFile, write, scalingStack, encoder=encoder)
+    decimals = encoder.decimals if encoder is not None else None
+    counts = {"commands": 0, "points": 0}
+    lastMoveCoordinates = None
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+        scans = [pool.submit(scan_eps_chunk, src, start, end) for (start, end) in chunks[:-1]]
+        # Limit the number of converted chunks that wait to be written, to limit memory usage
+        pending = collections.deque()
+        def write_result():
+            (output, chunkCounts, bytesSaved) = pending.popleft().result()
+            write(output)
+            counts["commands"] += chunkCounts["commands"]
+            counts["points"] += chunkCounts["points"]
+            if encoder is not None:
+                encoder.bytes_saved += bytesSaved
+        for (i, (start, end)) in enumerate(chunks):
+            if len(pending) >= 2 * jobs:
+                write_result()
+            pending.append(pool.submit(convert_eps_chunk, src, start, end, list(scalingStack), lastMoveCoordinates, decimals))
+            if i < len(scans):
+                lastMoveCoordinates = apply_graphics_state(scalingStack, lastMoveCoordinates, scans[i].result())
+        while pending:
+            write_result()
+    return counts
 
 def parse_cropmark_settings(svg_contents: str) -> Optional[dict]:
     """
@@ -435,16 +982,130 @@ def parse_cropmark_settings(svg_contents: str) -> Optional[dict]:
     
     W, H: distance in X/Y between center of cropmarks
     
+    pages (optional): number of pages of the document, if the cropmark editor drew cropmarks on more than one page.
+    Only the first page would be exported, so such documents are rejected.
+    
     """
+    import re
     match = re.search(r'INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS=(\{["a-zA-Z0-9,\.: ]+\})', svg_contents.replace("&quot;", '"'))
     if not match:
         return None
+    import json
     settings = json.loads(match.group(1))
     if settings.get("version") != 1:
         raise Exception("invalid cropmark settings version. Please use the newest template file.")
+    if settings.get("pages", 1) > 1:
+        raise Exception("Cropmarks on documents with multiple pages are not supported. Please copy each page into a separate document and cut it from there.")
     return settings
 
-assert parse_cropmark_settings('INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS={"version":1, "pageW":210, "pageH":297, "dx":20, "dy":25, "W":170, "H":120}'.replace('"', '&quot;')) == {"version": 1, "pageW": 210, "pageH": 297, "dx": 20, "dy": 25, "W": 170, "H": 120};
+# Marker of the cropmark settings text, see parse_cropmark_settings()
+CROPMARK_SETTINGS_MARKER = b"INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS="
+# Maximum length of the settings after the marker (incl. &quot; escapes) that find_cropmark_settings() passes to parse_cropmark_settings()
+MAX_CROPMARK_SETTINGS_LENGTH = 1000
+
+def find_cropmark_settings(filename: str, chunk_size: int = 1024 * 1024) -> Optional[dict]:
+    """
+    Determine the cropmark settings of an SVG file, like parse_cropmark_settings() of the whole file contents.
+
+    The file is scanned in chunks for the marker, and the scan stops at the first valid settings text.
+    Only the text following a marker is decoded and parsed. Large files (e.g. with embedded photos)
+    are therefore never loaded into memory as a whole, and embedded data is only searched, not parsed.
+    """
+    marker = CROPMARK_SETTINGS_MARKER
+    buffer = b""
+    with open(filename, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            position = buffer.find(marker)
+            while position >= 0:
+                if chunk and len(buffer) - position < len(marker) + MAX_CROPMARK_SETTINGS_LENGTH:
+                    # the settings may continue in the next chunk
+                    break
+                settings = parse_cropmark_settings(buffer[position:position + len(marker) + MAX_CROPMARK_SETTINGS_LENGTH].decode("utf-8", "replace"))
+                if settings is not None:
+                    return settings
+                position = buffer.find(marker, position + 1)
+            if not chunk:
+                return None
+            # keep the incomplete settings text, or the end that may contain the beginning of a marker
+            buffer = buffer[position:] if position >= 0 else buffer[-(len(marker) - 1):]
+
+# Pool of persistent Inkscape processes, see start_inkscape_shell_pool().
+# None: start a new Inkscape process for every call.
+inkscape_shell_pool = None
+
+def start_inkscape_shell_pool(size: int = 1):
+    """
+    Use persistent "inkscape --shell" processes for all following calls of Inkscape.
+    This saves the startup time of Inkscape when exporting many jobs in one session.
+    
+    :param size: number of Inkscape processes that can run jobs in parallel
+    """
+    global inkscape_shell_pool
+    from roland_cutstudio_shell import InkscapeShellPool
+    if inkscape_shell_pool is not None:
+        return
+    inkscape_shell_pool = InkscapeShellPool(inkscape_command(), size)
+    atexit.register(stop_inkscape_shell_pool)
+
+def stop_inkscape_shell_pool():
+    """
+    Quit all Inkscape processes started by start_inkscape_shell_pool()
+    """
+    global inkscape_shell_pool
+    if inkscape_shell_pool is not None:
+        inkscape_shell_pool.close()
+        inkscape_shell_pool = None
+
+# Measurements of the export stages, see roland_cutstudio_profile.py.
+# None: profiling is disabled.
+profiler = None
+
+def profile_stage(name: str, cprofile_file: Optional[str] = None):
+    """
+    Context manager that measures one stage of the export if profiling is enabled.
+    See roland_cutstudio_profile.Profiler.stage()
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, cprofile_file)
+
+def record_subprocess_time(start: float):
+    """
+    Count the time since start (time.perf_counter()) as waiting for a subprocess, if profiling is enabled
+    """
+    if profiler is not None:
+        profiler.add_subprocess_time(time.perf_counter() - start)
+
+# Programs found by find_program(): (program, subdir) -> path
+program_paths = {}
+
+def find_program(program: str, raiseError: bool, subdir: Optional[str] = None) -> Optional[str]:
+    """
+    Like which(), but the result is kept in memory and in the cache (see open_cache()),
+    so that the search path is only searched once.
+    
+    A cached path is used as long as the program file is unchanged (same size and modification time, see program_version())
+    and PATH and the working directory are the same.
+    """
+    if (program, subdir) in program_paths:
+        return program_paths[(program, subdir)]
+    cache = open_cache()
+    if cache is not None:
+        import roland_cutstudio_cache
+        key = roland_cutstudio_cache.make_key("program-path", program, subdir, os.environ.get("PATH"), os.getcwd())
+        entry = cache.read_json(key)
+        if entry is not None and program_version(entry["path"]) == entry["version"]:
+            program_paths[(program, subdir)] = entry["path"]
+            return entry["path"]
+    path = which(program, raiseError, subdir=subdir)
+    if path is None:
+        return None
+    if cache is not None:
+        cache.write_json(key, {"path": path, "version": program_version(path)})
+    program_paths[(program, subdir)] = path
+    return path
 
 def call_inkscape(args: List[str]):
     """
@@ -455,9 +1116,13 @@ def call_inkscape(args: List[str]):
     # https://gitlab.com/inkscape/extensions/-/merge_requests/534
     # TODO: Rewrite most parts of this extension using the inkex python module. This removes the need for such workarounds.
     os.environ["SELF_CALL"] = "true"
+    import subprocess
     
     cmd = [inkscape_command()] + args
-    assert 0 == subprocess.call(cmd, stderr=subprocess.DEVNULL), 'Calling Inkscape failed: command returned error: ' + '"' + '" "'.join(cmd) + '"'
+    start = time.perf_counter()
+    returncode = subprocess.call(cmd, stderr=subprocess.DEVNULL)
+    record_subprocess_time(start)
+    assert 0 == returncode, 'Calling Inkscape failed: command returned error: ' + '"' + '" "'.join(cmd) + '"'
 
 def inkscape_command() -> str:
     """
@@ -465,11 +1130,10 @@ def inkscape_command() -> str:
     """
     if "INKSCAPE_COMMAND" in os.environ:
         INKSCAPEBIN = os.environ["INKSCAPE_COMMAND"]
-        sys.stderr.write("hallo")
     elif os.name=="nt": # windows
-        INKSCAPEBIN = which("inkscape.exe", True, subdir="Inkscape")
+        INKSCAPEBIN = find_program("inkscape.exe", True, subdir="Inkscape")
     else:
-        INKSCAPEBIN=which("inkscape", True)
+        INKSCAPEBIN=find_program("inkscape", True)
 
     assert os.path.isfile(INKSCAPEBIN),  "cannot find inkscape binary " + INKSCAPEBIN
     return INKSCAPEBIN
@@ -481,6 +1145,7 @@ def remove_unselected_elements_from_SVG(filename: str, selectedElements: List[st
     selectedElements: list of selected element ids to be kept. An empty list is treated as "everything selected"!
     """
     if len(selectedElements)==0:
+        import shutil
         shutil.copyfile(filename, filename+".filtered.svg")
     else:
         # only take selected elements
@@ -495,48 +1160,302 @@ def svg_to_inkscape_eps(svg_file_in: str, eps_file_out: str, export_area_page: b
     :param eps_file_out: File path of EPS file output
     :param export_area_page: True: preserve position relative to page / False: crop to drawing area
     """
-    cmd = ["-T", "--export-ignore-filters"]
+    # remove the result of an earlier export, so that the check below cannot pass if Inkscape fails
+    if os.path.exists(eps_file_out):
+        os.remove(eps_file_out)
+    if inkscape_shell_pool is not None and ";" not in svg_file_in + eps_file_out:
+        # persistent Inkscape process, see start_inkscape_shell_pool()
+        cmd = ["file-open:" + svg_file_in, "export-text-to-path:true", "export-ignore-filters:true"]
+        if export_area_page:
+            cmd += ["export-area-page:true"]
+        else:
+            cmd += ["export-area-drawing:true"]
+        cmd += ["export-filename:" + eps_file_out, "export-overwrite:true", "export-do", "file-close"]
+        start = time.perf_counter()
+        inkscape_shell_pool.run(cmd)
+        record_subprocess_time(start)
+    else:
+        cmd = ["-T", "--export-ignore-filters"]
+        if export_area_page:
+            cmd += ["--export-area-page"]
+        else:
+            cmd += ["--export-area-drawing"]
+        cmd += ["--export-filename="+eps_file_out, svg_file_in]
+        call_inkscape(cmd)
+    assert os.path.exists(eps_file_out), 'EPS conversion failed: command did not create result file: ' + '"' + '" "'.join(cmd) + '"' 
+
+@contextlib.contextmanager
+def inkscape_eps_pipe(svg_file_in: str, export_area_page: bool):
+    """
+    SVG --> Inkscape EPS, without an intermediate file: Inkscape writes the EPS to stdout.
+    (Like svg_to_inkscape_eps(), which writes a .ps file, this is Inkscape's PS export, not its EPS export.)
+    Usage: with inkscape_eps_pipe(...) as eps: EPS2CutstudioEPS(eps, ...)
+    
+    :param svg_file_in, export_area_page: see svg_to_inkscape_eps()
+    :return: text stream of the EPS file, read while Inkscape is still running
+    """
+    # see call_inkscape()
+    os.environ["SELF_CALL"] = "true"
+    import subprocess
+    cmd = [inkscape_command(), "-T", "--export-ignore-filters"]
     if export_area_page:
         cmd += ["--export-area-page"]
     else:
         cmd += ["--export-area-drawing"]
-    cmd += ["--export-filename="+eps_file_out, svg_file_in]
-    call_inkscape(cmd)
-    assert os.path.exists(eps_file_out), 'EPS conversion failed: command did not create result file: ' + '"' + '" "'.join(cmd) + '"' 
+    cmd += ["--export-type=ps", "--export-filename=-", svg_file_in]
+    # (the time counts as waiting for Inkscape, although the EPS is converted meanwhile)
+    start = time.perf_counter()
+    inkscape = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        yield inkscape.stdout
+        # the converter may stop reading before the end of the file
+        inkscape.stdout.read()
+    except BaseException:
+        inkscape.kill()
+        raise
+    finally:
+        inkscape.stdout.close()
+        returncode = inkscape.wait()
+        record_subprocess_time(start)
+    assert 0 == returncode, 'EPS conversion failed: command returned error: ' + '"' + '" "'.join(cmd) + '"'
+
+def scratch_directory() -> "tempfile.TemporaryDirectory":
+    """
+    Temporary directory for intermediate files of the "pipe" transport (see svg_to_cutstudio_eps()), deleted after use.
+    
+    It is created in the directory given by the environment variable CUTSTUDIO_WORKSPACE,
+    else in /dev/shm (in memory, on Linux), else in the system temp directory.
+    """
+    import tempfile
+    parent = os.environ.get("CUTSTUDIO_WORKSPACE")
+    if not parent and os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        parent = "/dev/shm"
+    return tempfile.TemporaryDirectory(prefix="roland-cutstudio-", dir=parent or None)
+
+def svg_to_cutstudio_eps_inkex(svg_file: str, selectedElements: List[str], destination: str, export_area_page: bool, mirror: bool = False, cropmark_settings: Optional[dict] = None, geometry_options: Optional[dict] = None, precision: Optional[float] = None, cache=None) -> Optional[dict]:
+    """
+    SVG --> CutStudio EPS in-process with inkex, without calling Inkscape. See roland_cutstudio_inkex.py.
+    
+    Return None if this is not possible (inkex is not available, or the selection contains text or other elements that need Inkscape).
+    Then, the conversion must be done via svg_to_inkscape_eps() and EPS2CutstudioEPS().
+    Else, return the statistics of the optimizations, see EPS2CutstudioEPS().
+    
+    :param selectedElements: see remove_unselected_elements_from_SVG()
+    :param export_area_page: see svg_to_inkscape_eps()
+    :param mirror, cropmark_settings, geometry_options, precision: see EPS2CutstudioEPS()
+    :param cache: roland_cutstudio_cache.FileCache for the converted shapes of this document, or None.
+        Exporting a selection after the whole document was exported then only converts the shapes that changed.
+    """
+    try:
+        import roland_cutstudio_inkex
+    except ImportError:
+        return None
+    # converted shapes by element ID, see roland_cutstudio_inkex.svg_to_drawing_commands()
+    geometry_index = None
+    if cache is not None:
+        import roland_cutstudio_cache
+        index_key = roland_cutstudio_cache.make_key("geometry-index", os.path.abspath(svg_file), roland_cutstudio_inkex.inkex.__version__,
+            program_version(os.path.join(os.path.dirname(__file__), "roland_cutstudio_inkex.py")))
+        geometry_index = cache.read_json(index_key) or {}
+        fingerprints = {element_id: entry["fingerprint"] for (element_id, entry) in geometry_index.items()}
+    try:
+        (ops, coordinates) = roland_cutstudio_inkex.load_drawing_commands(svg_file, selectedElements, export_area_page, geometry_index)
+    except roland_cutstudio_inkex.UnsupportedDocument:
+        return None
+    if geometry_index is not None and fingerprints != {element_id: entry["fingerprint"] for (element_id, entry) in geometry_index.items()}:
+        cache.write_json(index_key, geometry_index)
+    return write_cutstudio_eps(destination, ops, coordinates, mirror=mirror, cropmark_settings=cropmark_settings, geometry_options=geometry_options, precision=precision)
 
 def open_in_cutstudio(cutstudio_eps_file: str) -> None:
     """
     Open EPS file in CutStudio
     """
+    import subprocess
+    import shutil
+    from pathlib import Path
     if os.name=="nt":
         # on Windows
         DETACHED_PROCESS = 8 # start as "daemon"
-        Popen([which("CutStudio\CutStudio.exe", True), "/import", cutstudio_eps_file], creationflags=DETACHED_PROCESS, close_fds=True)
+        subprocess.Popen([find_program("CutStudio\CutStudio.exe", True), "/import", cutstudio_eps_file], creationflags=DETACHED_PROCESS, close_fds=True)
     else:
         # On Linux, try with "wine"
         CUTSTUDIO_C_DRIVE = str(Path.home()) + "/.wine/drive_c/"
         CUTSTUDIO_PATH_LINUX_WINE = CUTSTUDIO_C_DRIVE + "Program Files (x86)/CutStudio/CutStudio.exe"
         CUTSTUDIO_COMMANDLINE = ["wine", CUTSTUDIO_PATH_LINUX_WINE, "/import", r'C:\cutstudio.eps']
         try:
-            if not which("wine", False):
+            if not find_program("wine", False):
                     raise Exception("Cannot find 'wine'")
             if not os.path.exists(CUTSTUDIO_PATH_LINUX_WINE):
                 raise Exception("Cannot find CutStudio in " + CUTSTUDIO_PATH_LINUX_WINE)
             shutil.copyfile(cutstudio_eps_file, CUTSTUDIO_C_DRIVE + "cutstudio.eps")
-            subprocess.check_call(CUTSTUDIO_COMMANDLINE, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            start = time.perf_counter()
+            try:
+                subprocess.check_call(CUTSTUDIO_COMMANDLINE, stderr=subprocess.DEVNULL, stdout=subprocess.DEVNULL)
+            finally:
+                record_subprocess_time(start)
         except Exception as exc:
             message("Could not open CutStudio.\nInstead, your file was saved to:\n" + cutstudio_eps_file + "\n" + \
                 "Please open that with CutStudio manually. \n\n" + \
                 "Tip: On Linux, you can use 'wine' to install CutStudio 3.10. Then, the file will be directly opened with CutStudio. \n" + \
                 " Diagnostic information: \n" + str(exc))
 
-def read_file(path: Union[str, Path]) -> str:
+def read_file(path: Union[str, os.PathLike]) -> str:
     """
     Read text file to string
     """
     with open(path) as f:
         return f.read()
 
+def open_cache() -> Optional["roland_cutstudio_cache.FileCache"]:
+    """
+    Open the cache for exported files, see roland_cutstudio_cache.py.
+    
+    The environment variable CUTSTUDIO_CACHE_SIZE_MB sets the maximum size (default: 256 MB, 0 disables the cache),
+    CUTSTUDIO_CACHE_DIR sets the directory.
+    
+    Return None if the cache is disabled or cannot be used.
+    """
+    max_size_mb = float(os.environ.get("CUTSTUDIO_CACHE_SIZE_MB", 256))
+    if max_size_mb <= 0:
+        return None
+    import roland_cutstudio_cache
+    try:
+        return roland_cutstudio_cache.FileCache(os.environ.get("CUTSTUDIO_CACHE_DIR"), int(max_size_mb * 1024 * 1024))
+    except OSError:
+        return None
+
+def program_version(path: Optional[str]) -> list:
+    """
+    Identify the version of a program or script file for cache keys (cached results become invalid when it is updated)
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return [path]
+    return [path, stat.st_size, stat.st_mtime_ns]
+
+def cached_step(cache, key: str, output_file: str, produce) -> None:
+    """
+    Create output_file by calling produce(), or copy it from the cache if possible.
+    
+    :param cache: roland_cutstudio_cache.FileCache, or None to always call produce()
+    :param key: cache key, must include everything that the result depends on
+    """
+    if cache is not None and cache.get(key, output_file):
+        return
+    produce()
+    if cache is not None:
+        cache.put(key, output_file)
+
+def svg_to_cutstudio_eps(filename: str, destination: str, selectedElements: List[str], mirror: bool = False, engine: str = "inkscape", cache=None, geometry_options: Optional[dict] = None, precision: Optional[float] = None, transport: str = "files", jobs: Optional[int] = 1) -> dict:
+    """
+    SVG --> CutStudio EPS
+    
+    :param selectedElements: see remove_unselected_elements_from_SVG()
+    :param mirror: see EPS2CutstudioEPS()
+    :param engine: "inkscape" or "inkex", see svg_to_cutstudio_eps_inkex()
+    :param cache: roland_cutstudio_cache.FileCache for the results of each step, or None
+    :param geometry_options: optimizations, see EPS2CutstudioEPS()
+    :param precision: resolution of the output coordinates in mm, see EPS2CutstudioEPS()
+    :param transport: how the intermediate results are passed between the steps:
+        "files": as files next to the input file (filename.filtered.svg, filename.inkscape.ps), each step is cached /
+        "pipe": the input file is used in place if nothing is selected, Inkscape's EPS export is read from its stdout,
+        and the filtered SVG of a selection is kept in scratch_directory(). Only the result is cached.
+    :param jobs: number of processes for converting huge EPS files, see EPS2CutstudioEPS()
+    :return: statistics of the optimizations, see EPS2CutstudioEPS(). Empty if the result was taken from the cache.
+    """
+    if transport not in ["files", "pipe"]:
+        raise ValueError("transport must be 'files' or 'pipe'")
+    # Determine cropmark settings.
+    # If the SVG file is based on the cropmark template generated by this plugin, then it contains a "magic text" from which the cropmark information is determined.
+    # Else, cropmark_settings is None.
+    cropmark_settings=find_cropmark_settings(filename)
+    # If cropmark is active, then preserve the position relative to the page. Else, fit to drawing ("move to bottom-left" in CutStudio).
+    export_area_page = (cropmark_settings is not None)
+    
+    filtered_svg = filename + ".filtered.svg"
+    inkscape_eps = filename+".inkscape.ps"
+    
+    # Each step is cached under a key made from its inputs and the program versions
+    if cache is not None:
+        import roland_cutstudio_cache
+        try:
+            inkscape_version = program_version(inkscape_command())
+        except Exception:
+            inkscape_version = None
+        filtered_svg_key = roland_cutstudio_cache.make_key("filtered-svg", roland_cutstudio_cache.file_hash(filename), selectedElements, inkscape_version)
+        inkscape_eps_key = roland_cutstudio_cache.make_key("inkscape-eps", filtered_svg_key, export_area_page)
+        cutstudio_eps_key = roland_cutstudio_cache.make_key("cutstudio-eps", inkscape_eps_key, engine, mirror, cropmark_settings, geometry_options, precision,
+            program_version(__file__), program_version(os.path.join(os.path.dirname(__file__), "roland_cutstudio_geometry.py")), program_version(os.path.join(os.path.dirname(__file__), "roland_cutstudio_inkex.py")))
+    else:
+        filtered_svg_key = inkscape_eps_key = cutstudio_eps_key = None
+    
+    def make_filtered_svg():
+        # SVG --> SVG with only selected elements
+        with profile_stage("remove_unselected_elements_from_SVG"):
+            remove_unselected_elements_from_SVG(filename, selectedElements)
+    
+    def make_inkscape_eps():
+        cached_step(cache, filtered_svg_key, filtered_svg, make_filtered_svg)
+        # SVG --> Inkscape EPS
+        with profile_stage("svg_to_inkscape_eps"):
+            svg_to_inkscape_eps(svg_file_in=filtered_svg, eps_file_out=inkscape_eps, export_area_page=export_area_page)
+    
+    def convert_via_pipe():
+        nonlocal stats
+        with scratch_directory() as workspace:
+            svg_file = filename
+            if selectedElements:
+                # SVG --> SVG with only selected elements
+                with profile_stage("remove_unselected_elements_from_SVG"):
+                    svg_file = os.path.join(workspace, "filtered.svg")
+                    stripSVG_inkscape(src=filename, dest=svg_file, elements=selectedElements, tmpdir=workspace)
+            if inkscape_shell_pool is not None:
+                # the persistent Inkscape process cannot write to a pipe
+                eps_file = os.path.join(workspace, "inkscape.ps")
+                with profile_stage("svg_to_inkscape_eps"):
+                    svg_to_inkscape_eps(svg_file_in=svg_file, eps_file_out=eps_file, export_area_page=export_area_page)
+                with profile_stage("EPS2CutstudioEPS", cprofile_file=destination + ".cprofile"):
+                    stats = EPS2CutstudioEPS(eps_file, destination, mirror=mirror, cropmark_settings=cropmark_settings, geometry_options=geometry_options, precision=precision, jobs=jobs)
+                return
+            # SVG --> Inkscape EPS --> CutStudio EPS, both at the same time
+            with profile_stage("svg_to_inkscape_eps+EPS2CutstudioEPS", cprofile_file=destination + ".cprofile"):
+                with inkscape_eps_pipe(svg_file, export_area_page) as eps:
+                    stats = EPS2CutstudioEPS(eps, destination, mirror=mirror, cropmark_settings=cropmark_settings, geometry_options=geometry_options, precision=precision, jobs=jobs)
+    
+    stats = {}
+    def make_cutstudio_eps():
+        nonlocal stats
+        # SVG --> CutStudio EPS without calling Inkscape, if possible
+        if engine == "inkex":
+            with profile_stage("svg_to_cutstudio_eps_inkex", cprofile_file=destination + ".cprofile"):
+                inkex_stats = svg_to_cutstudio_eps_inkex(filename, selectedElements, destination, export_area_page=export_area_page, mirror=mirror, cropmark_settings=cropmark_settings, geometry_options=geometry_options, precision=precision, cache=cache)
+            if inkex_stats is not None:
+                stats = inkex_stats
+                return
+        if transport == "pipe":
+            convert_via_pipe()
+            return
+        cached_step(cache, inkscape_eps_key, inkscape_eps, make_inkscape_eps)
+        # Inkscape EPS --> CutStudio EPS
+        with profile_stage("EPS2CutstudioEPS", cprofile_file=destination + ".cprofile"):
+            stats = EPS2CutstudioEPS(inkscape_eps, destination, mirror=mirror, cropmark_settings=cropmark_settings, geometry_options=geometry_options, precision=precision, jobs=jobs)
+    
+    # (the cache only stores one output file, not the panels of tiled jobs)
+    tiled = bool(geometry_options and geometry_options.get("tile_width"))
+    cached_step(None if tiled else cache, cutstudio_eps_key, destination, make_cutstudio_eps)
+    return stats
+
+def get_commandline_option(name: str, default: str) -> str:
+    """
+    Get the value of the commandline option --name=value
+    """
+    prefix = "--" + name + "="
+    for arg in sys.argv[1:]:
+        if arg.startswith(prefix):
+            return arg[len(prefix):]
+    return default
+
 def inkscape_to_cutstudio() -> None:
     """
     Take Inkscape SVG, process and send to CutStudio.
@@ -547,34 +1466,59 @@ def inkscape_to_cutstudio() -> None:
     
     # parse commandline: selected elements and filename
     selectedElements=[]
+    # conversion engine: "inkscape" (default) or "inkex", see svg_to_cutstudio_eps_inkex()
+    engine = os.environ.get("CUTSTUDIO_ENGINE", "inkscape")
+    # transport of intermediate results: "files" (default) or "pipe", see svg_to_cutstudio_eps()
+    transport = os.environ.get("CUTSTUDIO_TRANSPORT", "files")
+    # number of processes for converting huge files, 0 for all CPU cores, see EPS2CutstudioEPS()
+    jobs = int(os.environ.get("CUTSTUDIO_JOBS", "1"))
     for arg in sys.argv[1:]:
         if arg[0] == "-":
             if len(arg) >= 5 and arg[0:5] == "--id=":
                 selectedElements +=[arg[5:]]
+            elif arg.startswith("--engine="):
+                engine = arg[len("--engine="):]
+            elif arg.startswith("--transport="):
+                transport = arg[len("--transport="):]
         else:
             filename = arg
     if selftest:
         filename = "./test-input.svg"
+        assert parse_cropmark_settings('INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS={"version":1, "pageW":210, "pageH":297, "dx":20, "dy":25, "W":170, "H":120}'.replace('"', '&quot;')) == {"version": 1, "pageW": 210, "pageH": 297, "dx": 20, "dy": 25, "W": 170, "H": 120};
         
     # parse commandline: mirror horizontal
     mirror = ("--mirror=true" in sys.argv)
     
+    # parse commandline: optimizations of the cut lines, see EPS2CutstudioEPS()
+    geometry_options = {
+        "remove_duplicates": ("--remove-duplicates=true" in sys.argv),
+        "simplify_tolerance": float(get_commandline_option("simplify-tolerance", "0")),
+        "optimize_order": ("--optimize-order=true" in sys.argv),
+        "repeat_columns": int(get_commandline_option("repeat-columns", "0")),
+        "repeat_rows": int(get_commandline_option("repeat-rows", "0")),
+        "repeat_spacing": float(get_commandline_option("repeat-spacing", "0")),
+        "tile_width": float(get_commandline_option("tile-width", "0")),
+        "tile_overlap": float(get_commandline_option("tile-overlap", "0")),
+    }
+    # parse commandline: resolution of the output coordinates in mm, 0 for full precision
+    precision = float(get_commandline_option("precision", "0"))
     
-    # Determine cropmark settings.
-    # If the SVG file is based on the cropmark template generated by this plugin, then it contains a "magic text" from which the cropmark information is determined.
-    # Else, cropmark_settings is None.
-    cropmark_settings=parse_cropmark_settings(read_file(filename))
-    
-    # SVG --> SVG with only selected elements
-    svg_only_selection = remove_unselected_elements_from_SVG(filename, selectedElements)
-    
-    # SVG --> Inkscape EPS
-    inkscape_eps = filename+".inkscape.ps"
-    # If cropmark is active, then preserve the position relative to the page. Else, fit to drawing ("move to bottom-left" in CutStudio).
-    export_area_page = (cropmark_settings is not None)
-    svg_to_inkscape_eps(svg_file_in = filename+".filtered.svg", eps_file_out=inkscape_eps, export_area_page=export_area_page)
+    # parse commandline: send directly to the cutter instead of opening CutStudio, see roland_cutstudio_camm.py
+    camm_destination = get_commandline_option("camm-destination", os.environ.get("CUTSTUDIO_CAMM_DESTINATION", ""))
+    camm_speed = int(get_commandline_option("camm-speed", "0")) or None
+    camm_force = int(get_commandline_option("camm-force", "0")) or None
+    # queue the job in the background spooler instead of waiting until it is sent, see roland_cutstudio_spooler.py
+    camm_spooler = ("--camm-spooler=true" in sys.argv)
+    # flow control of the spooler: maximum bytes per second (0: no limit, default: see roland_cutstudio_spooler.DEFAULT_RATE),
+    # ask the cutter for its free buffer space
+    camm_rate = get_commandline_option("camm-rate", os.environ.get("CUTSTUDIO_CAMM_RATE", ""))
+    camm_rate = float(camm_rate) if camm_rate else None
+    camm_buffer_query = (get_commandline_option("camm-buffer-query", os.environ.get("CUTSTUDIO_CAMM_BUFFER_QUERY", "false")) == "true")
+    if camm_destination and not selftest and find_cropmark_settings(filename) is not None:
+        # Without CutStudio, the cutter does not scan the cropmarks, so the cut lines would not be aligned to the print
+        message("Cropmarks are not supported when sending directly to the cutter. Please use 'Open in CutStudio' for documents with cropmarks.")
+        return
     
-
     # determine destination filename
     if selftest:
         # used for unit-testing: fixed location of output file
@@ -582,15 +1526,42 @@ def inkscape_to_cutstudio() -> None:
     else:
         # normally
         destination = filename + ".cutstudio.eps"
-    
-    # Inkscape EPS --> CutStudio EPS
-    EPS2CutstudioEPS(inkscape_eps, destination, mirror=mirror, cropmark_settings=cropmark_settings)
 
-    # Show in CutStudio
-    open_in_cutstudio(destination)
+    # optional measurement of the export stages, see roland_cutstudio_profile.py
+    global profiler
+    if os.environ.get("CUTSTUDIO_PROFILE"):
+        import roland_cutstudio_profile
+        profiler = roland_cutstudio_profile.profiler_from_environment()
+
+    # SVG --> CutStudio EPS
+    # (the selftest must not use cached results, as it tests the conversion itself)
+    cache = None if selftest else open_cache()
+    stats = svg_to_cutstudio_eps(filename, destination, selectedElements, mirror=mirror, engine=engine, cache=cache, geometry_options=geometry_options, precision=precision, transport=transport, jobs=jobs)
+    if stats:
+        import roland_cutstudio_geometry
+        message(roland_cutstudio_geometry.describe_stats(stats))
+
+    if camm_destination and camm_spooler and not selftest:
+        # Add to the queue of the spooler, which sends it to the cutter in the background
+        import roland_cutstudio_spooler
+        with profile_stage("submit_job"):
+            job = roland_cutstudio_spooler.submit_job(destination, camm_destination, speed=camm_speed, force=camm_force, rate=camm_rate, buffer_query=camm_buffer_query or None)
+        message("Job {} was added to the queue of the cutter.".format(job["id"]))
+    elif camm_destination and not selftest:
+        # Send to the cutter
+        import roland_cutstudio_camm
+        with profile_stage("send_cutstudio_eps"):
+            roland_cutstudio_camm.send_cutstudio_eps(destination, camm_destination, speed=camm_speed, force=camm_force)
+    else:
+        # Show in CutStudio
+        with profile_stage("open_in_cutstudio"):
+            open_in_cutstudio(destination)
+    if profiler is not None:
+        profiler.write_report(destination + ".profile.json")
 
     if selftest:
         # unittest: compare with known reference output
+        import filecmp
         TEST_REFERENCE_FILE = "./test-output-reference.cutstudio.eps"
         assert filecmp.cmp(destination, TEST_REFERENCE_FILE), "Test output changed. Please compare " + destination + " and " + TEST_REFERENCE_FILE
         print("Selftest successful :-)")
@@ -611,11 +1582,13 @@ def main() -> None:
         # Currently, we return a hardcoded result, removing all existing contant.
         # User settings are currently hard coded as:
         # Page size A4 with W=170 L=210 mm, lower-left cropmark is offset from lower-left-corner by dX=20 dY=25 mm
+        from pathlib import Path
         TEMPLATE_FILE = Path().absolute() / "roland_cutstudio_cropmark_template.svg"
         print(read_file(TEMPLATE_FILE))
         return
 
     if "--show-help=true" in sys.argv:
+        import webbrowser
         webbrowser.open("https://github.com/mgmax/inkscape-roland-cutstudio/blob/master/README.md")
         return
 
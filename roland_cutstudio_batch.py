@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Batch conversion of SVG files to CutStudio EPS, without opening CutStudio
+
+Usage: python3 roland_cutstudio_batch.py [options] DIRECTORY_OR_GLOB [...]
+
+Each SVG file is converted in the same way as by the "Open in CutStudio" extension
+(everything in the file is exported). The result is written next to the input as
+<filename>.cutstudio.eps, or to the --output-dir (with the subdirectories of the inputs
+below their common parent directory). Files are converted in parallel,
+one process per CPU core by default.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import argparse
+import concurrent.futures
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from typing import List, Optional
+
+import roland_cutstudio
+
+# Files written by the export next to the input, which must not be converted again
+INTERMEDIATE_SUFFIXES = [".filtered.svg"]
+
+def find_svg_files(patterns: List[str]) -> List[str]:
+    """
+    Expand directories (all *.svg files inside, not recursive) and glob patterns to a sorted list of SVG files.
+    """
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(glob.escape(pattern), "*.svg"))
+        else:
+            matches = glob.glob(pattern)
+        files += [f for f in matches if os.path.isfile(f) and not any(f.endswith(suffix) for suffix in INTERMEDIATE_SUFFIXES)]
+    return sorted(set(files))
+
+def output_filenames(files: List[str], output_dir: Optional[str]) -> List[str]:
+    """
+    Output file of each input file: <filename>.cutstudio.eps next to the input, or in output_dir.
+    In output_dir, the subdirectories of the inputs relative to their common parent directory are kept,
+    so that inputs with the same name in different directories do not overwrite each other.
+    """
+    if output_dir is None:
+        return [f + ".cutstudio.eps" for f in files]
+    if not files:
+        return []
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+    return [os.path.join(output_dir, os.path.relpath(os.path.abspath(f), base) + ".cutstudio.eps") for f in files]
+
+def init_worker(inkscape_shell: bool):
+    """
+    Initialize a worker process of the pool
+    """
+    if inkscape_shell:
+        roland_cutstudio.start_inkscape_shell_pool(1)
+
+def convert_file(filename: str, destination: str, mirror: bool, engine: str, use_cache: bool, geometry_options: dict, profile: bool = False,
+                 precision: Optional[float] = None, transport: str = "files") -> dict:
+    """
+    Convert one file (runs in a worker process).
+
+    :param precision: resolution of the output coordinates in mm, see roland_cutstudio.EPS2CutstudioEPS()
+    :param transport: "files" or "pipe", see roland_cutstudio.svg_to_cutstudio_eps()
+    :param profile: write a report of the time per stage to <destination>.profile.json, see roland_cutstudio_profile.py
+    :return: summary entry for this file
+    """
+    start = time.monotonic()
+    result = {"file": filename, "output": destination}
+    if profile:
+        import roland_cutstudio_profile
+        roland_cutstudio.profiler = roland_cutstudio_profile.profiler_from_environment(enable=True)
+    try:
+        cache = roland_cutstudio.open_cache() if use_cache else None
+        result["stats"] = roland_cutstudio.svg_to_cutstudio_eps(filename, destination, [], mirror=mirror, engine=engine, cache=cache, geometry_options=geometry_options, precision=precision, transport=transport)
+        result["success"] = True
+    except Exception as exc:
+        result["success"] = False
+        result["error"] = "".join(traceback.format_exception_only(type(exc), exc)).strip()
+    if roland_cutstudio.profiler is not None:
+        result["profile"] = destination + ".profile.json"
+        roland_cutstudio.profiler.write_report(result["profile"])
+        roland_cutstudio.profiler = None
+    result["seconds"] = time.monotonic() - start
+    return result
+
+def convert_files(files: List[str], output_dir: Optional[str] = None, jobs: Optional[int] = None, mirror: bool = False,
+                  engine: str = "inkscape", use_cache: bool = True, inkscape_shell: bool = False, geometry_options: Optional[dict] = None,
+                  profile: bool = False, precision: Optional[float] = None, transport: str = "files") -> List[dict]:
+    """
+    Convert all files in parallel.
+
+    :param jobs: number of worker processes, default: number of CPU cores
+    :param inkscape_shell: keep one Inkscape process running in each worker, see roland_cutstudio.start_inkscape_shell_pool()
+    :param geometry_options: optimizations, see roland_cutstudio.EPS2CutstudioEPS()
+    :param profile, precision, transport: see convert_file()
+    :return: summary entries in the order of files, see convert_file()
+    """
+    destinations = output_filenames(files, output_dir)
+    if output_dir is not None:
+        for directory in sorted(set(os.path.dirname(d) for d in destinations)):
+            os.makedirs(directory, exist_ok=True)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(inkscape_shell,)) as pool:
+        futures = [pool.submit(convert_file, f, d, mirror, engine, use_cache, geometry_options or {}, profile, precision, transport) for (f, d) in zip(files, destinations)]
+        return [future.result() for future in futures]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert SVG files to CutStudio EPS files in parallel.")
+    parser.add_argument("inputs", nargs="+", metavar="DIRECTORY_OR_GLOB", help="directory containing SVG files, or glob pattern like 'jobs/*.svg'")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="number of parallel processes (default: number of CPU cores)")
+    parser.add_argument("-o", "--output-dir", default=None, help="write results to this directory instead of next to the input files, "
+                        "keeping the subdirectories of the inputs below their common parent directory")
+    parser.add_argument("--mirror", action="store_true", help="mirror horizontally")
+    parser.add_argument("--engine", choices=["inkscape", "inkex"], default=os.environ.get("CUTSTUDIO_ENGINE", "inkscape"), help="conversion engine")
+    parser.add_argument("--transport", choices=["files", "pipe"], default=os.environ.get("CUTSTUDIO_TRANSPORT", "files"),
+                        help="intermediate results as files next to the input (default) or via a pipe and a temporary directory")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the cache of exported files")
+    parser.add_argument("--inkscape-shell", action="store_true", help="keep one Inkscape process per worker running instead of starting Inkscape for every file")
+    parser.add_argument("--remove-duplicates", action="store_true", help="remove segments that are cut more than once, e.g. shared edges of adjacent shapes")
+    parser.add_argument("--simplify-tolerance", type=float, default=0, metavar="MM", help="simplify runs of short lines with this tolerance in mm (default: 0 = off)")
+    parser.add_argument("--optimize-order", action="store_true", help="reorder paths to minimize travel with the blade up")
+    parser.add_argument("--repeat", type=int, nargs=2, default=(0, 0), metavar=("COLUMNS", "ROWS"), help="cut COLUMNS x ROWS copies of each design (step and repeat)")
+    parser.add_argument("--repeat-spacing", type=float, default=0, metavar="MM", help="distance between the copies in mm (default: 0)")
+    parser.add_argument("--tile-width", type=float, default=0, metavar="MM", help="additionally split into panels of this width in mm, written to *.panelN.cutstudio.eps (default: 0 = off)")
+    parser.add_argument("--tile-overlap", type=float, default=0, metavar="MM", help="overlap of the panels in mm (default: 0)")
+    parser.add_argument("--precision", type=float, default=None, metavar="MM", help="round output coordinates to this resolution in mm, e.g. 0.01 (default: full precision)")
+    parser.add_argument("--profile", action="store_true", default=bool(os.environ.get("CUTSTUDIO_PROFILE")),
+                        help="write the time per stage of each file to <output>.profile.json (see roland_cutstudio_profile.py)")
+    parser.add_argument("--summary", default=None, help="write the summary as JSON to this file")
+    args = parser.parse_args(argv)
+
+    files = find_svg_files(args.inputs)
+    if not files:
+        roland_cutstudio.message("No SVG files found")
+        return 1
+    start = time.monotonic()
+    geometry_options = {
+        "remove_duplicates": args.remove_duplicates,
+        "simplify_tolerance": args.simplify_tolerance,
+        "optimize_order": args.optimize_order,
+        "repeat_columns": args.repeat[0],
+        "repeat_rows": args.repeat[1],
+        "repeat_spacing": args.repeat_spacing,
+        "tile_width": args.tile_width,
+        "tile_overlap": args.tile_overlap,
+    }
+    results = convert_files(files, args.output_dir, args.jobs, mirror=args.mirror, engine=args.engine,
+                            use_cache=not args.no_cache, inkscape_shell=args.inkscape_shell, geometry_options=geometry_options,
+                            profile=args.profile, precision=args.precision, transport=args.transport)
+    total_seconds = time.monotonic() - start
+
+    failures = [r for r in results if not r["success"]]
+    for r in results:
+        status = "OK    " if r["success"] else "FAILED"
+        print("{} {:8.2f}s {}".format(status, r["seconds"], r["file"]))
+        if not r["success"]:
+            print("       " + r["error"].replace("\n", "\n       "))
+    print("{} files converted, {} failed, {:.2f}s total".format(len(results) - len(failures), len(failures), total_seconds))
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump({"files": results, "succeeded": len(results) - len(failures), "failed": len(failures),
+                       "seconds": total_seconds}, f, indent=2)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Performance benchmark of the EPS converter (EPS2CutstudioEPS in roland_cutstudio.py)
+
+Usage: python3 roland_cutstudio_benchmark.py [--update-baseline] [--workload NAME ...]
+
+Synthetic Inkscape-style EPS files are generated for several workloads (number of subpaths,
+nesting depth of q/Q/cm, mix of curves and lines, clipping rectangles) and converted.
+Throughput (points per second), peak memory and output size are compared with the
+stored baseline in roland_cutstudio_benchmark_baseline.json. The exit code is 1 if
+a workload uses more memory or its output size changed.
+
+The throughput depends on the computer, so a slowdown is only a warning by default.
+To compare versions of the plugin, run with --update-baseline on the same computer
+with the old version, then with --fail-on-slowdown with the new version.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List, Optional, Tuple
+
+import roland_cutstudio
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "roland_cutstudio_benchmark_baseline.json")
+
+# subpaths: number of subpaths, segments: segments per subpath,
+# depth: nesting of q ... cm around each subpath, curves: fraction of curveto segments,
+# clips: fraction of subpaths with a clipping rectangle (re W n), options: geometry_options,
+# cluster (optional): fraction of subpaths that start in a small area of 40 x 40 pt (e.g. a detailed logo),
+# sheet (optional): width and height in pt of the area of the other subpaths (default: 500 x 800)
+WORKLOADS = [
+    {"name": "lines", "subpaths": 20000, "segments": 10, "depth": 1, "curves": 0.0, "clips": 0.0},
+    {"name": "curves", "subpaths": 20000, "segments": 10, "depth": 1, "curves": 1.0, "clips": 0.0},
+    {"name": "nested", "subpaths": 10000, "segments": 10, "depth": 8, "curves": 0.5, "clips": 0.0},
+    {"name": "clipped", "subpaths": 10000, "segments": 10, "depth": 2, "curves": 0.5, "clips": 1.0},
+    {"name": "small-shapes", "subpaths": 50000, "segments": 2, "depth": 3, "curves": 0.5, "clips": 0.2},
+    {"name": "optimized", "subpaths": 5000, "segments": 10, "depth": 1, "curves": 0.3, "clips": 0.0,
+     "options": {"remove_duplicates": True, "simplify_tolerance": 0.025, "optimize_order": True}},
+    {"name": "clustered", "subpaths": 50000, "segments": 2, "depth": 0, "curves": 0.0, "clips": 0.0, "cluster": 0.98,
+     "sheet": (1700, 20000), "options": {"optimize_order": True}},
+]
+
+# Allowed deviation from the baseline before a result counts as regression
+DEFAULT_THRESHOLD = 0.2
+
+def number(x: float) -> str:
+    """
+    Format like cairo: fixed point, without trailing zeros
+    """
+    return ("%f" % x).rstrip("0").rstrip(".")
+
+def generate_eps(filename: str, workload: dict, seed: int = 0) -> int:
+    """
+    Write a synthetic EPS file in the style of Inkscape's EPS export (cairo).
+
+    :return: number of points (coordinate pairs) of drawing commands
+    """
+    rnd = random.Random(seed)
+    points = 0
+    with open(filename, "w") as f:
+        f.write("%!PS-Adobe-3.0 EPSF-3.0\n%%Creator: roland_cutstudio_benchmark.py\n%%BoundingBox: 0 0 596 842\n%%EndComments\n")
+        f.write("q 0 0 596 842 rectclip q\n0 g\n0.1 w\n")
+        for i in range(workload["subpaths"]):
+            for level in range(workload["depth"]):
+                f.write("q {} {} {} {} {} {} cm\n".format(number(rnd.uniform(0.9, 1.1)), number(rnd.uniform(-0.1, 0.1)),
+                                                         number(rnd.uniform(-0.1, 0.1)), number(rnd.uniform(0.9, 1.1)),
+                                                         number(rnd.uniform(-5, 5)), number(rnd.uniform(-5, 5))))
+            if rnd.random() < workload["clips"]:
+                f.write("{} {} {} {} re W n\n".format(*[number(rnd.uniform(0, 500)) for j in range(4)]))
+            if "cluster" in workload and rnd.random() < workload["cluster"]:
+                (x, y) = (rnd.uniform(230, 270), rnd.uniform(380, 420))
+            else:
+                (width, height) = workload.get("sheet", (500, 800))
+                (x, y) = (rnd.uniform(0, width), rnd.uniform(0, height))
+            line = [number(x), number(y), "m"]
+            points += 1
+            for j in range(workload["segments"]):
+                if rnd.random() < workload["curves"]:
+                    for k in range(3):
+                        (x, y) = (x + rnd.uniform(-5, 5), y + rnd.uniform(-5, 5))
+                        line += [number(x), number(y)]
+                    line.append("c")
+                    points += 3
+                else:
+                    (x, y) = (x + rnd.uniform(-5, 5), y + rnd.uniform(-5, 5))
+                    line += [number(x), number(y), "l"]
+                    points += 1
+            line.append("h")
+            points += 1
+            f.write(" ".join(line) + "\nS\n" + "Q\n" * workload["depth"])
+        f.write("Q Q\nshowpage\n%%Trailer\n%%EOF\n")
+    return points
+
+def run_workload(workload: dict, directory: str, repeat: int = 3) -> dict:
+    """
+    Generate the input and convert it.
+
+    :param repeat: number of timed runs, the fastest one counts
+    :return: result: points, seconds, points_per_second, peak_memory (bytes), output_size (bytes)
+    """
+    src = os.path.join(directory, workload["name"] + ".eps")
+    dest = os.path.join(directory, workload["name"] + ".cutstudio.eps")
+    points = generate_eps(src, workload)
+    options = workload.get("options")
+    seconds = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        roland_cutstudio.EPS2CutstudioEPS(src, dest, geometry_options=options)
+        seconds = min(seconds, time.perf_counter() - start)
+    # measured separately, because tracemalloc slows down the conversion
+    tracemalloc.start()
+    roland_cutstudio.EPS2CutstudioEPS(src, dest, geometry_options=options)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {"points": points, "seconds": seconds, "points_per_second": points / seconds,
+            "peak_memory": peak_memory, "output_size": os.path.getsize(dest)}
+
+def compare(result: dict, baseline: Optional[dict], threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    :return: list of regressions of result compared to the baseline, list of slowdowns
+    """
+    if baseline is None:
+        return [], []
+    regressions = []
+    slowdowns = []
+    if result["points_per_second"] < baseline["points_per_second"] * (1 - threshold):
+        slowdowns.append("throughput {:.0f} < {:.0f} points/s".format(result["points_per_second"], baseline["points_per_second"]))
+    if result["peak_memory"] > baseline["peak_memory"] * (1 + threshold):
+        regressions.append("peak memory {:.1f} > {:.1f} MB".format(result["peak_memory"] / 1e6, baseline["peak_memory"] / 1e6))
+    if result["output_size"] != baseline["output_size"]:
+        regressions.append("output size {} != {} bytes".format(result["output_size"], baseline["output_size"]))
+    return regressions, slowdowns
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the EPS converter and compare with the stored baseline.")
+    parser.add_argument("--workload", action="append", choices=[w["name"] for w in WORKLOADS], help="only run this workload (can be repeated)")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed runs per workload (default: 3)")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown or memory increase as fraction (default: 0.2)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline file")
+    parser.add_argument("--fail-on-slowdown", action="store_true",
+                        help="also fail if the throughput is lower, only useful if the baseline was measured on this computer")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as new baseline")
+    parser.add_argument("--keep", default=None, metavar="DIRECTORY", help="keep the generated input and output files in this directory")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {"workloads": {}}
+    workloads = [w for w in WORKLOADS if not args.workload or w["name"] in args.workload]
+
+    results = {}
+    failed = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        directory = args.keep or tmpdir
+        os.makedirs(directory, exist_ok=True)
+        for workload in workloads:
+            result = run_workload(workload, directory, args.repeat)
+            results[workload["name"]] = result
+            regressions, slowdowns = ([], []) if args.update_baseline else compare(result, baseline["workloads"].get(workload["name"]), args.threshold)
+            if args.fail_on_slowdown:
+                regressions += slowdowns
+                slowdowns = []
+            failed = failed or bool(regressions)
+            if regressions:
+                status = "REGRESSION: " + "; ".join(regressions + slowdowns)
+            elif slowdowns:
+                status = "WARNING: " + "; ".join(slowdowns)
+            else:
+                status = "OK"
+            print("{:14} {:9} points {:8.3f}s {:10.0f} points/s {:8.2f} MB peak {:10} bytes output  {}".format(
+                workload["name"], result["points"], result["seconds"], result["points_per_second"],
+                result["peak_memory"] / 1e6, result["output_size"], status))
+
+    if args.update_baseline:
+        baseline["workloads"].update(results)
+        baseline["python"] = platform.python_version()
+        baseline["machine"] = platform.machine()
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("Baseline written to " + args.baseline)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
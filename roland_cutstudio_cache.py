@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Content-addressed disk cache for the Roland CutStudio export script
+
+Intermediate and final files of the export (filtered SVG, Inkscape EPS, CutStudio EPS)
+are stored under a hash of everything they depend on, so that exporting an unchanged
+file again does not need to call Inkscape.
+The least recently used entries are removed when the cache exceeds its maximum size.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+# Increment if the format of cached files changes
+CACHE_VERSION = 1
+
+def default_cache_directory() -> str:
+    """
+    Per-user cache directory
+    """
+    if os.name == "nt":
+        base = os.environ.get("LOCALAPPDATA", str(Path.home()))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", str(Path.home() / ".cache"))
+    return os.path.join(base, "inkscape-roland-cutstudio")
+
+def file_hash(path: str) -> str:
+    """
+    SHA-256 of the file contents. The file is read in chunks, so it may be large.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def make_key(*parts) -> str:
+    """
+    Cache key from JSON-serializable parts, e.g. file hashes and settings
+    """
+    return hashlib.sha256(json.dumps([CACHE_VERSION] + list(parts), sort_keys=True).encode()).hexdigest()
+
+class FileCache:
+    """
+    Directory of cached files, named by their key.
+    """
+    def __init__(self, directory: Optional[str] = None, max_size: int = 256 * 1024 * 1024):
+        """
+        :param directory: cache directory, created if necessary. Default: see default_cache_directory()
+        :param max_size: maximum total size of the cached files in bytes
+        """
+        self.directory = directory or default_cache_directory()
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str, dest: str) -> bool:
+        """
+        Copy the cached file to dest.
+
+        :return: False if the key is not in the cache
+        """
+        try:
+            shutil.copyfile(self.path(key), dest)
+        except FileNotFoundError:
+            return False
+        self.touch(key)
+        return True
+
+    def touch(self, key: str):
+        """
+        Mark an entry as recently used, so that it is evicted last.
+        """
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            # evicted by another process in the meantime. The data that was just read is still valid.
+            pass
+
+    def put(self, key: str, src: str):
+        """
+        Store a copy of the file src under the given key.
+        """
+        # write to a temporary file first, so that other processes never see incomplete files
+        (fd, tmp) = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def read_json(self, key: str):
+        """
+        :return: data stored with write_json(), or None if the key is not in the cache
+        """
+        try:
+            with open(self.path(key)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        self.touch(key)
+        return data
+
+    def write_json(self, key: str, data):
+        """
+        Store JSON-serializable data under the given key.
+        """
+        (fd, tmp) = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache is not larger than max_size.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.startswith(".tmp-") or not entry.is_file():
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for (mtime, size, path) in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already removed by another process
+                pass
+            total -= size
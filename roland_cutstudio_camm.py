@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Direct output to Roland cutters in CAMM-GL (HPGL-style PU/PD commands), without CutStudio
+
+Usage: python3 roland_cutstudio_camm.py [options] FILE.cutstudio.eps DESTINATION
+
+The cut lines of a CutStudio EPS file (written by roland_cutstudio.py) are converted to CAMM-GL
+and streamed to DESTINATION, which can be:
+- a file, e.g. job.hpgl
+- a device node, e.g. /dev/usb/lp0 or /dev/ttyUSB0 (serial settings must be configured beforehand, e.g. with stty)
+- a network socket: tcp://HOST:PORT
+
+Curves are approximated by straight lines. Cropmark scanning is not supported, use CutStudio for that.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import argparse
+import contextlib
+import math
+import socket
+import sys
+from typing import Iterator, List, Optional
+
+import numpy
+
+from roland_cutstudio_geometry import CutGeometry
+
+# CAMM-GL plotter units per mm (1 unit = 0.025 mm)
+STEPS_PER_MM = 40
+
+# Maximum deviation of the straight lines from curves, in plotter units
+CURVE_TOLERANCE = 0.5
+
+# Maximum number of points in one PD command, to keep commands short for the device's input buffer
+MAX_POINTS_PER_COMMAND = 64
+
+def read_cutstudio_eps(filename: str) -> CutGeometry:
+    """
+    Read the cut lines of a CutStudio EPS file written by roland_cutstudio.EPS2CutstudioEPS() (coordinates in pt).
+    """
+    geometry = CutGeometry()
+    ops = []
+    coordinates = []
+    inside = False
+    with open(filename) as f:
+        for line in f:
+            line = line.strip()
+            if line == "% Cutstudio Start":
+                inside = True
+            elif line == "% Cutstudio End":
+                break
+            elif inside and line and not line.startswith("%"):
+                tokens = line.split()
+                ops.append(tokens[-1])
+                coordinates += tokens[:-1]
+    if ops:
+        geometry.add_commands(ops, numpy.array(coordinates, dtype=float).reshape(-1, 2))
+    geometry.remove_empty()
+    return geometry
+
+def flatten_curve(p0: numpy.ndarray, p1: numpy.ndarray, p2: numpy.ndarray, p3: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """
+    Approximate a cubic bezier curve by straight lines.
+
+    :param tolerance: maximum deviation from the curve
+    :return: points of the lines as array of shape (n, 2), without the start point p0
+    """
+    # The deviation of n uniform segments is at most 3/4 * max(second difference of control points) / n^2
+    second_difference = max(numpy.hypot(*(p0 - 2 * p1 + p2)), numpy.hypot(*(p1 - 2 * p2 + p3)))
+    n = max(1, math.ceil(math.sqrt(0.75 * second_difference / tolerance)))
+    t = numpy.linspace(0, 1, n + 1)[1:, numpy.newaxis]
+    s = 1 - t
+    return s ** 3 * p0 + 3 * s ** 2 * t * p1 + 3 * s * t ** 2 * p2 + t ** 3 * p3
+
+def camm_gl_commands(geometry: CutGeometry, speed: Optional[int] = None, force: Optional[int] = None,
+                     origin: str = "drawing", offset_mm=(0, 0), steps_per_mm: float = STEPS_PER_MM) -> Iterator[str]:
+    """
+    Convert cut lines to CAMM-GL commands.
+
+    :param geometry: cut lines in pt
+    :param speed: tool speed in cm/s (VS command), None for the setting of the device
+    :param force: blade force in gf (FS command), None for the setting of the device
+    :param origin: "drawing": move the bottom left corner of the drawing to the origin of the cutter /
+        "page": keep the coordinates (origin at the bottom left corner of the page)
+    :param offset_mm: additional offset (x, y) in mm
+    :param steps_per_mm: plotter units per mm
+    :return: iterator of commands, each terminated by ";"
+    """
+    if origin not in ["drawing", "page"]:
+        raise ValueError("origin must be 'drawing' or 'page'")
+    scale = 25.4 / 72 * steps_per_mm
+    shift = numpy.array(offset_mm, dtype=float) * steps_per_mm
+    if origin == "drawing" and geometry.subpaths:
+        shift -= numpy.min([subpath.points.min(axis=0) for subpath in geometry.subpaths], axis=0) * scale
+    yield "IN;"
+    if speed is not None:
+        yield "VS{};".format(speed)
+    if force is not None:
+        yield "FS{};".format(force)
+    for subpath in geometry.subpaths:
+        points = subpath.points * scale + shift
+        line = [points[:1]]
+        p = 1
+        for op in subpath.ops[1:]:
+            if op == "c":
+                line.append(flatten_curve(points[p - 1], points[p], points[p + 1], points[p + 2], CURVE_TOLERANCE))
+                p += 3
+            else:
+                line.append(points[p:p + 1])
+                p += 1
+        steps = numpy.rint(numpy.concatenate(line)).astype(int)
+        # remove points that are equal to the previous one after rounding
+        keep = numpy.concatenate([[True], numpy.any(steps[1:] != steps[:-1], axis=1)])
+        steps = steps[keep].tolist()
+        yield "PU{},{};".format(*steps[0])
+        for start in range(1, max(len(steps), 2), MAX_POINTS_PER_COMMAND):
+            # a single point still needs to be cut as a dot
+            chunk = steps[start:start + MAX_POINTS_PER_COMMAND] or steps[:1]
+            yield "PD" + ",".join("{},{}".format(x, y) for (x, y) in chunk) + ";"
+    yield "PU0,0;"
+
+class SocketWriter:
+    """
+    File-like wrapper for writing to (and reading from) a socket
+    """
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+
+    def write(self, data: bytes) -> int:
+        self.sock.sendall(data)
+        return len(data)
+
+    def read(self, size: int) -> bytes:
+        return self.sock.recv(size)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def flush(self):
+        pass
+
+@contextlib.contextmanager
+def open_destination(destination: str, readable: bool = False):
+    """
+    Open a file, device node or socket (tcp://HOST:PORT) for writing bytes.
+
+    :param readable: also open for reading answers of the device (not possible for normal files that do not exist yet)
+    """
+    if destination.startswith("tcp://"):
+        (host, port) = destination[len("tcp://"):].rsplit(":", 1)
+        with socket.create_connection((host.strip("[]"), int(port))) as sock:
+            yield SocketWriter(sock)
+    else:
+        # unbuffered, so that data is passed to the device in the chunks written by send_commands()
+        with open(destination, "r+b" if readable else "wb", buffering=0) as f:
+            yield f
+
+def send_commands(commands: Iterator[str], output, chunk_size: int = 4096) -> int:
+    """
+    Stream commands to an output opened by open_destination(), in chunks of about chunk_size bytes.
+
+    :return: number of bytes sent
+    """
+    total = 0
+    chunk = []
+    chunk_length = 0
+    for command in commands:
+        chunk.append(command)
+        chunk_length += len(command)
+        if chunk_length >= chunk_size:
+            total += output.write("".join(chunk).encode("ascii"))
+            chunk = []
+            chunk_length = 0
+    if chunk:
+        total += output.write("".join(chunk).encode("ascii"))
+    output.flush()
+    return total
+
+def camm_gl_job(filename: str, speed: Optional[int] = None, force: Optional[int] = None,
+                origin: str = "drawing", offset_mm=(0, 0), steps_per_mm: float = STEPS_PER_MM) -> bytes:
+    """
+    Convert a CutStudio EPS file to CAMM-GL, see camm_gl_commands()
+    """
+    geometry = read_cutstudio_eps(filename)
+    return "".join(camm_gl_commands(geometry, speed, force, origin, offset_mm, steps_per_mm)).encode("ascii")
+
+def send_cutstudio_eps(filename: str, destination: str, speed: Optional[int] = None, force: Optional[int] = None,
+                       origin: str = "drawing", offset_mm=(0, 0), steps_per_mm: float = STEPS_PER_MM) -> int:
+    """
+    Convert a CutStudio EPS file to CAMM-GL and send it to destination.
+
+    :param destination: see open_destination()
+    :param speed, force, origin, offset_mm, steps_per_mm: see camm_gl_commands()
+    :return: number of bytes sent
+    """
+    geometry = read_cutstudio_eps(filename)
+    with open_destination(destination) as output:
+        return send_commands(camm_gl_commands(geometry, speed, force, origin, offset_mm, steps_per_mm), output)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Send a CutStudio EPS file to a Roland cutter as CAMM-GL.")
+    parser.add_argument("input", help="CutStudio EPS file written by roland_cutstudio.py")
+    parser.add_argument("destination", help="output file, device node (e.g. /dev/usb/lp0) or tcp://HOST:PORT")
+    parser.add_argument("--speed", type=int, default=None, help="tool speed in cm/s (default: setting of the device)")
+    parser.add_argument("--force", type=int, default=None, help="blade force in gf (default: setting of the device)")
+    parser.add_argument("--origin", choices=["drawing", "page"], default="drawing",
+                        help="drawing: start at the bottom left corner of the drawing (default) / page: keep the position on the page")
+    parser.add_argument("--offset", type=float, nargs=2, default=(0, 0), metavar=("X", "Y"), help="additional offset in mm")
+    parser.add_argument("--steps-per-mm", type=float, default=STEPS_PER_MM, help="plotter units per mm (default: 40)")
+    args = parser.parse_args(argv)
+    sent = send_cutstudio_eps(args.input, args.destination, args.speed, args.force, args.origin, args.offset, args.steps_per_mm)
+    print("{} bytes sent to {}".format(sent, args.destination))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
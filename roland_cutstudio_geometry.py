@@ -0,0 +1,934 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Cut line geometry and optimization passes for the Roland CutStudio export script
+
+The converter (EPS2CutstudioEPS in roland_cutstudio.py) normally streams the cut lines
+directly to the output file. If optimizations are enabled, the transformed cut lines
+are instead collected in PathArrays, converted to a CutGeometry, processed by the passes in this file, and then written.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import bisect
+import heapq
+import math
+import time
+from typing import List, Optional, Tuple
+import numpy
+
+class Subpath:
+    """
+    Connected cut line: a moveto followed by lineto/curveto commands.
+
+    ops: drawing commands, starting with "m", followed by "l" and "c"
+    points: numpy array of shape (n, 2) with the points of all commands (1 for m and l, 3 for c)
+    """
+    def __init__(self, ops: List[str], points: numpy.ndarray):
+        self.ops = ops
+        self.points = points
+
+    @property
+    def start(self) -> Tuple[float, float]:
+        return (float(self.points[0][0]), float(self.points[0][1]))
+
+    @property
+    def end(self) -> Tuple[float, float]:
+        return (float(self.points[-1][0]), float(self.points[-1][1]))
+
+    def is_closed(self) -> bool:
+        return self.start == self.end
+
+    def reversed(self) -> "Subpath":
+        """
+        Same cut line in opposite direction.
+        The control points of curves are automatically swapped by reversing all points.
+        """
+        return Subpath(["m"] + self.ops[:0:-1], self.points[::-1].copy())
+
+class CutGeometry:
+    """
+    Cut lines in CutStudio coordinates (pt)
+    """
+    def __init__(self, subpaths: Optional[List[Subpath]] = None):
+        self.subpaths = subpaths or []
+
+    def add_commands(self, ops: List[str], points: numpy.ndarray):
+        """
+        Add drawing commands. If they do not start with a moveto, they continue the last subpath.
+
+        :param points: numpy array of shape (n, 2), see Subpath
+        """
+        pending_ops = []
+        start = 0
+        index = 0
+        for op in ops:
+            if op == "m" and pending_ops:
+                self._append(pending_ops, points[start:index])
+                pending_ops = []
+                start = index
+            pending_ops.append(op)
+            index += 3 if op == "c" else 1
+        if pending_ops:
+            self._append(pending_ops, points[start:index])
+
+    def _append(self, ops: List[str], points: numpy.ndarray):
+        if ops[0] != "m" and self.subpaths:
+            last = self.subpaths[-1]
+            last.ops = last.ops + ops
+            last.points = numpy.concatenate([last.points, points])
+        else:
+            self.subpaths.append(Subpath(ops, points))
+
+    def remove_empty(self):
+        """
+        Remove subpaths that only consist of a moveto and do not cut anything.
+        """
+        self.subpaths = [s for s in self.subpaths if len(s.ops) > 1]
+
+    def command_count(self) -> int:
+        return sum(len(s.ops) for s in self.subpaths)
+
+# Opcodes of PathArrays. A closepath is stored as a line to the start of the subpath, as in the CutStudio output.
+OP_MOVE = 0
+OP_LINE = 1
+OP_CURVE = 2
+# drawing command and number of points of each opcode
+OPCODE_NAMES = numpy.array(["m", "l", "c"])
+OPCODE_POINTS = numpy.array([1, 1, 3])
+# opcode of each drawing command, indexed by its character code
+OPCODES = numpy.zeros(256, dtype=numpy.uint8)
+OPCODES[[ord(name) for name in OPCODE_NAMES]] = [OP_MOVE, OP_LINE, OP_CURVE]
+
+class PathArrays:
+    """
+    Cut lines stored as structure of arrays, as passed from the parser to the writer
+    (see roland_cutstudio.EPS2CutstudioEPS() and write_path_arrays()).
+    This needs about 18 bytes per point, and whole-drawing operations (transformations, bounding boxes) are vectorized.
+
+    opcodes: uint8 array with one opcode per drawing command (OP_MOVE, OP_LINE, OP_CURVE)
+    points: float64 array of shape (n, 2) with the points of all commands (see OPCODE_POINTS)
+    subpath_offsets: int64 array with the index of the first command of each subpath, followed by the number of commands.
+        Each moveto starts a subpath. If the commands do not start with a moveto, the first subpath starts without one.
+    """
+    def __init__(self, opcodes: numpy.ndarray, points: numpy.ndarray):
+        self.opcodes = opcodes
+        self.points = points
+        starts = numpy.flatnonzero(opcodes == OP_MOVE)
+        if len(opcodes) and opcodes[0] != OP_MOVE:
+            starts = numpy.concatenate([[0], starts])
+        self.subpath_offsets = numpy.append(starts, len(opcodes)).astype(numpy.int64)
+
+    @classmethod
+    def from_commands(cls, ops: List[str], points: numpy.ndarray) -> "PathArrays":
+        """
+        :param ops: drawing commands "m", "l", "c"
+        :param points: numpy array of shape (n, 2), see Subpath
+        """
+        opcodes = OPCODES[numpy.frombuffer("".join(ops).encode("ascii"), dtype=numpy.uint8)]
+        return cls(opcodes, numpy.asarray(points, dtype=numpy.float64).reshape(-1, 2))
+
+    @classmethod
+    def concatenate(cls, parts: List["PathArrays"]) -> "PathArrays":
+        """
+        Join the commands of all parts. A part that does not start with a moveto continues the last subpath of the previous parts.
+        """
+        parts = [part for part in parts if len(part.opcodes)]
+        if not parts:
+            return cls(numpy.zeros(0, dtype=numpy.uint8), numpy.zeros((0, 2)))
+        return cls(numpy.concatenate([part.opcodes for part in parts]), numpy.concatenate([part.points for part in parts]))
+
+    @classmethod
+    def from_geometry(cls, geometry: CutGeometry) -> "PathArrays":
+        """
+        Join the subpaths of the geometry, the reverse of to_geometry()
+        """
+        if not geometry.subpaths:
+            return cls.concatenate([])
+        ops = [op for subpath in geometry.subpaths for op in subpath.ops]
+        return cls.from_commands(ops, numpy.concatenate([subpath.points for subpath in geometry.subpaths]))
+
+    def to_geometry(self) -> CutGeometry:
+        """
+        Convert to subpaths for the optimization passes. Their points are views of self.points.
+        """
+        names = OPCODE_NAMES[self.opcodes].tolist()
+        offsets = self.subpath_offsets.tolist()
+        point_offsets = self.command_point_offsets()[self.subpath_offsets].tolist()
+        return CutGeometry([Subpath(names[offsets[i]:offsets[i + 1]], self.points[point_offsets[i]:point_offsets[i + 1]])
+                            for i in range(len(offsets) - 1)])
+
+    def ops(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """
+        Drawing commands "m", "l", "c" of the commands start ... end - 1
+        """
+        return OPCODE_NAMES[self.opcodes[start:end]].tolist()
+
+    def command_point_offsets(self) -> numpy.ndarray:
+        """
+        Index of the first point of each command, followed by the number of points
+        """
+        return numpy.concatenate([[0], numpy.cumsum(OPCODE_POINTS[self.opcodes])])
+
+    def command_count(self) -> int:
+        return len(self.opcodes)
+
+    def subpath_count(self) -> int:
+        return len(self.subpath_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.opcodes.nbytes + self.points.nbytes + self.subpath_offsets.nbytes
+
+    def transformed(self, matrix: numpy.ndarray) -> "PathArrays":
+        """
+        :param matrix: 3x3 matrix m that transforms a row vector [x, y, 1] to [x', y', 1] = [x, y, 1] * m
+        """
+        points = numpy.matmul(self.points, matrix[0:2, 0:2]) + matrix[2, 0:2]
+        return PathArrays(self.opcodes, points)
+
+    def bounding_box(self) -> Tuple[float, float, float, float]:
+        """
+        (x_min, y_min, x_max, y_max) of all points, incl. control points of curves
+        """
+        return tuple(self.points.min(axis=0).tolist() + self.points.max(axis=0).tolist())
+
+    def subpath_bounding_boxes(self) -> numpy.ndarray:
+        """
+        Bounding box (x_min, y_min, x_max, y_max) of each subpath as array of shape (subpaths, 4), see bounding_box()
+        """
+        if not self.subpath_count():
+            return numpy.zeros((0, 4))
+        starts = self.command_point_offsets()[self.subpath_offsets[:-1]]
+        return numpy.concatenate([numpy.minimum.reduceat(self.points, starts), numpy.maximum.reduceat(self.points, starts)], axis=1)
+
+class SpatialIndex:
+    """
+    Bucketed k-d tree of points for fast nearest-neighbour queries. Points can be removed.
+
+    The tree is split at the median, so it adapts to the density of the points:
+    clustered input (e.g. a small, detailed logo on a large sheet) is handled as fast as evenly spread input.
+    """
+    # maximum number of points in a leaf
+    LEAF_SIZE = 16
+
+    def __init__(self, points: List[Tuple[float, float]], items: list):
+        """
+        :param points: positions
+        :param items: arbitrary (hashable) item for each position, returned by queries
+        """
+        self._build(list(zip(points, items)))
+
+    def _build(self, entries: list):
+        # The nodes are stored in lists indexed by node number, node 0 is the root.
+        # boxes: bounding box (min_x, min_y, max_x, max_y) of the points of the node when the tree was built
+        # counts: number of remaining points of the node
+        # children: (left, right) or None for leaves. Inner nodes are split at the median of the longer side.
+        # entries: list of (point, item) of leaves, None for inner nodes
+        self.boxes = []
+        self.counts = []
+        self.children = []
+        self.entries = []
+        self.parents = []
+        # leaves of each entry, for remove()
+        self.leaves = {}
+        self.count = len(entries)
+        self.built_count = len(entries)
+        root = self._add_node(None)
+        if not entries:
+            self.boxes[root] = (0, 0, 0, 0)
+            self.entries[root] = []
+            return
+        positions = numpy.array([entry[0] for entry in entries], dtype=float)
+        todo = [(root, numpy.arange(len(entries)))]
+        while todo:
+            (node, indices) = todo.pop()
+            node_positions = positions[indices]
+            (low, high) = (node_positions.min(axis=0), node_positions.max(axis=0))
+            self.boxes[node] = (float(low[0]), float(low[1]), float(high[0]), float(high[1]))
+            self.counts[node] = len(indices)
+            if len(indices) <= self.LEAF_SIZE:
+                self.entries[node] = [entries[i] for i in indices]
+                for entry in self.entries[node]:
+                    self.leaves.setdefault(entry, []).append(node)
+                continue
+            axis = 0 if high[0] - low[0] >= high[1] - low[1] else 1
+            middle = len(indices) // 2
+            indices = indices[numpy.argpartition(node_positions[:, axis], middle)]
+            (left, right) = (self._add_node(node), self._add_node(node))
+            self.children[node] = (left, right)
+            todo += [(left, indices[:middle]), (right, indices[middle:])]
+
+    def _add_node(self, parent: Optional[int]) -> int:
+        self.boxes.append(None)
+        self.counts.append(0)
+        self.children.append(None)
+        self.entries.append(None)
+        self.parents.append(parent)
+        return len(self.boxes) - 1
+
+    def remove(self, point, item):
+        entry = (point, item)
+        node = self.leaves[entry].pop()
+        self.entries[node].remove(entry)
+        while node is not None:
+            self.counts[node] -= 1
+            node = self.parents[node]
+        self.count -= 1
+
+    def _search(self, point, count: int) -> list:
+        """
+        :return: up to count nearest remaining entries as heap of (-squared distance, number, entry)
+        """
+        (px, py) = point
+        found = []
+        # number of entries pushed to found, so that the heap never needs to compare entries
+        pushed = 0
+        # squared distance of the farthest entry found, once count entries were found
+        limit = math.inf
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            if self.counts[node] == 0:
+                continue
+            (x0, y0, x1, y1) = self.boxes[node]
+            dx = x0 - px if px < x0 else (px - x1 if px > x1 else 0)
+            dy = y0 - py if py < y0 else (py - y1 if py > y1 else 0)
+            if dx * dx + dy * dy >= limit:
+                continue
+            children = self.children[node]
+            if children is None:
+                for entry in self.entries[node]:
+                    d = (entry[0][0] - px) ** 2 + (entry[0][1] - py) ** 2
+                    if d < limit:
+                        heapq.heappush(found, (-d, pushed, entry))
+                        pushed += 1
+                        if len(found) > count:
+                            heapq.heappop(found)
+                        if len(found) == count:
+                            limit = -found[0][0]
+                continue
+            # search the child that contains the point first, as it most likely contains the nearest entries
+            (left, right) = children
+            (lx0, ly0, lx1, ly1) = self.boxes[left]
+            if lx0 <= px <= lx1 and ly0 <= py <= ly1:
+                stack += [right, left]
+            else:
+                stack += [left, right]
+        return found
+
+    def nearest(self, point) -> Optional[tuple]:
+        """
+        Find the nearest remaining entry.
+
+        :return: (point, item) or None if the index is empty
+        """
+        if self.count == 0:
+            return None
+        if self.count < self.built_count / 4:
+            # Most points were removed. Rebuild, so that the search does not need to look at many nearly empty nodes.
+            self._build([entry for entries in self.entries if entries for entry in entries])
+        found = self._search(point, 1)
+        return found[0][-1]
+
+    def neighbours(self, point, count: int = 16) -> list:
+        """
+        Items of the count nearest remaining entries, nearest first
+        """
+        return [entry[1] for (d, number, entry) in sorted(self._search(point, count), reverse=True)]
+
+def travel_distance(subpaths: List[Subpath], origin: Tuple[float, float] = (0, 0)) -> float:
+    """
+    Total length of moves with the blade up: from the origin to the first subpath, and between subpaths
+    """
+    distance = 0
+    position = origin
+    for subpath in subpaths:
+        distance += math.dist(position, subpath.start)
+        position = subpath.end
+    return distance
+
+# Number of subpaths near the end of a subpath that optimize_order() tries to move next to it
+TWO_OPT_CANDIDATES = 12
+
+def optimize_order(geometry: CutGeometry, origin: Tuple[float, float] = (0, 0), time_limit: float = 2) -> dict:
+    """
+    Reorder (and possibly reverse) the subpaths to minimize travel with the blade up.
+
+    First, a greedy nearest-neighbour tour is built using a spatial index of the subpath endpoints.
+    Then, it is improved by 2-opt moves between neighbouring subpaths until no improvement is found or the time limit is reached.
+
+    :param origin: start position of the blade
+    :param time_limit: maximum time in seconds for the 2-opt refinement
+    :return: statistics: travel distance in pt before and after
+    """
+    subpaths = geometry.subpaths
+    before = travel_distance(subpaths, origin)
+    n = len(subpaths)
+    if n < 2:
+        return {"travel_before": before, "travel_after": before}
+
+    # Nearest neighbour: the index contains the start and (for open paths) the end of every subpath.
+    points = []
+    items = []
+    for (index, subpath) in enumerate(subpaths):
+        points.append(subpath.start)
+        items.append((index, False))
+        if not subpath.is_closed():
+            points.append(subpath.end)
+            items.append((index, True))
+    endpoints = SpatialIndex(points, items)
+    order = []
+    flipped = []
+    position = origin
+    while True:
+        entry = endpoints.nearest(position)
+        if entry is None:
+            break
+        (index, flip) = entry[1]
+        order.append(index)
+        flipped.append(flip)
+        subpath = subpaths[index]
+        endpoints.remove(subpath.start, (index, False))
+        if not subpath.is_closed():
+            endpoints.remove(subpath.end, (index, True))
+        position = subpath.start if flip else subpath.end
+
+    # 2-opt: replace the moves end(i) -> start(i+1) and end(j) -> start(j+1)
+    # by end(i) -> end(j) and start(i+1) -> start(j+1), reversing everything in between.
+    starts = [s.start for s in subpaths]
+    ends = [s.end for s in subpaths]
+    def start_of(p):
+        return ends[order[p]] if flipped[p] else starts[order[p]]
+    def end_of(p):
+        if p < 0:
+            return origin
+        return starts[order[p]] if flipped[p] else ends[order[p]]
+    position_of = [0] * n
+    for (p, index) in enumerate(order):
+        position_of[index] = p
+    neighbour_index = SpatialIndex(starts + ends, list(range(n)) * 2)
+    # The candidates are searched near the endpoints of the subpaths (or the origin), which do not change. Each search is only done once.
+    candidates_near = {}
+    def candidates(point):
+        if point not in candidates_near:
+            candidates_near[point] = neighbour_index.neighbours(point, TWO_OPT_CANDIDATES)
+        return candidates_near[point]
+    deadline = time.monotonic() + time_limit
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        for i in range(-1, n - 2):
+            a = end_of(i)
+            b = start_of(i + 1)
+            for candidate in candidates(a):
+                j = position_of[candidate]
+                if j <= i + 1:
+                    continue
+                c = end_of(j)
+                old = math.dist(a, b)
+                new = math.dist(a, c)
+                if j + 1 < n:
+                    d = start_of(j + 1)
+                    old += math.dist(c, d)
+                    new += math.dist(b, d)
+                if new < old - 1e-9:
+                    order[i + 1:j + 1] = order[i + 1:j + 1][::-1]
+                    flipped[i + 1:j + 1] = [not f for f in flipped[i + 1:j + 1][::-1]]
+                    for p in range(i + 1, j + 1):
+                        position_of[order[p]] = p
+                    improved = True
+                    break
+            if time.monotonic() > deadline:
+                break
+
+    optimized = [subpaths[index].reversed() if flip else subpaths[index] for (index, flip) in zip(order, flipped)]
+    after = travel_distance(optimized, origin)
+    if after >= before:
+        # The heuristic is not guaranteed to find a better order, e.g. if the input is already well ordered.
+        return {"travel_before": before, "travel_after": before}
+    geometry.subpaths = optimized
+    return {"travel_before": before, "travel_after": after}
+
+def simplification_mask(points: numpy.ndarray, tolerance: float) -> numpy.ndarray:
+    """
+    Ramer-Douglas-Peucker simplification of a polyline.
+
+    Points are removed if the simplified line is at most tolerance away from them.
+    The distance is measured to the line segment (not the infinite line), so that
+    collinear points where the line turns back are kept.
+
+    :return: boolean array, True for points that are kept. The first and last point are always kept.
+    """
+    n = len(points)
+    keep = numpy.zeros(n, dtype=bool)
+    keep[0] = True
+    keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        (a, b) = stack.pop()
+        if b - a < 2:
+            continue
+        segment = points[b] - points[a]
+        relative = points[a + 1:b] - points[a]
+        length_squared = float(segment @ segment)
+        if length_squared == 0:
+            distances = numpy.hypot(relative[:, 0], relative[:, 1])
+        else:
+            t = numpy.clip((relative @ segment) / length_squared, 0, 1)
+            closest = numpy.outer(t, segment)
+            distances = numpy.hypot(relative[:, 0] - closest[:, 0], relative[:, 1] - closest[:, 1])
+        i = int(numpy.argmax(distances))
+        if distances[i] > tolerance:
+            k = a + 1 + i
+            keep[k] = True
+            stack.append((a, k))
+            stack.append((k, b))
+    return keep
+
+def simplify_subpath(subpath: Subpath, tolerance: float) -> Subpath:
+    """
+    Simplify all runs of consecutive lineto commands, see simplification_mask().
+    Zero-length lines are removed. Curves are not changed.
+    """
+    ops = subpath.ops
+    if "l" not in ops:
+        return subpath
+    points = subpath.points
+    new_ops = []
+    new_indices = []
+    i = 0 # index in ops
+    p = 0 # index in points
+    while i < len(ops):
+        op = ops[i]
+        if op != "l":
+            count = 3 if op == "c" else 1
+            new_ops.append(op)
+            new_indices += range(p, p + count)
+            p += count
+            i += 1
+            continue
+        # run of lines, starting at the end point of the previous command
+        j = i
+        while j < len(ops) and ops[j] == "l":
+            j += 1
+        indices = numpy.arange(p - 1, p + j - i)
+        run = points[indices]
+        # remove zero-length lines
+        moving = numpy.concatenate([[True], numpy.any(run[1:] != run[:-1], axis=1)])
+        indices = indices[moving]
+        run = run[moving]
+        if len(run) > 2:
+            indices = indices[simplification_mask(run, tolerance)]
+        kept = indices[1:].tolist()
+        new_ops += ["l"] * len(kept)
+        new_indices += kept
+        p += j - i
+        i = j
+    if len(new_ops) == len(ops):
+        return subpath
+    return Subpath(new_ops, points[new_indices])
+
+def simplify(geometry: CutGeometry, tolerance: float) -> dict:
+    """
+    Simplify lines of all subpaths, see simplify_subpath().
+
+    :param tolerance: maximum deviation in pt
+    :return: statistics: number of removed commands
+    """
+    before = geometry.command_count()
+    geometry.subpaths = [simplify_subpath(subpath, tolerance) for subpath in geometry.subpaths]
+    return {"simplify_removed": before - geometry.command_count()}
+
+# Maximum distance in pt between two segments that are considered the same cut line (about 0.02 mm)
+DUPLICATE_TOLERANCE = 0.05
+
+class SegmentHash:
+    """
+    Spatial hash of straight line segments: Each segment is stored in all grid cells along its length.
+    """
+    def __init__(self, cell: float):
+        self.cell = cell
+        self.segments = []
+        self.cells = {}
+
+    def _cells_along(self, p0, p1) -> set:
+        length = math.dist(p0, p1)
+        # sample at half the cell size, so that no cell is skipped (except for corners, see query())
+        steps = int(length / (self.cell / 2)) + 1
+        return {(math.floor((p0[0] + (p1[0] - p0[0]) * s / steps) / self.cell),
+                 math.floor((p0[1] + (p1[1] - p0[1]) * s / steps) / self.cell)) for s in range(steps + 1)}
+
+    def add(self, p0, p1):
+        index = len(self.segments)
+        self.segments.append((p0, p1))
+        for key in self._cells_along(p0, p1):
+            self.cells.setdefault(key, []).append(index)
+
+    def query(self, p0, p1) -> list:
+        """
+        Segments that may be within a cell size of the segment p0-p1
+        """
+        found = set()
+        for (x, y) in self._cells_along(p0, p1):
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    found.update(self.cells.get((x + dx, y + dy), ()))
+        return [self.segments[i] for i in sorted(found)]
+
+def uncovered_intervals(p0, p1, candidates: list, tolerance: float) -> List[Tuple[float, float]]:
+    """
+    Parts of the line p0-p1 that are not covered by any of the candidate segments.
+    A candidate covers a part of the line if it lies within tolerance of the line.
+    Covered parts up to tolerance long are ignored, as they are only touched (e.g. by the neighbouring segments of a curve
+    that was converted to many short lines) or overlap by rounding errors. So lines up to tolerance long are always kept.
+
+    :return: intervals (start, end) of the distance from p0, without pieces shorter than tolerance. [(0, length)] if nothing is covered.
+    """
+    length = math.dist(p0, p1)
+    ux = (p1[0] - p0[0]) / length
+    uy = (p1[1] - p0[1]) / length
+    covered = []
+    for (q0, q1) in candidates:
+        # distance of the candidate's endpoints to the line, and position along it
+        if abs(ux * (q0[1] - p0[1]) - uy * (q0[0] - p0[0])) > tolerance:
+            continue
+        if abs(ux * (q1[1] - p0[1]) - uy * (q1[0] - p0[0])) > tolerance:
+            continue
+        t0 = ux * (q0[0] - p0[0]) + uy * (q0[1] - p0[1])
+        t1 = ux * (q1[0] - p0[0]) + uy * (q1[1] - p0[1])
+        (t0, t1) = (max(min(t0, t1), 0), min(max(t0, t1), length))
+        if t1 > t0:
+            covered.append((t0, t1))
+    covered.sort()
+    merged = []
+    for (t0, t1) in covered:
+        if merged and t0 <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], t1))
+        else:
+            merged.append((t0, t1))
+    merged = [(t0, t1) for (t0, t1) in merged if t1 - t0 > tolerance]
+    if not merged:
+        return [(0, length)]
+    pieces = []
+    position = 0
+    for (t0, t1) in merged:
+        if t0 - position > tolerance:
+            pieces.append((position, t0))
+        position = t1
+    if length - position > tolerance:
+        pieces.append((position, length))
+    return pieces
+
+def remove_duplicates(geometry: CutGeometry, tolerance: float = DUPLICATE_TOLERANCE) -> dict:
+    """
+    Remove segments that are cut more than once, e.g. shared edges of adjacent shapes.
+
+    Straight lines are shortened or split where they overlap an earlier line (in either direction).
+    Curves are only removed if an earlier curve has the same control points (in either direction).
+    Subpaths are split where segments were removed.
+
+    :param tolerance: maximum distance in pt between duplicate segments
+    :return: statistics: number of changed segments and removed length in pt
+    """
+    lines = []
+    for subpath in geometry.subpaths:
+        points = subpath.points.tolist()
+        p = 0
+        for op in subpath.ops:
+            if op == "l":
+                lines.append(math.dist(points[p - 1], points[p]))
+            p += 3 if op == "c" else 1
+    if not lines:
+        return {"duplicate_segments": 0, "duplicate_length": 0}
+    # Cells of about the average line length: most lines are only stored in a few cells.
+    line_hash = SegmentHash(max(sum(lines) / len(lines), tolerance * 10))
+    curves = set()
+    def curve_key(curve_points):
+        return tuple(round(c / tolerance) for point in curve_points for c in point)
+
+    changed_segments = 0
+    removed_length = 0
+    subpaths = []
+    for subpath in geometry.subpaths:
+        points = subpath.points.tolist()
+        new_ops = []
+        new_points = []
+        pen = None
+        def draw(op, start, segment_points):
+            nonlocal pen
+            if pen != start:
+                new_ops.append("m")
+                new_points.append(start)
+            new_ops.append(op)
+            new_points.extend(segment_points)
+            pen = segment_points[-1]
+        changed = False
+        p = 1
+        for op in subpath.ops[1:]:
+            start = points[p - 1]
+            if op == "c":
+                segment_points = points[p:p + 3]
+                key = curve_key([start] + segment_points)
+                if key in curves:
+                    changed = True
+                    changed_segments += 1
+                else:
+                    curves.add(key)
+                    curves.add(curve_key(([start] + segment_points)[::-1]))
+                    draw("c", start, segment_points)
+                p += 3
+                continue
+            end = points[p]
+            p += 1
+            length = math.dist(start, end)
+            if length == 0:
+                draw("l", start, [end])
+                continue
+            pieces = uncovered_intervals(start, end, line_hash.query(start, end), tolerance)
+            if pieces == [(0, length)]:
+                draw("l", start, [end])
+                line_hash.add(start, end)
+                continue
+            changed = True
+            changed_segments += 1
+            removed_length += length - sum(t1 - t0 for (t0, t1) in pieces)
+            for (t0, t1) in pieces:
+                piece_start = start if t0 == 0 else [start[i] + (end[i] - start[i]) * t0 / length for i in (0, 1)]
+                piece_end = end if t1 == length else [start[i] + (end[i] - start[i]) * t1 / length for i in (0, 1)]
+                draw("l", piece_start, [piece_end])
+                line_hash.add(piece_start, piece_end)
+        if not changed:
+            subpaths.append(subpath)
+            continue
+        # split into subpaths at the inserted movetos
+        pieces = CutGeometry()
+        if new_ops:
+            pieces.add_commands(new_ops, numpy.array(new_points, dtype=float))
+        subpaths += pieces.subpaths
+    geometry.subpaths = subpaths
+    return {"duplicate_segments": changed_segments, "duplicate_length": removed_length}
+
+def step_and_repeat(geometry: CutGeometry, columns: int, rows: int, spacing: float = 0,
+                    area: Optional[Tuple[float, float, float, float]] = None) -> dict:
+    """
+    Repeat the cut lines in a grid of columns x rows copies, e.g. for a sheet of stickers.
+
+    The copies are placed to the right of and below the original, with the given spacing between
+    their bounding boxes. The points of all subpaths are collected in one array, which is reused
+    for all copies: each copy only adds its offset, and its subpaths are slices of the result.
+
+    :param spacing: distance between neighbouring copies in pt
+    :param area: (x_min, y_min, x_max, y_max) in pt, e.g. the cutting area between the cropmarks, or None.
+        Copies that are not completely inside are left out (the original is always kept).
+    :return: statistics: number of copies (incl. the original) and of copies that were left out
+    """
+    geometry.remove_empty()
+    if not geometry.subpaths:
+        return {"repeat_copies": 0, "repeat_skipped": 0}
+    all_points = numpy.concatenate([subpath.points for subpath in geometry.subpaths])
+    bounds = numpy.cumsum([0] + [len(subpath.points) for subpath in geometry.subpaths]).tolist()
+    (x_min, y_min) = all_points.min(axis=0).tolist()
+    (x_max, y_max) = all_points.max(axis=0).tolist()
+    pitch_x = x_max - x_min + spacing
+    pitch_y = y_max - y_min + spacing
+    subpaths = []
+    skipped = 0
+    for row in range(rows):
+        for column in range(columns):
+            (dx, dy) = (column * pitch_x, -row * pitch_y)
+            if area is not None and (row or column):
+                # (a tiny tolerance for rounding errors)
+                if (x_min + dx < area[0] - 1e-6 or y_min + dy < area[1] - 1e-6
+                        or x_max + dx > area[2] + 1e-6 or y_max + dy > area[3] + 1e-6):
+                    skipped += 1
+                    continue
+            points = all_points + [dx, dy]
+            subpaths += [Subpath(subpath.ops, points[start:end]) for (subpath, start, end) in zip(geometry.subpaths, bounds, bounds[1:])]
+    geometry.subpaths = subpaths
+    return {"repeat_copies": columns * rows - skipped, "repeat_skipped": skipped}
+
+# Size of the registration crosses that tile() adds to neighbouring panels, in pt (5 mm)
+REGISTRATION_MARK_SIZE = 5 * 72 / 25.4
+
+def split_curve(points: list, t: float) -> Tuple[list, list]:
+    """
+    Split a cubic bezier curve at the parameter t (de Casteljau's algorithm).
+
+    :param points: start point and the three points of the curveto
+    :return: points of both parts, in the same format
+    """
+    def between(a, b):
+        return [a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t]
+    (p0, p1, p2, p3) = points
+    (a, b, c) = (between(p0, p1), between(p1, p2), between(p2, p3))
+    (d, e) = (between(a, b), between(b, c))
+    f = between(d, e)
+    return ([p0, a, d, f], [f, e, c, p3])
+
+def curve_crossings(xs: list, edges: list) -> List[float]:
+    """
+    Parameters t (0 < t < 1) where a cubic bezier curve crosses any of the vertical lines x = edge.
+
+    :param xs: x coordinates of the four points of the curve
+    """
+    (x0, x1, x2, x3) = xs
+    coefficients = [-x0 + 3 * x1 - 3 * x2 + x3, 3 * x0 - 6 * x1 + 3 * x2, -3 * x0 + 3 * x1]
+    crossings = []
+    for edge in edges:
+        for root in numpy.roots(coefficients + [x0 - edge]):
+            if abs(root.imag) < 1e-9 and 0 < root.real < 1:
+                crossings.append(float(root.real))
+    return sorted(crossings)
+
+def tile(geometry: CutGeometry, width: float, overlap: float = 0) -> List[CutGeometry]:
+    """
+    Split the cut lines into panels along the x axis, e.g. for banners that are wider than the cutter.
+
+    Panel i covers x = left + i * (width - overlap) ... left + i * (width - overlap) + width,
+    where left is the left edge of the drawing, so that neighbouring panels overlap.
+    The panel edges form a regular grid, so the panels of a subpath are found in constant time.
+    Only subpaths that cross a panel edge are processed segment by segment: segments are split where
+    they cross an edge (curves exactly, at the roots of x(t)) and each piece is added to the panels that contain it.
+
+    Each panel is moved so that its left edge is at x = 0. Registration crosses are added
+    above and below the drawing in the middle of each overlap, to both neighbouring panels.
+
+    :param width: panel width in pt
+    :param overlap: overlap of neighbouring panels in pt
+    :return: panels from left to right
+    """
+    if not 0 <= overlap < width:
+        raise ValueError("The overlap of the panels must be smaller than their width")
+    geometry.remove_empty()
+    if not geometry.subpaths:
+        return [CutGeometry()]
+    # x range of each subpath
+    paths = PathArrays.from_geometry(geometry)
+    boxes = paths.subpath_bounding_boxes()
+    x_min = boxes[:, 0].tolist()
+    x_max = boxes[:, 2].tolist()
+    (left, bottom, right, top) = paths.bounding_box()
+    del paths, boxes
+    step = width - overlap
+    # (a tiny tolerance, so that rounding errors do not add an empty panel)
+    count = max(1, math.ceil((right - left - overlap) / step - 1e-9))
+    starts = [left + i * step for i in range(count)]
+    edges = sorted(set(starts[1:] + [start + width for start in starts[:-1]]))
+    panels = [CutGeometry() for i in range(count)]
+
+    def panels_at(x):
+        # panels that contain the x coordinate
+        return range(max(0, math.ceil((x - left - width) / step)), min(count - 1, math.floor((x - left) / step)) + 1)
+
+    for (subpath, x0, x1) in zip(geometry.subpaths, x_min, x_max):
+        crossed = edges[bisect.bisect_right(edges, x0):bisect.bisect_left(edges, x1)]
+        if not crossed:
+            for i in panels_at((x0 + x1) / 2):
+                panels[i].subpaths.append(Subpath(subpath.ops, subpath.points - [starts[i], 0]))
+            continue
+        # pieces of this subpath in each panel: panel -> [ops, points, end point]
+        pieces = {}
+        def add(op, start, segment_points, middle_x):
+            for i in panels_at(middle_x):
+                piece = pieces.setdefault(i, [[], [], None])
+                if piece[2] != start:
+                    piece[0].append("m")
+                    piece[1].append(start)
+                piece[0].append(op)
+                piece[1].extend(segment_points)
+                piece[2] = segment_points[-1]
+        points = subpath.points.tolist()
+        p = 1
+        for op in subpath.ops[1:]:
+            start = points[p - 1]
+            if op == "c":
+                curve = [start] + points[p:p + 3]
+                p += 3
+                xs = [point[0] for point in curve]
+                previous = 0
+                for t in curve_crossings(xs, [edge for edge in crossed if min(xs) < edge < max(xs)]) + [1]:
+                    if t < 1:
+                        (piece, curve) = split_curve(curve, (t - previous) / (1 - previous))
+                        previous = t
+                    else:
+                        piece = curve
+                    add("c", piece[0], piece[1:], (piece[0][0] + 3 * piece[1][0] + 3 * piece[2][0] + piece[3][0]) / 8)
+                continue
+            end = points[p]
+            p += 1
+            segment_edges = [edge for edge in crossed if min(start[0], end[0]) < edge < max(start[0], end[0])]
+            if end[0] < start[0]:
+                segment_edges.reverse()
+            for edge in segment_edges:
+                point = [edge, start[1] + (end[1] - start[1]) * (edge - start[0]) / (end[0] - start[0])]
+                add("l", start, [point], (start[0] + edge) / 2)
+                start = point
+            add("l", start, [end], (start[0] + end[0]) / 2)
+        for (i, (ops, piece_points, pen)) in sorted(pieces.items()):
+            panels[i].add_commands(ops, numpy.array(piece_points, dtype=float) - [starts[i], 0])
+
+    # registration crosses in the middle of each overlap
+    size = REGISTRATION_MARK_SIZE
+    for i in range(count - 1):
+        x = (starts[i + 1] + starts[i] + width) / 2
+        for y in (bottom - size, top + size):
+            for panel in (i, i + 1):
+                cross = [[x - size / 2, y], [x + size / 2, y], [x, y - size / 2], [x, y + size / 2]]
+                panels[panel].add_commands(["m", "l", "m", "l"], numpy.array(cross, dtype=float) - [starts[panel], 0])
+    return panels
+
+def process(geometry: CutGeometry, options: dict, cutting_area: Optional[Tuple[float, float, float, float]] = None) -> dict:
+    """
+    Run all optimization passes that are enabled in options.
+
+    Duplicates are removed and lines simplified before the design is repeated, so that this is only done once.
+
+    :param options: see roland_cutstudio.EPS2CutstudioEPS(), geometry_options
+    :param cutting_area: area for the copies of step_and_repeat(), see roland_cutstudio.cropmark_cutting_area()
+    :return: statistics of all passes
+    """
+    stats = {}
+    geometry.remove_empty()
+    if options.get("remove_duplicates"):
+        stats.update(remove_duplicates(geometry))
+    if options.get("simplify_tolerance"):
+        stats.update(simplify(geometry, options["simplify_tolerance"] * 72 / 25.4))
+    if options.get("repeat_columns", 0) > 1 or options.get("repeat_rows", 0) > 1:
+        stats.update(step_and_repeat(geometry, max(1, options.get("repeat_columns", 0)), max(1, options.get("repeat_rows", 0)),
+                                     options.get("repeat_spacing", 0) * 72 / 25.4, cutting_area))
+    if options.get("optimize_order"):
+        stats.update(optimize_order(geometry))
+    return stats
+
+def describe_stats(stats: dict) -> str:
+    """
+    Human-readable summary of the statistics returned by process()
+    and roland_cutstudio.EPS2CutstudioEPS()
+    """
+    lines = []
+    if "duplicate_segments" in stats:
+        lines.append("Removed {:.0f} mm of duplicate cut lines from {} segments.".format(
+            stats["duplicate_length"] * 25.4 / 72, stats["duplicate_segments"]))
+    if "simplify_removed" in stats:
+        lines.append("Simplification removed {} drawing commands.".format(stats["simplify_removed"]))
+    if "repeat_copies" in stats:
+        lines.append("The design was repeated {} times.".format(stats["repeat_copies"]))
+        if stats["repeat_skipped"]:
+            lines.append("{} copies did not fit into the cutting area between the cropmarks and were left out.".format(stats["repeat_skipped"]))
+    if "travel_before" in stats:
+        lines.append("Travel with the blade up: {:.0f} mm before, {:.0f} mm after optimizing the order.".format(
+            stats["travel_before"] * 25.4 / 72, stats["travel_after"] * 25.4 / 72))
+    if "bytes_saved" in stats:
+        lines.append("Compact number format saved {:.0f} kB.".format(stats["bytes_saved"] / 1000))
+    if "panels" in stats:
+        lines.append("The job was split into {} panels, written to separate files (*.panel1.cutstudio.eps, ...).".format(stats["panels"]))
+    return "\n".join(lines)
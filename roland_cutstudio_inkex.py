@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+In-process SVG to cut path conversion for the Roland CutStudio export script
+
+This is an alternative to the Inkscape commandline round trip (SVG -> filtered SVG -> Inkscape EPS)
+in roland_cutstudio.py: The SVG is loaded with inkex, all transformations are applied in Python
+and the resulting drawing commands are handed to the CutStudio EPS writer.
+
+Only documents consisting of plain shapes are supported. Anything that needs Inkscape's
+rendering engine (text, flowed text, clones, ...) raises UnsupportedDocument,
+so that the caller can fall back to calling Inkscape.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import hashlib
+from typing import List, Optional, Tuple, Iterator
+import inkex
+from inkex import Transform
+from lxml import etree
+
+class UnsupportedDocument(Exception):
+    """
+    The document contains elements that can only be converted by Inkscape.
+    """
+    pass
+
+SVG_NAMESPACE = "{http://www.w3.org/2000/svg}"
+
+# Elements that are converted to paths
+SHAPE_TAGS = ["path", "rect", "circle", "ellipse", "line", "polyline", "polygon"]
+
+# Elements whose children are drawn
+CONTAINER_TAGS = ["g", "a"]
+
+# Elements that are never drawn directly
+SKIPPED_TAGS = ["defs", "metadata", "title", "desc", "style", "script",
+                "clipPath", "mask", "marker", "pattern", "symbol", "linearGradient", "radialGradient", "filter"]
+
+# Bitmaps are exported as images by Inkscape, which CutStudio ignores.
+IGNORED_TAGS = ["image"]
+
+# All other SVG elements (text, flowRoot, use, switch, nested svg, ...) need Inkscape for conversion.
+
+def is_hidden(element) -> bool:
+    """
+    Check if the element is not drawn by Inkscape's export because of display:none or visibility:hidden
+    """
+    display = element.get("display")
+    visibility = element.get("visibility")
+    # parsing the style attribute is slow, so only do it if it can contain these properties
+    style_attribute = element.get("style")
+    if style_attribute and ("display" in style_attribute or "visibility" in style_attribute):
+        style = element.style
+        display = style.get("display", display)
+        visibility = style.get("visibility", visibility)
+    return display == "none" or visibility in ["hidden", "collapse"]
+
+def iter_shapes(element, is_root: bool = False, parent_transform: Optional[Transform] = None) -> Iterator[Tuple[inkex.ShapeElement, Transform]]:
+    """
+    Iterate over all visible shapes in the element and its children, in drawing order.
+
+    :param is_root: True if element is the <svg> document root
+    :param parent_transform: composed transform of the parent element, None to compute it
+    :return: iterator of (shape, composed transform of the shape). The transforms are composed while
+        walking the tree, which is the same as, but much faster than, calling composed_transform() for every shape.
+    :raises UnsupportedDocument: if an element needs Inkscape for conversion
+    """
+    if not isinstance(element.tag, str) or not element.tag.startswith(SVG_NAMESPACE):
+        # XML comments, Inkscape-specific elements like sodipodi:namedview
+        return
+    tag = element.tag[len(SVG_NAMESPACE):]
+    if tag in SKIPPED_TAGS or tag in IGNORED_TAGS:
+        return
+    if is_hidden(element):
+        return
+    if parent_transform is None:
+        transform = element.composed_transform()
+    else:
+        transform = parent_transform @ element.transform
+    if tag in SHAPE_TAGS:
+        yield (element, transform)
+    elif tag in CONTAINER_TAGS or (tag == "svg" and is_root):
+        for child in element:
+            yield from iter_shapes(child, parent_transform=transform)
+    else:
+        raise UnsupportedDocument("Element {} of type {} needs to be converted by Inkscape".format(element.get("id"), tag))
+
+def selected_roots(svg: inkex.SvgDocumentElement, selected_ids: List[str]) -> list:
+    """
+    Elements that are to be exported. An empty selection means the whole document.
+    """
+    if len(selected_ids) == 0:
+        return [svg]
+    elements = []
+    for element_id in selected_ids:
+        element = svg.getElementById(element_id)
+        if element is None:
+            raise UnsupportedDocument("Cannot find selected element " + element_id)
+        elements.append(element)
+    # Inkscape exports the selection in document order, not in order of selection.
+    # If an element and one of its ancestors are selected, only export it once.
+    document_order = {element: index for (index, element) in enumerate(svg.iter())}
+    elements.sort(key=document_order.__getitem__)
+    selected = set(elements)
+    return [element for element in elements if not any(ancestor in selected for ancestor in element.iterancestors())]
+
+def shape_fingerprint(shape: inkex.ShapeElement, transform: Transform) -> str:
+    """
+    Hash of everything that the conversion of a shape depends on: its XML and its transformation to EPS coordinates
+    """
+    data = etree.tostring(shape, with_tail=False) + repr(transform.matrix).encode()
+    return hashlib.sha256(data).hexdigest()
+
+def convert_shape(shape: inkex.ShapeElement, transform: Transform) -> dict:
+    """
+    Convert a shape to drawing commands in Inkscape EPS coordinates (pt, origin at the bottom left of the page).
+
+    :param transform: from user units to EPS coordinates, incl. the transformations of the shape and its ancestors
+    :return: {"ops": [...], "coordinates": [...], "bbox": [left, right, top, bottom] or None for empty shapes}
+    """
+    path = shape.path.to_absolute().transform(transform)
+    ops = []
+    coordinates = []
+    def add(op, *points):
+        ops.append(op)
+        for point in points:
+            coordinates.extend([point[0], point[1]])
+    # mark which subpaths are closed (the superpath does not store that)
+    closed = []
+    for segment in path:
+        if isinstance(segment, inkex.paths.Move):
+            closed.append(False)
+        elif isinstance(segment, inkex.paths.ZoneClose) and closed:
+            closed[-1] = True
+    for (subpath, is_closed) in zip(path.to_superpath(), closed + [False] * len(path)):
+        if not subpath:
+            continue
+        # superpath nodes are [handle before, point, handle after]
+        add("m", subpath[0][1])
+        for (previous, node) in zip(subpath, subpath[1:]):
+            if previous[2] == previous[1] and node[0] == node[1]:
+                add("l", node[1])
+            else:
+                add("c", previous[2], node[0], node[1])
+        if is_closed and subpath[-1][1] != subpath[0][1]:
+            add("l", subpath[0][1])
+    bbox = path.bounding_box()
+    return {"ops": ops, "coordinates": coordinates, "bbox": None if bbox is None else [bbox.left, bbox.right, bbox.top, bbox.bottom]}
+
+def svg_to_drawing_commands(svg: inkex.SvgDocumentElement, selected_ids: List[str], export_area_page: bool,
+                            geometry_index: Optional[dict] = None) -> Tuple[List[str], List[float]]:
+    """
+    Convert the selected elements to drawing commands in Inkscape EPS coordinates (pt, origin at the bottom left).
+
+    :param export_area_page: True: coordinates relative to the page /
+        False: relative to the bottom left corner of the drawing (geometric bounding box, without stroke width)
+    :param geometry_index: converted shapes of previous exports by element ID, see convert_shape(), or None.
+        Shapes that did not change since then (same shape_fingerprint()) are taken from the index instead of being
+        converted again. New and changed shapes are added to the index. If the whole document is exported,
+        elements that do not exist anymore are removed from it.
+    :return: (ops, coordinates) as used by roland_cutstudio.format_drawing_commands()
+    """
+    page = svg.get_page_bbox()
+    pt_per_user_unit = 1 / svg.viewport_to_unit("1pt")
+    # user units, y pointing down -> pt, y pointing up
+    to_eps = Transform(scale=(pt_per_user_unit, -pt_per_user_unit)) @ Transform(translate=(-page.left, -page.bottom))
+
+    shapes = []
+    seen = set()
+    for root in selected_roots(svg, selected_ids):
+        for (shape, shape_transform) in iter_shapes(root, is_root=(root is svg)):
+            transform = to_eps @ shape_transform
+            element_id = shape.get("id")
+            if geometry_index is None or element_id is None:
+                shapes.append(convert_shape(shape, transform))
+                continue
+            fingerprint = shape_fingerprint(shape, transform)
+            entry = geometry_index.get(element_id)
+            if entry is None or entry["fingerprint"] != fingerprint:
+                entry = convert_shape(shape, transform)
+                entry["fingerprint"] = fingerprint
+                geometry_index[element_id] = entry
+            seen.add(element_id)
+            shapes.append(entry)
+    if geometry_index is not None and not selected_ids:
+        for element_id in set(geometry_index) - seen:
+            del geometry_index[element_id]
+
+    offset_x = 0
+    offset_y = 0
+    boxes = [shape["bbox"] for shape in shapes if shape["bbox"] is not None]
+    if not export_area_page and boxes:
+        offset_x = -min(box[0] for box in boxes)
+        offset_y = -min(box[2] for box in boxes) # y axis was flipped, so this is the bottom edge of the drawing
+
+    ops = []
+    coordinates = []
+    for shape in shapes:
+        ops += shape["ops"]
+        shape_coordinates = shape["coordinates"]
+        for i in range(0, len(shape_coordinates), 2):
+            coordinates.extend([shape_coordinates[i] + offset_x, shape_coordinates[i + 1] + offset_y])
+    return (ops, coordinates)
+
+def load_drawing_commands(svg_file: str, selected_ids: List[str], export_area_page: bool,
+                          geometry_index: Optional[dict] = None) -> Tuple[List[str], List[float]]:
+    """
+    Load SVG file and convert the selected elements to drawing commands, see svg_to_drawing_commands()
+    """
+    svg = inkex.load_svg(svg_file).getroot()
+    return svg_to_drawing_commands(svg, selected_ids, export_area_page, geometry_index)
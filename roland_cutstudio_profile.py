@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Optional instrumentation of the Roland CutStudio export script
+
+If the environment variable CUTSTUDIO_PROFILE is set, each stage of the export
+(filtering the SVG, Inkscape EPS export, EPS conversion, opening CutStudio) is measured
+and a JSON report is written next to the output file (<output>.profile.json).
+The value of CUTSTUDIO_PROFILE is a comma-separated list of options:
+- any value, e.g. "1": wall time, time spent waiting for subprocesses, maximum RSS and number of points per stage
+- "memory": additionally, peak Python memory per stage (tracemalloc; this slows down the conversion)
+- "cprofile": additionally, a cProfile dump of the EPS conversion (<output>.cprofile, read with python3 -m pstats)
+
+The startup time (importing the script, before any stage) can be checked with
+    python3 roland_cutstudio_profile.py startup [--module roland_cutstudio] [--top 15]
+which imports the module in a new Python process with "-X importtime" and lists the slowest imports.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import List, Optional
+
+def max_rss() -> dict:
+    """
+    Maximum resident set size in bytes of this process and of its (finished) subprocesses so far.
+    Empty on Windows, where this is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return {}
+    # kilobytes on Linux, bytes on macOS
+    factor = 1 if sys.platform == "darwin" else 1024
+    return {"max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * factor,
+            "subprocess_max_rss": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * factor}
+
+class Profiler:
+    """
+    Collects measurements of the export stages.
+    """
+    def __init__(self, trace_memory: bool = False, cprofile: bool = False):
+        """
+        :param trace_memory: measure peak Python memory per stage with tracemalloc
+        :param cprofile: enable cProfile for stages that are given a cprofile_file
+        """
+        self.trace_memory = trace_memory
+        self.cprofile = cprofile
+        self.stages = []
+        self.current = None
+
+    @contextlib.contextmanager
+    def stage(self, name: str, cprofile_file: Optional[str] = None):
+        """
+        Measure the code inside the with-block as one stage.
+
+        :param cprofile_file: write a cProfile dump of this stage to this file (only if cprofile is enabled)
+        """
+        record = {"name": name, "subprocess_seconds": 0.0, "counts": {}}
+        parent = self.current
+        self.current = record
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            if hasattr(tracemalloc, "reset_peak"):
+                # Python >= 3.9. Else, the peak includes previous stages.
+                tracemalloc.reset_peak()
+        profile = cProfile.Profile() if (self.cprofile and cprofile_file) else None
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(cprofile_file)
+                record["cprofile"] = cprofile_file
+            record["wall_seconds"] = time.perf_counter() - start
+            if self.trace_memory:
+                record["peak_traced_memory"] = tracemalloc.get_traced_memory()[1]
+            record.update(max_rss())
+            self.stages.append(record)
+            self.current = parent
+
+    def add_subprocess_time(self, seconds: float):
+        """
+        Add time spent waiting for a subprocess (e.g. Inkscape) to the current stage.
+        """
+        if self.current is not None:
+            self.current["subprocess_seconds"] += seconds
+
+    def count(self, **counts):
+        """
+        Add counts (e.g. points=123) to the current stage.
+        """
+        if self.current is not None:
+            for (key, value) in counts.items():
+                self.current["counts"][key] = self.current["counts"].get(key, 0) + value
+
+    def report(self) -> dict:
+        return {"stages": self.stages,
+                "total_wall_seconds": sum(stage["wall_seconds"] for stage in self.stages),
+                "python": platform.python_version(),
+                "platform": platform.platform()}
+
+    def write_report(self, filename: str):
+        with open(filename, "w") as f:
+            json.dump(self.report(), f, indent=2)
+            f.write("\n")
+
+def profiler_from_environment(enable: bool = False) -> Optional[Profiler]:
+    """
+    Create a Profiler according to the environment variable CUTSTUDIO_PROFILE (see top of this file).
+
+    :param enable: create a Profiler even if CUTSTUDIO_PROFILE is not set
+    :return: Profiler, or None if profiling is disabled
+    """
+    options = os.environ.get("CUTSTUDIO_PROFILE", "")
+    if not options and not enable:
+        return None
+    options = [option.strip() for option in options.split(",")]
+    return Profiler(trace_memory=("memory" in options), cprofile=("cprofile" in options))
+
+def import_times(module: str) -> List[dict]:
+    """
+    Import a module in a new Python process with "-X importtime".
+
+    :return: one entry per imported module in import order: name, depth (0 = imported by the module itself),
+        self_seconds, cumulative_seconds (incl. the modules imported by it). The last entry is the module itself.
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True).stderr
+    entries = []
+    for line in output.splitlines():
+        # "import time:  self [us] | cumulative | imported package", the name is indented by the nesting depth
+        fields = line[len("import time:"):].split("|")
+        if not line.startswith("import time:") or len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        entries.append({"name": name.strip(), "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+                        "self_seconds": int(fields[0]) / 1e6, "cumulative_seconds": int(fields[1]) / 1e6})
+    return entries
+
+def startup_report(module: str = "roland_cutstudio", top: int = 15) -> str:
+    """
+    Summary of import_times(): total import time of the module and its slowest direct imports
+    """
+    entries = import_times(module)
+    own = entries[-1]
+    # The imports of a module are listed before it, with a larger depth.
+    # Earlier entries are imported by Python itself at startup.
+    start = len(entries) - 1
+    while start > 0 and entries[start - 1]["depth"] > own["depth"]:
+        start -= 1
+    direct = [e for e in entries[start:-1] if e["depth"] == own["depth"] + 1]
+    lines = ["import {}: {:.1f} ms (own code: {:.1f} ms)".format(module, own["cumulative_seconds"] * 1e3, own["self_seconds"] * 1e3)]
+    for e in sorted(direct, key=lambda e: e["cumulative_seconds"], reverse=True)[:top]:
+        lines.append("  {:8.1f} ms  {}".format(e["cumulative_seconds"] * 1e3, e["name"]))
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure the startup time of the Roland CutStudio export script.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    startup = commands.add_parser("startup", help="list the slowest imports (python3 -X importtime)")
+    startup.add_argument("--module", default="roland_cutstudio", help="module to import (default: roland_cutstudio)")
+    startup.add_argument("--top", type=int, default=15, help="number of imports to list (default: 15)")
+    args = parser.parse_args(argv)
+    print(startup_report(args.module, args.top))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Persistent Inkscape processes for the Roland CutStudio export script
+
+Starting Inkscape takes seconds, which is most of the time needed for exporting a small job.
+When exporting many jobs in one session (e.g. batch conversion), a pool of
+"inkscape --shell" processes is kept alive and the actions for each job
+are sent to one of them.
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import os
+import queue
+import subprocess
+import threading
+import time
+from typing import List
+
+# Inkscape prints this prompt when it is ready for the next line of actions
+SHELL_PROMPT = "> "
+
+# Export options are global state of the Inkscape process and are kept between jobs.
+# Every job starts by resetting all options that any job sets (see roland_cutstudio.py), so that it does not depend on the previous one.
+# An empty value resets export-id (export the whole document) and export-type (type from the file extension).
+RESET_ACTIONS = ["export-id:", "export-id-only:false", "export-type:", "export-area-page:false", "export-area-drawing:false",
+                 "export-text-to-path:false", "export-ignore-filters:false", "export-overwrite:false"]
+
+class InkscapeShellError(Exception):
+    """
+    The Inkscape shell process crashed, quit or did not respond in time.
+    """
+    pass
+
+class InkscapeShellWorker:
+    """
+    One "inkscape --shell" process
+    """
+    def __init__(self, inkscape: str, timeout: float = 120):
+        """
+        :param inkscape: path to the Inkscape binary
+        :param timeout: maximum time in seconds for starting Inkscape or running one line of actions
+        """
+        self.inkscape = inkscape
+        self.timeout = timeout
+        self.process = None
+        self.start()
+
+    def start(self):
+        """
+        Start the Inkscape process and wait until it is ready.
+        """
+        env = dict(os.environ)
+        # see roland_cutstudio.call_inkscape()
+        env["SELF_CALL"] = "true"
+        self.process = subprocess.Popen([self.inkscape, "--shell"], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT, env=env)
+        # Reading is done in a separate thread because there is no portable non-blocking read from pipes.
+        self.output = queue.Queue()
+        self.reader = threading.Thread(target=self._read_output, args=(self.process.stdout, self.output), daemon=True)
+        self.reader.start()
+        self._read_until_prompt()
+
+    @staticmethod
+    def _read_output(pipe, output: queue.Queue):
+        while True:
+            chunk = pipe.read1(4096)
+            output.put(chunk)
+            if not chunk:
+                # end of file: process has quit
+                return
+
+    def _read_until_prompt(self) -> str:
+        """
+        Wait until Inkscape shows the prompt, return everything printed before.
+        """
+        text = ""
+        deadline = time.monotonic() + self.timeout
+        while not text.endswith(SHELL_PROMPT):
+            try:
+                chunk = self.output.get(timeout=max(0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise InkscapeShellError("Inkscape did not respond within {} seconds. Output: {}".format(self.timeout, text))
+            if not chunk:
+                raise InkscapeShellError("Inkscape quit unexpectedly. Output: " + text)
+            text += chunk.decode(errors="replace")
+        return text[:-len(SHELL_PROMPT)]
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def run(self, actions: List[str]) -> str:
+        """
+        Run a sequence of Inkscape actions (see inkscape --action-list) and wait until they are finished.
+
+        :return: output of Inkscape
+        :raises InkscapeShellError: if Inkscape crashed or hangs
+        """
+        if not self.is_alive():
+            raise InkscapeShellError("Inkscape is not running")
+        line = "; ".join(actions) + "\n"
+        try:
+            self.process.stdin.write(line.encode())
+            self.process.stdin.flush()
+        except OSError as exc:
+            raise InkscapeShellError("Cannot send actions to Inkscape: " + str(exc))
+        return self._read_until_prompt()
+
+    def check_health(self) -> bool:
+        """
+        Check that the process is still running and responds to input.
+        """
+        if not self.is_alive():
+            return False
+        try:
+            # an empty line only prints the prompt again
+            self.run([])
+        except InkscapeShellError:
+            return False
+        return True
+
+    def restart(self):
+        self.close()
+        self.start()
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.is_alive():
+            try:
+                self.process.stdin.write(b"quit\n")
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process.stdout.close()
+        self.process = None
+
+class InkscapeShellPool:
+    """
+    Pool of "inkscape --shell" processes. Jobs can be run from several threads at once.
+    Workers that crashed or stopped responding are restarted automatically.
+    """
+    def __init__(self, inkscape: str, size: int = 1, timeout: float = 120):
+        """
+        :param inkscape: path to the Inkscape binary
+        :param size: number of Inkscape processes
+        :param timeout: see InkscapeShellWorker
+        """
+        if size < 1:
+            raise ValueError("Inkscape shell pool size must be at least 1")
+        self.idle = queue.Queue()
+        self.workers = []
+        for i in range(size):
+            worker = InkscapeShellWorker(inkscape, timeout)
+            self.workers.append(worker)
+            self.idle.put(worker)
+
+    def run(self, actions: List[str], retries: int = 1) -> str:
+        """
+        Run a job on the next idle worker.
+
+        :param actions: Inkscape actions. The job should open and close its document (file-open, file-close).
+        :param retries: how often to restart a crashed worker and retry the job
+        :return: output of Inkscape
+        """
+        worker = self.idle.get()
+        try:
+            if not worker.check_health():
+                worker.restart()
+            for attempt in range(retries + 1):
+                try:
+                    return worker.run(RESET_ACTIONS + actions)
+                except InkscapeShellError:
+                    if attempt == retries:
+                        raise
+                    worker.restart()
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
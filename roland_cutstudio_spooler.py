@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Spooler for sending CAMM-GL jobs to Roland cutters in the background
+
+Usage:
+    python3 roland_cutstudio_spooler.py [--port PORT] serve --allow DESTINATION [--allow ...] [--rate BYTES_PER_S | --buffer-query]
+    python3 roland_cutstudio_spooler.py submit FILE.cutstudio.eps DESTINATION [--speed S] [--force F] [--rate BYTES_PER_S | --buffer-query]
+    python3 roland_cutstudio_spooler.py list
+    python3 roland_cutstudio_spooler.py pause | resume
+    python3 roland_cutstudio_spooler.py cancel [JOB]
+
+The spooler is a local server (127.0.0.1, port 47120 by default) that keeps a queue of jobs
+and sends them one after another to the cutter (see roland_cutstudio_camm.py for destinations).
+Jobs are sent in small chunks, so that the input buffer of the cutter does not overflow:
+either at a fixed maximum byte rate (DEFAULT_RATE if not set otherwise), or by asking the cutter for its free buffer space
+before each chunk (HP-GL "ESC.B" query, needs a bidirectional connection, e.g. a serial port or socket).
+The flow control can be set for each job, the options of "serve" are the default.
+Sending can be paused and resumed between chunks, and jobs can be cancelled.
+
+Requests are sent as one line of JSON per request, the answer is one line of JSON.
+Each request must contain the secret token that the server writes to token_file() when it starts.
+This file is only readable by the user, so that other users, and web pages (which can send HTTP requests
+to 127.0.0.1), cannot submit jobs. Jobs are only sent to the destinations that were allowed with "serve --allow".
+
+This program is free software; you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation; either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+'''
+
+import argparse
+import hmac
+import json
+import os
+import secrets
+import select
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+import roland_cutstudio_cache
+import roland_cutstudio_camm
+
+DEFAULT_PORT = 47120
+
+# Bytes per chunk sent to the cutter
+CHUNK_SIZE = 512
+
+# Default maximum bytes per second sent to the cutter, about as fast as a serial connection with 19200 baud.
+# Sending faster than the cutter processes the commands overruns its input buffer.
+DEFAULT_RATE = 2000
+
+# HP-GL query of the free space in the input buffer. The answer is a decimal number followed by CR.
+BUFFER_QUERY = b"\x1b.B"
+
+# Sent when a job is cancelled while it is being sent, to lift the blade
+CANCEL_COMMANDS = b";PU;"
+
+def token_file(port: int = DEFAULT_PORT) -> str:
+    """
+    File with the secret token of the spooler server on this port, in the per-user cache directory
+    """
+    return os.path.join(roland_cutstudio_cache.default_cache_directory(), "spooler", "token-{}".format(port))
+
+def write_token(port: int = DEFAULT_PORT) -> str:
+    """
+    Create a new secret token and write it to token_file(), only readable by the user.
+    (On Windows, the file permissions are inherited from the user's local application data directory.)
+    """
+    token = secrets.token_hex(32)
+    path = token_file(port)
+    os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+    # write a new file with the right permissions, then replace the old one, so that clients never read an incomplete token
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+        f.write(token)
+    os.replace(tmp, path)
+    return token
+
+def read_token(port: int = DEFAULT_PORT) -> str:
+    """
+    :raises FileNotFoundError: if the spooler was never started
+    """
+    with open(token_file(port)) as f:
+        return f.read().strip()
+
+def normalize_destination(destination: str) -> str:
+    """
+    Destination in the form that is compared with the allowed destinations
+    """
+    if destination.startswith("tcp://"):
+        return destination
+    return os.path.abspath(destination)
+
+class Job:
+    """
+    CAMM-GL job in the queue
+    """
+    def __init__(self, job_id: int, name: str, destination: str, data: bytes, rate: Optional[float] = None, buffer_query: Optional[bool] = None):
+        """
+        :param rate, buffer_query: flow control, see Spooler. None for the default of the spooler.
+        """
+        self.id = job_id
+        self.name = name
+        self.destination = destination
+        self.data = data
+        self.rate = rate
+        self.buffer_query = buffer_query
+        self.size = len(data)
+        self.sent = 0
+        # queued, sending, done, cancelled or failed
+        self.status = "queued"
+        self.error = None
+
+    def describe(self) -> dict:
+        return {"id": self.id, "name": self.name, "destination": self.destination, "status": self.status,
+                "size": self.size, "sent": self.sent, "error": self.error, "rate": self.rate, "buffer_query": self.buffer_query}
+
+class Spooler:
+    """
+    Queue of jobs, sent by a background thread
+    """
+    def __init__(self, rate: Optional[float] = DEFAULT_RATE, buffer_query: bool = False, poll_interval: float = 0.2, query_timeout: float = 2):
+        """
+        Flow control: rate and buffer_query are the default for jobs that do not set them.
+
+        :param rate: maximum bytes per second, None or 0 for no limit
+        :param buffer_query: ask the cutter for its free buffer space before each chunk (BUFFER_QUERY)
+        :param poll_interval: seconds to wait before asking again if the buffer is full
+        :param query_timeout: maximum time in seconds to wait for the answer of the cutter
+        """
+        self.rate = rate
+        self.buffer_query = buffer_query
+        self.poll_interval = poll_interval
+        self.query_timeout = query_timeout
+        self.jobs = []
+        self.next_id = 1
+        self.lock = threading.Condition()
+        self.paused = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, name: str, destination: str, data: bytes, rate: Optional[float] = None, buffer_query: Optional[bool] = None) -> Job:
+        with self.lock:
+            job = Job(self.next_id, name, destination, data, rate, buffer_query)
+            self.next_id += 1
+            self.jobs.append(job)
+            self.lock.notify_all()
+            return job
+
+    def pause(self):
+        with self.lock:
+            self.paused = True
+
+    def resume(self):
+        with self.lock:
+            self.paused = False
+            self.lock.notify_all()
+
+    def cancel(self, job_id: Optional[int] = None) -> bool:
+        """
+        Cancel a queued job or the job that is being sent.
+
+        :param job_id: job, None for the job that is being sent
+        :return: False if there is no such job that is not finished
+        """
+        with self.lock:
+            for job in self.jobs:
+                if job.status in ["queued", "sending"] and (job.id == job_id or (job_id is None and job.status == "sending")):
+                    job.status = "cancelled"
+                    self.lock.notify_all()
+                    return True
+            return False
+
+    def list(self) -> List[dict]:
+        with self.lock:
+            return [job.describe() for job in self.jobs]
+
+    def _next_job(self) -> Job:
+        with self.lock:
+            while True:
+                if not self.paused:
+                    for job in self.jobs:
+                        if job.status == "queued":
+                            job.status = "sending"
+                            return job
+                self.lock.wait()
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            try:
+                self._send(job)
+            except Exception as exc:
+                with self.lock:
+                    job.status = "failed"
+                    job.error = str(exc)
+            # finished jobs do not need their data anymore
+            job.data = b""
+
+    def _wait_while_paused(self, job: Job) -> bool:
+        """
+        :return: False if the job was cancelled
+        """
+        with self.lock:
+            while self.paused and job.status == "sending":
+                self.lock.wait()
+            return job.status == "sending"
+
+    def _send(self, job: Job):
+        rate = job.rate if job.rate is not None else self.rate
+        buffer_query = job.buffer_query if job.buffer_query is not None else self.buffer_query
+        with roland_cutstudio_camm.open_destination(job.destination, readable=buffer_query) as output:
+            start = time.monotonic()
+            while job.sent < len(job.data):
+                if not self._wait_while_paused(job):
+                    output.write(CANCEL_COMMANDS)
+                    return
+                size = CHUNK_SIZE
+                if buffer_query:
+                    size = min(size, self._wait_for_buffer_space(output, job))
+                    if size == 0:
+                        continue
+                if rate:
+                    # wait until the average rate since the start is below the limit
+                    delay = job.sent / rate - (time.monotonic() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                output.write(job.data[job.sent:job.sent + size])
+                with self.lock:
+                    job.sent += len(job.data[job.sent:job.sent + size])
+            output.flush()
+        with self.lock:
+            if job.status == "sending":
+                job.status = "done"
+
+    def _wait_for_buffer_space(self, output, job: Job) -> int:
+        """
+        Ask the cutter for its free buffer space until there is some, or the job is paused or cancelled.
+
+        :return: free space in bytes, 0 if the job was paused or cancelled in the meantime
+        """
+        while job.status == "sending" and not self.paused:
+            output.write(BUFFER_QUERY)
+            free = int(read_answer(output, self.query_timeout))
+            if free > 0:
+                return free
+            time.sleep(self.poll_interval)
+        return 0
+
+def read_answer(connection, timeout: float) -> str:
+    """
+    Read the answer of the cutter to a query, terminated by CR.
+    """
+    answer = b""
+    deadline = time.monotonic() + timeout
+    while not answer.endswith(b"\r"):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not select.select([connection], [], [], remaining)[0]:
+            raise TimeoutError("The cutter did not answer the buffer query")
+        data = connection.read(64)
+        if not data:
+            raise ConnectionError("Connection to the cutter was closed")
+        answer += data
+    return answer.decode("ascii").strip()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Handles requests of one client, one line of JSON per request
+    """
+    def handle(self):
+        for line in self.rfile:
+            try:
+                answer = self.server.handle_request_data(json.loads(line))
+            except PermissionError as exc:
+                answer = {"error": str(exc), "unauthorized": True}
+            except Exception as exc:
+                answer = {"error": str(exc)}
+            self.wfile.write((json.dumps(answer) + "\n").encode())
+
+class SpoolerServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, spooler: Spooler, port: int = DEFAULT_PORT, destinations: List[str] = ()):
+        """
+        :param destinations: allowed destinations, see roland_cutstudio_camm.open_destination()
+        """
+        # only accessible from this computer
+        super().__init__(("127.0.0.1", port), RequestHandler)
+        self.spooler = spooler
+        self.destinations = {normalize_destination(destination) for destination in destinations}
+        # (written after binding the port, so that a second server that cannot bind it does not replace the token)
+        self.token = write_token(self.server_address[1])
+
+    def handle_request_data(self, request: dict) -> dict:
+        if not hmac.compare_digest(str(request.get("token", "")), self.token):
+            raise PermissionError("invalid token, see " + token_file(self.server_address[1]))
+        command = request.get("command")
+        if command == "submit":
+            destination = normalize_destination(request["destination"])
+            if destination not in self.destinations:
+                raise ValueError("destination {} is not allowed, start the spooler with --allow {}".format(destination, destination))
+            if not request["file"].endswith(".eps"):
+                raise ValueError("not a CutStudio EPS file: " + request["file"])
+            # The job is converted immediately, so that the file may be changed or deleted afterwards.
+            data = roland_cutstudio_camm.camm_gl_job(request["file"], request.get("speed"), request.get("force"))
+            job = self.spooler.submit(os.path.basename(request["file"]), destination, data, request.get("rate"), request.get("buffer_query"))
+            return {"job": job.describe()}
+        elif command == "list":
+            return {"jobs": self.spooler.list(), "paused": self.spooler.paused}
+        elif command == "pause":
+            self.spooler.pause()
+            return {"paused": True}
+        elif command == "resume":
+            self.spooler.resume()
+            return {"paused": False}
+        elif command == "cancel":
+            return {"cancelled": self.spooler.cancel(request.get("job"))}
+        raise ValueError("unknown command: {}".format(command))
+
+def send_request(request: dict, port: int = DEFAULT_PORT, timeout: float = 60) -> dict:
+    """
+    Send a request to the spooler server and return the answer.
+
+    :raises OSError: if the spooler is not running
+    :raises PermissionError: if the token is wrong, e.g. because the server has just been started and has not written its token yet
+    """
+    request = dict(request, token=read_token(port))
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as sock:
+        sock.sendall((json.dumps(request) + "\n").encode())
+        answer = sock.makefile("rb").readline()
+    answer = json.loads(answer)
+    if answer.get("unauthorized"):
+        raise PermissionError("Spooler error: " + answer["error"])
+    if "error" in answer:
+        raise Exception("Spooler error: " + answer["error"])
+    return answer
+
+def start_server_process(port: int = DEFAULT_PORT, destinations: List[str] = (), timeout: float = 10):
+    """
+    Start the spooler server in the background (it keeps running after this process exits) and wait until it is ready.
+
+    :param destinations: allowed destinations
+    """
+    command = [sys.executable, os.path.abspath(__file__), "--port", str(port), "serve"]
+    for destination in destinations:
+        command += ["--allow", destination]
+    if os.name == "nt":
+        DETACHED_PROCESS = 8
+        subprocess.Popen(command, creationflags=DETACHED_PROCESS, close_fds=True)
+    else:
+        subprocess.Popen(command, start_new_session=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            send_request({"command": "list"}, port)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+def submit_job(filename: str, destination: str, speed: Optional[int] = None, force: Optional[int] = None, port: int = DEFAULT_PORT,
+               rate: Optional[float] = None, buffer_query: Optional[bool] = None) -> dict:
+    """
+    Add a CutStudio EPS file to the queue of the spooler. The spooler is started if it is not running,
+    and then only allows this destination.
+
+    :param rate, buffer_query: flow control, see Spooler. None for the default of the spooler.
+    :return: description of the job
+    """
+    request = {"command": "submit", "file": os.path.abspath(filename), "destination": destination, "speed": speed, "force": force,
+               "rate": rate, "buffer_query": buffer_query}
+    try:
+        return send_request(request, port)["job"]
+    except (ConnectionRefusedError, FileNotFoundError):
+        # not running, or never started (no token file)
+        start_server_process(port, [destination])
+        return send_request(request, port)["job"]
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Spooler for sending jobs to Roland cutters in the background.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="TCP port on 127.0.0.1 (default: {})".format(DEFAULT_PORT))
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the spooler")
+    serve.add_argument("--allow", action="append", required=True, metavar="DESTINATION", help="allow sending jobs to this destination (can be repeated)")
+    serve.add_argument("--rate", type=float, default=DEFAULT_RATE, help="default maximum bytes per second sent to the cutter, 0 for no limit (default: {})".format(DEFAULT_RATE))
+    serve.add_argument("--buffer-query", action="store_true", help="by default, ask the cutter for free buffer space before each chunk (bidirectional connections only)")
+    submit = commands.add_parser("submit", help="add a CutStudio EPS file to the queue")
+    submit.add_argument("file")
+    submit.add_argument("destination", help="device, file or tcp://HOST:PORT, see roland_cutstudio_camm.py")
+    submit.add_argument("--speed", type=int, default=None, help="tool speed in cm/s")
+    submit.add_argument("--force", type=int, default=None, help="blade force in gf")
+    submit.add_argument("--rate", type=float, default=None, help="maximum bytes per second sent to the cutter, 0 for no limit (default: setting of the spooler)")
+    submit.add_argument("--buffer-query", action="store_true", default=None, help="ask the cutter for free buffer space before each chunk")
+    commands.add_parser("list", help="show all jobs")
+    commands.add_parser("pause", help="pause sending")
+    commands.add_parser("resume", help="resume sending")
+    cancel = commands.add_parser("cancel", help="cancel a job")
+    cancel.add_argument("job", type=int, nargs="?", default=None, help="job number (default: the job that is being sent)")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        server = SpoolerServer(Spooler(args.rate, args.buffer_query), args.port, args.allow)
+        server.serve_forever()
+        return 0
+    if args.command == "submit":
+        print(json.dumps(submit_job(args.file, args.destination, args.speed, args.force, args.port, args.rate, args.buffer_query)))
+        return 0
+    request = {"command": args.command}
+    if args.command == "cancel":
+        request["job"] = args.job
+    print(json.dumps(send_request(request, args.port), indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
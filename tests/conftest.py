@@ -0,0 +1,6 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+# The modules of the extension are not a package, they are imported from the repository root.
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,24 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the batch conversion in roland_cutstudio_batch.py
+'''
+
+import os
+
+from roland_cutstudio_batch import find_svg_files, output_filenames
+
+def test_output_next_to_input():
+    assert output_filenames(["a/x.svg", "b/x.svg"], None) == ["a/x.svg.cutstudio.eps", "b/x.svg.cutstudio.eps"]
+
+def test_output_dir_keeps_subdirectories(tmp_path):
+    files = [str(tmp_path / "jobs" / "a" / "x.svg"), str(tmp_path / "jobs" / "b" / "x.svg"), str(tmp_path / "jobs" / "y.svg")]
+    out = str(tmp_path / "out")
+    assert output_filenames(files, out) == [os.path.join(out, "a", "x.svg.cutstudio.eps"), os.path.join(out, "b", "x.svg.cutstudio.eps"),
+                                            os.path.join(out, "y.svg.cutstudio.eps")]
+    # files of one directory are written directly to the output directory
+    assert output_filenames(files[:1], out) == [os.path.join(out, "x.svg.cutstudio.eps")]
+
+def test_find_svg_files(tmp_path):
+    for name in ["a.svg", "b.svg", "a.svg.filtered.svg", "notes.txt"]:
+        (tmp_path / name).write_text("")
+    assert find_svg_files([str(tmp_path), str(tmp_path / "*.svg")]) == [str(tmp_path / "a.svg"), str(tmp_path / "b.svg")]
@@ -0,0 +1,49 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the cache of intermediate files in roland_cutstudio_cache.py
+'''
+
+import os
+
+from roland_cutstudio import cached_step
+from roland_cutstudio_cache import FileCache, make_key
+
+def put(cache: FileCache, tmp_path, key: str, content: bytes, mtime: float):
+    src = tmp_path / "src"
+    src.write_bytes(content)
+    cache.put(key, str(src))
+    os.utime(cache.path(key), (mtime, mtime))
+
+def test_get_and_put(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    assert not cache.get("missing", str(tmp_path / "dest"))
+    assert not (tmp_path / "dest").exists()
+    put(cache, tmp_path, "key", b"data", 1000)
+    assert cache.get("key", str(tmp_path / "dest"))
+    assert (tmp_path / "dest").read_bytes() == b"data"
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"), max_size=350)
+    for (i, key) in enumerate(["a", "b", "c"]):
+        put(cache, tmp_path, key, bytes(100), 1000 * (i + 1))
+    # the oldest entry is used again, so it is kept
+    assert cache.get("a", str(tmp_path / "dest"))
+    put(cache, tmp_path, "d", bytes(100), 5000)
+    assert sorted(entry.name for entry in os.scandir(cache.directory)) == ["a", "c", "d"]
+
+def test_make_key():
+    assert make_key("filtered-svg", "hash", ["id1"]) == make_key("filtered-svg", "hash", ["id1"])
+    assert make_key("filtered-svg", "hash", ["id1"]) != make_key("filtered-svg", "hash", ["id2"])
+
+def test_cached_step(tmp_path):
+    cache = FileCache(str(tmp_path / "cache"))
+    output = tmp_path / "output"
+    calls = []
+    def produce():
+        calls.append(True)
+        output.write_text("result")
+    cached_step(cache, "key", str(output), produce)
+    output.unlink()
+    cached_step(cache, "key", str(output), produce)
+    assert output.read_text() == "result"
+    assert len(calls) == 1
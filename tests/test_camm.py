@@ -0,0 +1,72 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the CAMM-GL output in roland_cutstudio_camm.py
+'''
+
+import sys
+
+import numpy
+
+import roland_cutstudio
+from roland_cutstudio import EPS2CutstudioEPS
+from roland_cutstudio_camm import MAX_POINTS_PER_COMMAND, camm_gl_commands, flatten_curve, read_cutstudio_eps, send_cutstudio_eps
+from roland_cutstudio_geometry import CutGeometry, Subpath
+
+# 1 inch = 72 pt = 1016 plotter units
+INCH = 72
+
+def polyline(points) -> Subpath:
+    return Subpath(["m"] + ["l"] * (len(points) - 1), numpy.array(points, dtype=float))
+
+def test_lines():
+    geometry = CutGeometry([polyline([(10, 10), (10 + INCH, 10), (10 + INCH, 10 + INCH)]), polyline([(10, 20), (20, 20)])])
+    assert list(camm_gl_commands(geometry, speed=10, force=80)) == [
+        "IN;", "VS10;", "FS80;", "PU0,0;", "PD1016,0,1016,1016;", "PU0,141;", "PD141,141;", "PU0,0;"]
+
+def test_page_origin_and_offset():
+    geometry = CutGeometry([polyline([(INCH, INCH), (2 * INCH, INCH)])])
+    assert list(camm_gl_commands(geometry, origin="page", offset_mm=(1, 2))) == ["IN;", "PU1056,1096;", "PD2072,1096;", "PU0,0;"]
+
+def test_long_line_is_split():
+    geometry = CutGeometry([polyline([(i, i % 2) for i in range(2 * MAX_POINTS_PER_COMMAND + 2)])])
+    commands = list(camm_gl_commands(geometry))
+    assert [command[:2] for command in commands] == ["IN", "PU", "PD", "PD", "PD", "PU"]
+    assert [command.count(",") for command in commands[2:5]] == [2 * MAX_POINTS_PER_COMMAND - 1, 2 * MAX_POINTS_PER_COMMAND - 1, 1]
+
+def test_dot():
+    # a line that is shorter than one plotter unit is still cut
+    geometry = CutGeometry([polyline([(0, 0), (0.001, 0)])])
+    assert list(camm_gl_commands(geometry)) == ["IN;", "PU0,0;", "PD0,0;", "PU0,0;"]
+
+def test_flatten_curve():
+    (p0, p1, p2, p3) = numpy.array([[0, 0], [0, 100], [100, 100], [100, 0]], dtype=float)
+    points = flatten_curve(p0, p1, p2, p3, 0.5)
+    assert points[-1].tolist() == [100, 0]
+    # the midpoint of the lines is close to the curve
+    t = numpy.linspace(0, 1, 1001)[:, numpy.newaxis]
+    curve = (1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1 + 3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3
+    corners = numpy.concatenate([[p0], points])
+    for (a, b) in zip(corners, corners[1:]):
+        assert numpy.hypot(*(curve - (a + b) / 2).T).min() <= 0.5
+
+def test_cutstudio_eps(tmp_path):
+    (tmp_path / "in.eps").write_text("%!PS-Adobe-3.0 EPSF-3.0\n0 0 m 72 0 l 72 72 0 0 0 72 c S\n")
+    EPS2CutstudioEPS(str(tmp_path / "in.eps"), str(tmp_path / "out.cutstudio.eps"))
+    geometry = read_cutstudio_eps(str(tmp_path / "out.cutstudio.eps"))
+    assert [subpath.ops for subpath in geometry.subpaths] == [["m", "l", "c"]]
+    size = send_cutstudio_eps(str(tmp_path / "out.cutstudio.eps"), str(tmp_path / "out.hpgl"), speed=20)
+    data = (tmp_path / "out.hpgl").read_bytes()
+    assert len(data) == size
+    assert data.startswith(b"IN;VS20;PU0,0;PD1016,0,") and data.endswith(b",0,1016;PU0,0;")
+
+def test_cropmarks_are_not_sent(tmp_path, monkeypatch, capsys):
+    svg = tmp_path / "input.svg"
+    svg.write_text('<svg><text>INKSCAPE_CUTSTUDIO_CROPMARK_SETTINGS={&quot;version&quot;:1, &quot;pageW&quot;:210, &quot;pageH&quot;:297, '
+                   '&quot;dx&quot;:20, &quot;dy&quot;:25, &quot;W&quot;:170, &quot;H&quot;:120}</text></svg>')
+    def fail(*args, **kwargs):
+        raise AssertionError("the document must not be converted")
+    monkeypatch.setattr(roland_cutstudio, "svg_to_cutstudio_eps", fail)
+    monkeypatch.setattr(sys, "argv", ["roland_cutstudio.py", "--camm-destination=" + str(tmp_path / "out.hpgl"), str(svg)])
+    roland_cutstudio.inkscape_to_cutstudio()
+    assert "Cropmarks are not supported" in capsys.readouterr().err
+    assert not (tmp_path / "out.hpgl").exists()
@@ -0,0 +1,51 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the cropmarks on documents with multiple pages in roland_cropmark_editor.py
+'''
+
+import pytest
+
+inkex = pytest.importorskip("inkex")
+
+import roland_cutstudio
+from roland_cropmark_editor import PrintingMarks
+
+# user unit: 1 mm
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg" xmlns:inkscape="http://www.inkscape.org/namespaces/inkscape"
+     xmlns:sodipodi="http://sodipodi.sourceforge.net/DTD/sodipodi-0.dtd" width="100mm" height="100mm" viewBox="0 0 100 100">
+  <sodipodi:namedview id="namedview">
+    <inkscape:page id="page1" x="0" y="0" width="100" height="100"/>
+    <inkscape:page id="page2" x="110" y="0" width="100" height="100"/>
+  </sodipodi:namedview>
+  <g id="layer" inkscape:groupmode="layer" transform="translate(5, 0)">
+    <rect id="first" x="10" y="10" width="10" height="10"/>
+    <rect id="second" x="120" y="10" width="10" height="10" transform="scale(1, 2)"/>
+  </g>
+  <rect id="outside" x="300" y="10" width="10" height="10"/>
+</svg>
+'''
+
+def run_editor(tmp_path) -> "inkex.SvgDocumentElement":
+    (tmp_path / "input.svg").write_text(SVG)
+    output = tmp_path / "output.svg"
+    PrintingMarks().run(["--mark_type=four", "--page_size=custom", "--new_width=200", "--new_height=150", str(tmp_path / "input.svg")], output=str(output))
+    return inkex.load_svg(str(output)).getroot()
+
+def document_box(svg, element_id: str) -> tuple:
+    element = svg.getElementById(element_id)
+    bbox = element.bounding_box(element.getparent().composed_transform())
+    return (bbox.left, bbox.top, bbox.right, bbox.bottom)
+
+def test_content_is_moved_with_the_page(tmp_path):
+    svg = run_editor(tmp_path)
+    pages = svg.namedview.get_pages()
+    assert [(page.x, page.y, page.width, page.height) for page in pages] == [(0, 0, 200, 150), (210, 0, 200, 150)]
+    # same position relative to the top left corner of the page
+    assert document_box(svg, "first") == pytest.approx((15, 10, 25, 20))
+    assert document_box(svg, "second") == pytest.approx((225, 20, 235, 40))
+    assert document_box(svg, "outside") == pytest.approx((300, 10, 310, 20))
+
+def test_export_rejects_cropmarks_on_multiple_pages(tmp_path):
+    run_editor(tmp_path)
+    with pytest.raises(Exception, match="multiple pages"):
+        roland_cutstudio.find_cropmark_settings(str(tmp_path / "output.svg"))
@@ -0,0 +1,123 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the EPS converter EPS2CutstudioEPS() in roland_cutstudio.py
+'''
+
+import random
+
+import numpy
+import pytest
+
+import roland_cutstudio
+from roland_cutstudio import EPS2CutstudioEPS, NumberEncoder
+from roland_cutstudio_benchmark import generate_eps
+
+HEADER = "%!PS-Adobe-3.0 EPSF-3.0\n%%BoundingBox: 0 0 100 100\n%%EndComments\n"
+FOOTER = "showpage\n%%EOF\n"
+
+def convert(tmp_path, body: str, **kwargs) -> list:
+    """
+    Convert an EPS file with the given drawing commands.
+
+    :return: the lines of cut commands of the output
+    """
+    (tmp_path / "in.eps").write_text(HEADER + body + FOOTER)
+    EPS2CutstudioEPS(str(tmp_path / "in.eps"), str(tmp_path / "out.eps"), **kwargs)
+    lines = (tmp_path / "out.eps").read_text().splitlines()
+    return lines[lines.index("% Cutstudio Start") + 1:lines.index("% Cutstudio End")]
+
+def test_nested_transformations(tmp_path):
+    body = ("q 2 0 0 2 10 20 cm\n1 1 m 3 1 l 3 4 3 5 4 6 c h\nS\n"
+            "q 0 1 -1 0 0 0 cm\n1 2 m 5 6 l S\nQ Q\n"
+            "7 8 m 9 10 l S\n0 0 1 1 re S\n")
+    assert convert(tmp_path, body) == [
+        "12.0 22.0 m", "16.0 22.0 l", "16.0 28.0 16.0 30.0 18.0 32.0 c", "12.0 22.0 l",
+        "6.0 22.0 m", "-2.0 30.0 l",
+        "7.0 8.0 m", "9.0 10.0 l",
+        "0.0 0.0 m", "1.0 0.0 l", "1.0 1.0 l", "0.0 1.0 l", "0.0 0.0 l"]
+
+def test_batch_transformation_is_exact(tmp_path):
+    # every point must be transformed exactly like by a single matrix x column vector product
+    rnd = random.Random(1)
+    matrix = numpy.array([[rnd.uniform(-2, 2), rnd.uniform(-2, 2), 0], [rnd.uniform(-2, 2), rnd.uniform(-2, 2), 0],
+                          [rnd.uniform(-100, 100), rnd.uniform(-100, 100), 1]])
+    points = [(rnd.uniform(-500, 500), rnd.uniform(-500, 500)) for i in range(1000)]
+    body = "q {} {} {} {} {} {} cm\n".format(*["%f" % x for x in matrix[:, 0:2].ravel()])
+    body += "".join("%f %f %s\n" % (x, y, "m" if i % 10 == 0 else "l") for (i, (x, y)) in enumerate(points)) + "S Q\n"
+    matrix = numpy.array([["%f" % x for x in row] for row in matrix], dtype=float)
+    expected = []
+    for (i, (x, y)) in enumerate(points):
+        p = numpy.matmul(matrix.transpose(), numpy.array([[float("%f" % x), float("%f" % y), 1]]).transpose())
+        expected.append("{} {} {}".format(float(p.item(0)), float(p.item(1)), "m" if i % 10 == 0 else "l"))
+    assert convert(tmp_path, body) == expected
+
+def test_output_is_streamed_in_batches(tmp_path, monkeypatch):
+    body = "q 1 0 0 -1 0 100 cm\n" + "".join("{} {} {}\n".format(i, i % 7, "l" if i else "m") for i in range(25)) + "h\nS Q\n"
+    whole = convert(tmp_path, body)
+    monkeypatch.setattr(roland_cutstudio, "MAX_RUN_LENGTH", 4)
+    assert convert(tmp_path, body) == whole
+    assert len(whole) == 26
+
+def test_output_template(tmp_path):
+    cropmark_settings = {"version": 1, "pageW": 210, "pageH": 297, "dx": 20, "dy": 25, "W": 170, "H": 120}
+    lines = convert(tmp_path, "1 2 m 3 4 l S\n", cropmark_settings=cropmark_settings)
+    expected = roland_cutstudio.CUTSTUDIO_EPS_TEMPLATE.replace("%<CROPMARK_INSERTED_HERE>\n", roland_cutstudio.make_cropmark_header(cropmark_settings))
+    expected = expected.replace("%<CUTTING_LINES_INSERTED_HERE>\n", "".join(line + "\n" for line in lines))
+    assert (tmp_path / "out.eps").read_text() == expected
+
+def test_number_encoder_decimals():
+    # 0.01 mm = 0.028 pt
+    assert NumberEncoder.from_resolution(0.01).decimals == 2
+    assert NumberEncoder.from_resolution(0.5, "pt").decimals == 1
+    assert NumberEncoder.from_resolution(1e-9).decimals == NumberEncoder.MAX_DECIMALS
+    assert NumberEncoder.from_resolution(10).decimals == 0
+    with pytest.raises(ValueError):
+        NumberEncoder(NumberEncoder.MAX_DECIMALS + 1)
+
+def test_number_encoder_format():
+    encoder = NumberEncoder(2)
+    points = numpy.array([[1.23456, -0.00001], [2.0, 3.5], [1e-7, 100.005], [4, 5], [6.789, 10]])
+    full = roland_cutstudio.format_points(["m", "l", "c"], points)
+    compact = encoder.format_points(["m", "l", "c"], points)
+    assert compact == "1.23 0 m\n2 3.5 l\n0 100 4 5 6.79 10 c\n"
+    assert encoder.bytes_saved == len(full) - len(compact)
+
+def test_precision(tmp_path):
+    assert convert(tmp_path, "1.23456 2 m 3.14159 4.5 l S\n", precision=0.01) == ["1.23 2 m", "3.14 4.5 l"]
+
+def test_operators_on_one_line(tmp_path):
+    commands = ["q", "1 0 0 1 10 10 cm", "0 g", "0.5 w", "[] 0.0 d", "1 2 m", "3 4 l", "5 6 7 8 9 10 c", "h", "S", "Q", "0 0 5 5 re W n", "1 1 2 2 re", "S"]
+    expected = ["11.0 12.0 m", "13.0 14.0 l", "15.0 16.0 17.0 18.0 19.0 20.0 c", "11.0 12.0 l",
+                "1.0 1.0 m", "3.0 1.0 l", "3.0 3.0 l", "1.0 3.0 l", "1.0 1.0 l"]
+    # one command per line (fast path) and everything but the clipping rectangle on one line (operand stack)
+    assert convert(tmp_path, "\n".join(commands) + "\n") == expected
+    assert convert(tmp_path, " ".join(commands[:11]) + "\n" + "\n".join(commands[11:]) + "\n") == expected
+
+def test_operands_of_other_operators_are_dropped(tmp_path):
+    # the operands of w and M must not be used by the following moveto
+    assert convert(tmp_path, "0.1 w 4 M 1 2 m 3 4 l S\n") == ["1.0 2.0 m", "3.0 4.0 l"]
+
+def test_only_effective_geometry_options_are_processed():
+    # options at their neutral values, as the dialogs pass them, keep the output streamed
+    neutral = {"remove_duplicates": False, "simplify_tolerance": 0.0, "optimize_order": False, "repeat_columns": 1, "repeat_rows": 1,
+               "repeat_spacing": 2.0, "tile_width": 0.0, "tile_overlap": 10.0}
+    assert not roland_cutstudio.process_geometry(neutral)
+    assert not roland_cutstudio.process_geometry(None)
+    for option in [{"remove_duplicates": True}, {"simplify_tolerance": 0.025}, {"optimize_order": True},
+                   {"repeat_columns": 2}, {"repeat_rows": 3}, {"tile_width": 500.0}]:
+        assert roland_cutstudio.process_geometry(dict(neutral, **option))
+
+@pytest.mark.parametrize("newline", ["\n", "\r\n", "\r"])
+def test_parallel_conversion_is_identical(tmp_path, monkeypatch, newline):
+    # nested q/Q/cm and clipping rectangles, split into small chunks
+    monkeypatch.setattr(roland_cutstudio, "PARALLEL_CHUNK_SIZE", 2000)
+    generate_eps(str(tmp_path / "generated.eps"), {"subpaths": 300, "segments": 5, "depth": 4, "curves": 0.5, "clips": 0.3})
+    src = tmp_path / "in.eps"
+    src.write_bytes((tmp_path / "generated.eps").read_bytes().replace(b"\n", newline.encode()))
+    # a CR alone is not a line break when the file is split, so the file is converted in one piece
+    assert (len(roland_cutstudio.find_eps_chunks(str(src), 8)) == 1) == (newline == "\r")
+    for precision in [None, 0.01]:
+        serial = EPS2CutstudioEPS(str(src), str(tmp_path / "serial.eps"), precision=precision, jobs=1)
+        parallel = EPS2CutstudioEPS(str(src), str(tmp_path / "parallel.eps"), precision=precision, jobs=3)
+        assert (tmp_path / "serial.eps").read_bytes() == (tmp_path / "parallel.eps").read_bytes()
+        assert serial == parallel
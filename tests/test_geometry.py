@@ -0,0 +1,197 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the cut line optimizations in roland_cutstudio_geometry.py
+'''
+
+import math
+import random
+
+import numpy
+import pytest
+
+from roland_cutstudio_geometry import (REGISTRATION_MARK_SIZE, CutGeometry, PathArrays, Subpath, optimize_order, process, remove_duplicates,
+                                       simplify, simplify_subpath, step_and_repeat, tile, travel_distance)
+
+def polyline(points) -> Subpath:
+    return Subpath(["m"] + ["l"] * (len(points) - 1), numpy.array(points, dtype=float))
+
+def random_lines(count: int, seed: int = 0) -> CutGeometry:
+    rnd = random.Random(seed)
+    lines = []
+    for i in range(count):
+        (x, y) = (rnd.uniform(0, 1000), rnd.uniform(0, 1000))
+        lines.append(polyline([(x, y), (x + rnd.uniform(-10, 10), y + rnd.uniform(-10, 10))]))
+    return CutGeometry(lines)
+
+def line_set(geometry: CutGeometry) -> set:
+    # each cut line, independent of its direction
+    return {frozenset(map(tuple, subpath.points.tolist())) for subpath in geometry.subpaths}
+
+def test_order_keeps_all_lines():
+    geometry = random_lines(300)
+    before = line_set(geometry)
+    stats = optimize_order(geometry)
+    assert line_set(geometry) == before
+    assert len(geometry.subpaths) == 300
+    assert stats["travel_after"] == travel_distance(geometry.subpaths) < stats["travel_before"]
+
+def test_two_opt_improves_nearest_neighbour_tour():
+    nearest_neighbour = random_lines(300)
+    optimize_order(nearest_neighbour, time_limit=0)
+    two_opt = random_lines(300)
+    optimize_order(two_opt, time_limit=10)
+    assert travel_distance(two_opt.subpaths) < travel_distance(nearest_neighbour.subpaths)
+
+def test_reversed_lines():
+    # the second line is cut in the opposite direction, so that the blade does not travel back
+    geometry = CutGeometry([polyline([(0, 0), (10, 0)]), polyline([(20, 0), (11, 0)])])
+    optimize_order(geometry)
+    assert [subpath.points.tolist() for subpath in geometry.subpaths] == [[[0, 0], [10, 0]], [[11, 0], [20, 0]]]
+
+def test_good_order_is_kept():
+    lines = [polyline([(10 * i, 0), (10 * i + 5, 0)]) for i in range(20)]
+    geometry = CutGeometry(list(lines))
+    stats = optimize_order(geometry)
+    assert geometry.subpaths == lines
+    assert stats["travel_after"] == stats["travel_before"]
+
+def test_collinear_lines_are_merged():
+    geometry = CutGeometry([polyline([(i, 2 * i) for i in range(11)])])
+    assert simplify(geometry, 0.01) == {"simplify_removed": 9}
+    assert geometry.subpaths[0].points.tolist() == [[0, 0], [10, 20]]
+
+def test_simplify_tolerance():
+    zigzag = [(i, 0.05 * (i % 2)) for i in range(11)]
+    assert simplify_subpath(polyline(zigzag), 0.1).points.tolist() == [[0, 0], [10, 0]]
+    assert simplify_subpath(polyline(zigzag), 0.01).points.tolist() == numpy.array(zigzag).tolist()
+
+def test_line_turning_back_is_kept():
+    assert simplify_subpath(polyline([(0, 0), (10, 0), (5, 0)]), 0.1).points.tolist() == [[0, 0], [10, 0], [5, 0]]
+
+def test_zero_length_lines_are_removed():
+    subpath = simplify_subpath(polyline([(0, 0), (0, 0), (5, 5), (5, 5)]), 0.1)
+    assert subpath.ops == ["m", "l"]
+    assert subpath.points.tolist() == [[0, 0], [5, 5]]
+
+def test_curves_are_not_changed():
+    points = [(0, 0), (1, 0), (2, 0), (3, 1), (4, 1), (5, 1), (6, 1), (7, 1)]
+    subpath = simplify_subpath(Subpath(["m", "l", "l", "c", "l", "l"], numpy.array(points, dtype=float)), 0.1)
+    assert subpath.ops == ["m", "l", "c", "l"]
+    assert subpath.points.tolist() == [[0, 0], [2, 0], [3, 1], [4, 1], [5, 1], [7, 1]]
+
+def circle(radius: float, segments: int) -> Subpath:
+    points = [(radius * math.cos(2 * math.pi * i / segments), radius * math.sin(2 * math.pi * i / segments)) for i in range(segments)]
+    return polyline(points + points[:1])
+
+def test_small_circle_is_kept():
+    # segments of about 0.031 pt, shorter than DUPLICATE_TOLERANCE
+    geometry = CutGeometry([circle(5, 1000)])
+    stats = remove_duplicates(geometry)
+    assert stats["duplicate_segments"] == 0
+    assert len(geometry.subpaths) == 1
+    assert geometry.command_count() == 1001
+
+def test_short_segment_is_kept():
+    geometry = CutGeometry([polyline([(0, 0), (0.04, 0), (0.039, 1)])])
+    assert remove_duplicates(geometry)["duplicate_segments"] == 0
+    assert geometry.subpaths[0].points.tolist() == [[0, 0], [0.04, 0], [0.039, 1]]
+
+def test_touching_lines_are_kept():
+    # overlap of 1e-5 pt, e.g. by rounding errors
+    geometry = CutGeometry([polyline([(0, 0), (10, 0)]), polyline([(9.99999, 0), (20, 0)])])
+    assert remove_duplicates(geometry)["duplicate_segments"] == 0
+    assert [subpath.points.tolist() for subpath in geometry.subpaths] == [[[0, 0], [10, 0]], [[9.99999, 0], [20, 0]]]
+
+def test_touching_contour_is_not_split():
+    # square next to a square that shares one corner
+    geometry = CutGeometry([polyline([(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]),
+                            polyline([(10, 10), (20, 10), (20, 20), (10, 20), (10, 10)])])
+    assert remove_duplicates(geometry)["duplicate_segments"] == 0
+    assert len(geometry.subpaths) == 2
+
+def test_overlapping_line_is_shortened():
+    geometry = CutGeometry([polyline([(0, 0), (10, 0)]), polyline([(5, 0.01), (20, 0.01)])])
+    stats = remove_duplicates(geometry)
+    assert stats["duplicate_segments"] == 1
+    assert math.isclose(stats["duplicate_length"], 5)
+    assert geometry.subpaths[1].points.tolist() == [[10, 0.01], [20, 0.01]]
+
+def test_shared_edge_is_cut_once():
+    geometry = CutGeometry([polyline([(0, 0), (10, 0), (10, 10), (0, 10), (0, 0)]),
+                            polyline([(10, 0), (20, 0), (20, 10), (10, 10), (10, 0)])])
+    stats = remove_duplicates(geometry)
+    assert stats["duplicate_segments"] == 1
+    assert math.isclose(stats["duplicate_length"], 10)
+
+def crosses(panel: CutGeometry) -> list:
+    # centres of the registration crosses: pairs of a horizontal and a vertical line
+    return [tuple(subpath.points.mean(axis=0).tolist()) for subpath in panel.subpaths[1:]
+            if len(subpath.ops) == 2 and subpath.points[0][0] == subpath.points[1][0]]
+
+def test_tile_lines():
+    # panels at 0 ... 100, 80 ... 180, 160 ... 260
+    panels = tile(CutGeometry([polyline([(0, 0), (250, 10)])]), 100, 20)
+    assert len(panels) == 3
+    assert [panel.subpaths[0].points.tolist() for panel in panels] == [
+        [[0, 0], [80, 3.2], [100, 4]],
+        [[0, 3.2], [20, 4], [80, 6.4], [100, 7.2]],
+        [[0, 6.4], [20, 7.2], [90, 10]]]
+    # registration crosses above and below the drawing, in the middle of each overlap
+    (bottom, top) = (-REGISTRATION_MARK_SIZE, 10 + REGISTRATION_MARK_SIZE)
+    assert numpy.allclose(crosses(panels[0]), [(90, bottom), (90, top)])
+    assert numpy.allclose(crosses(panels[1]), [(10, bottom), (10, top), (90, bottom), (90, top)])
+    assert numpy.allclose(crosses(panels[2]), [(10, bottom), (10, top)])
+
+def test_tile_curve():
+    curve = Subpath(["m", "c"], numpy.array([(0, 0), (50, 50), (150, 50), (200, 0)], dtype=float))
+    (left, right) = tile(CutGeometry([curve]), 100)
+    (left_end, right_start) = (left.subpaths[0].points[-1], right.subpaths[0].points[0])
+    assert left.subpaths[0].ops == right.subpaths[0].ops == ["m", "c"]
+    assert left_end[0] == pytest.approx(100) and right_start[0] == pytest.approx(0)
+    assert left_end[1] == pytest.approx(right_start[1]) == pytest.approx(37.5)
+
+def test_tile_keeps_small_shapes_whole():
+    square = polyline([(85, 0), (95, 0), (95, 10), (85, 10), (85, 0)])
+    panels = tile(CutGeometry([polyline([(0, 0), (180, 0)]), square]), 100, 20)
+    # the square lies in the overlap, so it is cut on both panels
+    assert [panel.subpaths[1].points.tolist() for panel in panels] == [
+        [[85, 0], [95, 0], [95, 10], [85, 10], [85, 0]], [[5, 0], [15, 0], [15, 10], [5, 10], [5, 0]]]
+
+def test_tile_overlap_must_be_smaller_than_width():
+    with pytest.raises(ValueError):
+        tile(CutGeometry([polyline([(0, 0), (250, 10)])]), 100, 100)
+
+def square(x: float, y: float, size: float) -> Subpath:
+    return polyline([(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)])
+
+def test_step_and_repeat():
+    geometry = CutGeometry([square(0, 0, 10), polyline([(2, 2), (8, 8)])])
+    assert step_and_repeat(geometry, 3, 2, spacing=5) == {"repeat_copies": 6, "repeat_skipped": 0}
+    # copies to the right of and below the original
+    assert [subpath.points[0].tolist() for subpath in geometry.subpaths] == [
+        [0, 0], [2, 2], [15, 0], [17, 2], [30, 0], [32, 2], [0, -15], [2, -13], [15, -15], [17, -13], [30, -15], [32, -13]]
+    assert all(subpath.ops == ["m", "l", "l", "l", "l"] for subpath in geometry.subpaths[::2])
+
+def test_step_and_repeat_inside_area():
+    geometry = CutGeometry([square(0, 0, 10)])
+    # the third column does not fit
+    assert step_and_repeat(geometry, 3, 2, spacing=5, area=(0, -100, 30, 10)) == {"repeat_copies": 4, "repeat_skipped": 2}
+    assert [subpath.points[0].tolist() for subpath in geometry.subpaths] == [[0, 0], [15, 0], [0, -15], [15, -15]]
+
+def test_single_copy_is_not_repeated():
+    geometry = CutGeometry([square(0, 0, 10)])
+    assert process(geometry, {"repeat_columns": 1, "repeat_rows": 1, "repeat_spacing": 2}) == {}
+    assert len(geometry.subpaths) == 1
+
+def test_path_arrays():
+    # the second part continues the last subpath of the first part
+    first = PathArrays.from_commands(["m", "l", "m", "c"], numpy.arange(12, dtype=float).reshape(-1, 2))
+    second = PathArrays.from_commands(["l", "m", "l"], numpy.arange(6, dtype=float).reshape(-1, 2))
+    paths = PathArrays.concatenate([first, PathArrays.from_commands([], numpy.zeros((0, 2))), second])
+    assert paths.subpath_count() == 3
+    assert paths.nbytes == 7 + 9 * 16 + 4 * 8
+    geometry = paths.to_geometry()
+    assert [subpath.ops for subpath in geometry.subpaths] == [["m", "l"], ["m", "c", "l"], ["m", "l"]]
+    assert geometry.subpaths[1].points.tolist() == [[4, 5], [6, 7], [8, 9], [10, 11], [0, 1]]
+    assert PathArrays.from_geometry(geometry).points.tolist() == paths.points.tolist()
+    assert paths.bounding_box() == (0, 1, 10, 11)
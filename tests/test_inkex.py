@@ -0,0 +1,83 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the in-process inkex engine in roland_cutstudio_inkex.py
+'''
+
+import pytest
+
+pytest.importorskip("inkex")
+
+import roland_cutstudio
+import roland_cutstudio_inkex
+from roland_cutstudio_cache import FileCache
+
+MM = 72 / 25.4
+
+SVG = '''<svg xmlns="http://www.w3.org/2000/svg" width="100mm" height="100mm" viewBox="0 0 100 100">
+  <rect id="rect" x="10" y="20" width="30" height="40"/>
+  <g id="group" transform="translate(50, 0)">
+    <path id="line" d="M 0,90 L 10,90"/>
+    <path id="hidden" style="display:none" d="M 0,0 L 10,10"/>
+  </g>
+  {}
+</svg>
+'''
+
+def write_svg(tmp_path, extra: str = "") -> str:
+    svg_file = tmp_path / "input.svg"
+    svg_file.write_text(SVG.format(extra))
+    return str(svg_file)
+
+def points(coordinates) -> list:
+    return [(round(coordinates[i] / MM, 6), round(coordinates[i + 1] / MM, 6)) for i in range(0, len(coordinates), 2)]
+
+def test_page_coordinates(tmp_path):
+    (ops, coordinates) = roland_cutstudio_inkex.load_drawing_commands(write_svg(tmp_path), [], export_area_page=True)
+    # closed rectangle, then the line moved by the group; the hidden path is skipped
+    assert ops == ["m", "l", "l", "l", "l", "m", "l"]
+    assert points(coordinates) == [(10, 80), (40, 80), (40, 40), (10, 40), (10, 80), (50, 10), (60, 10)]
+
+def test_drawing_area_and_selection(tmp_path):
+    (ops, coordinates) = roland_cutstudio_inkex.load_drawing_commands(write_svg(tmp_path), ["group"], export_area_page=False)
+    assert ops == ["m", "l"]
+    assert points(coordinates) == [(0, 0), (10, 0)]
+
+def test_text_is_unsupported(tmp_path):
+    svg_file = write_svg(tmp_path, '<text id="text" x="0" y="50">A</text>')
+    with pytest.raises(roland_cutstudio_inkex.UnsupportedDocument):
+        roland_cutstudio_inkex.load_drawing_commands(svg_file, [], export_area_page=True)
+    # only the selection matters
+    assert roland_cutstudio_inkex.load_drawing_commands(svg_file, ["rect"], export_area_page=True)[0] == ["m", "l", "l", "l", "l"]
+
+def test_fallback_to_inkscape(tmp_path):
+    destination = tmp_path / "output.cutstudio.eps"
+    assert not roland_cutstudio.svg_to_cutstudio_eps_inkex(write_svg(tmp_path, '<text x="0" y="50">A</text>'), [], str(destination), True)
+    assert not destination.exists()
+    roland_cutstudio.svg_to_cutstudio_eps_inkex(write_svg(tmp_path), ["rect"], str(destination), True)
+    lines = destination.read_text().splitlines()
+    assert len(lines[lines.index("% Cutstudio Start") + 1:lines.index("% Cutstudio End")]) == 5
+
+def test_only_changed_shapes_are_converted(tmp_path, monkeypatch):
+    converted = []
+    convert_shape = roland_cutstudio_inkex.convert_shape
+    def counting_convert_shape(shape, transform):
+        converted.append(shape.get("id"))
+        return convert_shape(shape, transform)
+    monkeypatch.setattr(roland_cutstudio_inkex, "convert_shape", counting_convert_shape)
+    cache = FileCache(str(tmp_path / "cache"))
+    svg_file = write_svg(tmp_path)
+    def export(selection) -> bytes:
+        converted.clear()
+        roland_cutstudio.svg_to_cutstudio_eps_inkex(svg_file, selection, str(tmp_path / "output.cutstudio.eps"), True, cache=cache)
+        return (tmp_path / "output.cutstudio.eps").read_bytes()
+    full = export([])
+    assert sorted(converted) == ["line", "rect"]
+    # nothing changed
+    assert export([]) == full
+    assert converted == []
+    assert export(["group"]) and converted == []
+    # one object was edited
+    (tmp_path / "input.svg").write_text(SVG.format("").replace('width="30"', 'width="35"'))
+    assert export([]) != full
+    assert converted == ["rect"]
+    assert export(["rect", "group"]) == export([]) and converted == []
@@ -0,0 +1,48 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the instrumentation of the export stages in roland_cutstudio_profile.py
+'''
+
+import json
+
+import roland_cutstudio
+from roland_cutstudio_profile import Profiler, profiler_from_environment
+
+def test_stages_and_counts():
+    profiler = Profiler(trace_memory=True)
+    with profiler.stage("outer"):
+        profiler.count(points=2)
+        with profiler.stage("inner"):
+            profiler.count(points=3)
+            profiler.add_subprocess_time(0.5)
+            data = bytearray(1000000)
+        profiler.count(points=4)
+    del data
+    (inner, outer) = profiler.stages
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert inner["counts"] == {"points": 3}
+    assert outer["counts"] == {"points": 6}
+    assert inner["subprocess_seconds"] == 0.5
+    assert outer["subprocess_seconds"] == 0
+    assert inner["peak_traced_memory"] >= 1000000
+    assert outer["wall_seconds"] >= inner["wall_seconds"]
+
+def test_profiler_from_environment(monkeypatch):
+    monkeypatch.delenv("CUTSTUDIO_PROFILE", raising=False)
+    assert profiler_from_environment() is None
+    assert not profiler_from_environment(enable=True).trace_memory
+    monkeypatch.setenv("CUTSTUDIO_PROFILE", "memory, cprofile")
+    profiler = profiler_from_environment()
+    assert profiler.trace_memory and profiler.cprofile
+
+def test_conversion_is_counted(tmp_path, monkeypatch):
+    profiler = Profiler(cprofile=True)
+    monkeypatch.setattr(roland_cutstudio, "profiler", profiler)
+    (tmp_path / "in.eps").write_text("%!PS-Adobe-3.0 EPSF-3.0\nq 1 0 0 1 5 5 cm\n1 2 m 3 4 l 5 6 7 8 9 10 c S Q\n0 0 1 1 re S\n")
+    with roland_cutstudio.profile_stage("EPS2CutstudioEPS", cprofile_file=str(tmp_path / "out.cprofile")):
+        roland_cutstudio.EPS2CutstudioEPS(str(tmp_path / "in.eps"), str(tmp_path / "out.eps"))
+    assert profiler.stages[0]["counts"] == {"commands": 8, "points": 10}
+    assert (tmp_path / "out.cprofile").exists()
+    profiler.write_report(str(tmp_path / "report.json"))
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert [stage["name"] for stage in report["stages"]] == ["EPS2CutstudioEPS"]
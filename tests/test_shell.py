@@ -0,0 +1,60 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the use of persistent Inkscape processes (roland_cutstudio_shell.py) in roland_cutstudio.stripSVG_inkscape()
+'''
+
+import os
+import sys
+
+import pytest
+
+import roland_cutstudio
+
+class FakePool:
+    """
+    Stands in for roland_cutstudio_shell.InkscapeShellPool: records the actions, optionally writes the export file.
+    """
+    def __init__(self, write_output: bool):
+        self.write_output = write_output
+        self.calls = []
+
+    def run(self, actions):
+        self.calls.append(actions)
+        if self.write_output:
+            outfile = [action.split(":", 1)[1] for action in actions if action.startswith("export-filename:")][0]
+            with open(outfile, "w") as f:
+                f.write("<svg/>")
+        return "output of inkscape"
+
+def test_strip_with_shell(tmp_path, monkeypatch):
+    pool = FakePool(write_output=True)
+    monkeypatch.setattr(roland_cutstudio, "inkscape_shell_pool", pool)
+    (tmp_path / "in.svg").write_text("<svg><path id='a'/></svg>")
+    roland_cutstudio.stripSVG_inkscape(str(tmp_path / "in.svg"), str(tmp_path / "out.svg"), ["a"], tmpdir=str(tmp_path))
+    assert (tmp_path / "out.svg").read_text() == "<svg/>"
+    assert pool.calls[0][-2:] == ["export-do", "file-close"]
+    # the temporary files were removed
+    assert sorted(os.listdir(tmp_path)) == ["in.svg", "out.svg"]
+
+def test_strip_with_shell_without_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(roland_cutstudio, "inkscape_shell_pool", FakePool(write_output=False))
+    (tmp_path / "in.svg").write_text("<svg><path id='a'/></svg>")
+    with pytest.raises(Exception, match="output of inkscape"):
+        roland_cutstudio.stripSVG_inkscape(str(tmp_path / "in.svg"), str(tmp_path / "out.svg"), ["a"], tmpdir=str(tmp_path))
+    assert os.listdir(tmp_path) == ["in.svg"]
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake Inkscape is a script")
+def test_semicolon_in_path_is_not_passed_to_shell(tmp_path, monkeypatch):
+    # ";" separates the actions of the shell, so Inkscape is started for the file instead
+    pool = FakePool(write_output=True)
+    monkeypatch.setattr(roland_cutstudio, "inkscape_shell_pool", pool)
+    inkscape = tmp_path / "inkscape"
+    inkscape.write_text("#!" + sys.executable + "\n")
+    inkscape.chmod(0o755)
+    monkeypatch.setenv("INKSCAPE_COMMAND", str(inkscape))
+    tmpdir = tmp_path / "a;b"
+    tmpdir.mkdir()
+    (tmp_path / "in.svg").write_text("<svg><path id='a'/></svg>")
+    roland_cutstudio.stripSVG_inkscape(str(tmp_path / "in.svg"), str(tmpdir / "out.svg"), ["a"], tmpdir=str(tmpdir))
+    assert pool.calls == []
+    assert (tmpdir / "out.svg").exists()
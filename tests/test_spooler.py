@@ -0,0 +1,67 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the access control and flow control of roland_cutstudio_spooler.py
+'''
+
+import os
+import stat
+import threading
+import time
+
+import pytest
+
+import roland_cutstudio_camm
+import roland_cutstudio_spooler
+from roland_cutstudio_spooler import Spooler, SpoolerServer, send_request, submit_job, token_file
+
+REFERENCE_EPS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test-output-reference.cutstudio.eps")
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    server = SpoolerServer(Spooler(), 0, [str(tmp_path / "cutter.hpgl")])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def wait_for_jobs(port: int, timeout: float = 30) -> list:
+    deadline = time.monotonic() + timeout
+    while True:
+        jobs = send_request({"command": "list"}, port)["jobs"]
+        if all(job["status"] not in ["queued", "sending"] for job in jobs) or time.monotonic() > deadline:
+            return jobs
+        time.sleep(0.05)
+
+@pytest.mark.skipif(os.name == "nt", reason="file permissions")
+def test_token_is_private(server):
+    mode = os.stat(token_file(server.server_address[1])).st_mode
+    assert stat.S_IMODE(mode) == 0o600
+
+def test_request_without_token_is_rejected(server):
+    with pytest.raises(PermissionError):
+        server.handle_request_data({"command": "list"})
+    with pytest.raises(PermissionError):
+        server.handle_request_data({"command": "list", "token": "0" * 64})
+
+def test_destination_must_be_allowed(server, tmp_path):
+    port = server.server_address[1]
+    with pytest.raises(Exception, match="not allowed"):
+        submit_job(REFERENCE_EPS, str(tmp_path / "other.hpgl"), port=port)
+    assert not (tmp_path / "other.hpgl").exists()
+
+def test_only_eps_files_are_read(server, tmp_path):
+    with pytest.raises(Exception, match="not a CutStudio EPS file"):
+        submit_job(__file__, str(tmp_path / "cutter.hpgl"), port=server.server_address[1])
+
+def test_job_is_sent_with_its_rate(server, tmp_path):
+    port = server.server_address[1]
+    job = submit_job(REFERENCE_EPS, str(tmp_path / "cutter.hpgl"), port=port, rate=0)
+    assert job["rate"] == 0
+    jobs = wait_for_jobs(port)
+    assert [job["status"] for job in jobs] == ["done"]
+    assert (tmp_path / "cutter.hpgl").read_bytes() == roland_cutstudio_camm.camm_gl_job(REFERENCE_EPS)
+
+def test_flow_control_is_on_by_default():
+    assert Spooler().rate == roland_cutstudio_spooler.DEFAULT_RATE > 0
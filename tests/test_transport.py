@@ -0,0 +1,58 @@
+# SPDX-License-Identifier: GPL-2.0-or-later
+'''
+Tests of the transports of intermediate results in roland_cutstudio.svg_to_cutstudio_eps()
+'''
+
+import os
+import shutil
+import sys
+
+import pytest
+
+import roland_cutstudio
+import roland_cutstudio_benchmark
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for Inkscape: writes a generated file, but only if PostScript is requested
+# (by --export-type or, as Inkscape does, by the suffix of the output file)
+FAKE_INKSCAPE = '''#!{python}
+import os, shutil, sys
+output = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--export-filename=")][0]
+export_types = [arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--export-type=")]
+export_type = export_types[0] if export_types else os.path.splitext(output)[1][1:]
+if export_type != "ps":
+    sys.exit("unexpected export type: " + export_type)
+if output == "-":
+    with open({ps!r}) as f:
+        shutil.copyfileobj(f, sys.stdout)
+else:
+    shutil.copyfile({ps!r}, output)
+'''
+
+def convert(svg: str, destination: str, transport: str) -> bytes:
+    roland_cutstudio.svg_to_cutstudio_eps(svg, destination, [], transport=transport)
+    with open(destination, "rb") as f:
+        return f.read()
+
+def compare_transports(tmp_path) -> bytes:
+    svg = str(tmp_path / "input.svg")
+    shutil.copyfile(os.path.join(REPOSITORY, "test-input.svg"), svg)
+    via_files = convert(svg, str(tmp_path / "files.cutstudio.eps"), "files")
+    via_pipe = convert(svg, str(tmp_path / "pipe.cutstudio.eps"), "pipe")
+    assert via_files == via_pipe
+    return via_files
+
+@pytest.mark.skipif(os.name == "nt", reason="the fake Inkscape is a script")
+def test_pipe_exports_the_same_format_as_files(tmp_path, monkeypatch):
+    ps = str(tmp_path / "inkscape.ps")
+    roland_cutstudio_benchmark.generate_eps(ps, {"subpaths": 100, "segments": 5, "depth": 2, "curves": 0.5, "clips": 0.2})
+    inkscape = tmp_path / "inkscape"
+    inkscape.write_text(FAKE_INKSCAPE.format(python=sys.executable, ps=ps))
+    inkscape.chmod(0o755)
+    monkeypatch.setenv("INKSCAPE_COMMAND", str(inkscape))
+    assert compare_transports(tmp_path)
+
+@pytest.mark.skipif("INKSCAPE_COMMAND" not in os.environ and shutil.which("inkscape") is None, reason="Inkscape is not installed")
+def test_pipe_and_files_with_inkscape(tmp_path):
+    assert compare_transports(tmp_path)